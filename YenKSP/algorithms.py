@@ -21,10 +21,14 @@
 #  MA 02110-1301, USA.
 #
 # 
+import heapq
 from operator import itemgetter
 from prioritydictionary import priorityDictionary
-from graph import DiGraph
+from graph import DiGraph, CompactDiGraph
 
+## Relative slack on the bound of dijkstra_bounded, so that round-off in the 
+# reverse distances never prunes a node on a shortest path.
+BOUND_TOL = 1e-9
 
 ## @package YenKSP
 # Computes K-Shortest Paths using Yen's Algorithm.
@@ -40,12 +44,27 @@ from graph import DiGraph
 # @param start The source node of the graph.
 # @param sink The sink node of the graph.
 # @param K The amount of paths being computed.
+# @param backend The shortest path algorithm, 'dict' for dijkstra or 'heap' 
+# for dijkstra_heap. The 'heap' backend works on a CompactDiGraph copy of the 
+# graph.
+#
+# The graph is only read: the edges removed by the spur searches are passed 
+# to them as a mask (see spur_edges), so concurrent queries may share it.
 #
 # @retval [] Array of paths, where [0] is the shortest, [1] is the next 
 # shortest, and so on.
 #
-def ksp_yen(graph, node_start, node_end, max_k=2):
-    distances, previous = dijkstra(graph, node_start)
+def ksp_yen(graph, node_start, node_end, max_k=2, backend='dict'):
+    if backend == 'heap':
+        if not isinstance(graph, CompactDiGraph):
+            graph = CompactDiGraph(graph)
+        shortest_path = dijkstra_heap
+    elif backend == 'dict':
+        shortest_path = dijkstra
+    else:
+        raise ValueError('Unknown backend %s' % backend)
+    
+    distances, previous = shortest_path(graph, node_start)
     
     A = [{'cost': distances[node_end], 
           'path': path(previous, node_start, node_end)}]
@@ -58,16 +77,9 @@ def ksp_yen(graph, node_start, node_end, max_k=2):
             node_spur = A[-1]['path'][i]
             path_root = A[-1]['path'][:i+1]
             
-            edges_removed = []
-            for path_k in A:
-                curr_path = path_k['path']
-                if len(curr_path) > i and path_root == curr_path[:i+1]:
-                    cost = graph.remove_edge(curr_path[i], curr_path[i+1])
-                    if cost == -1:
-                        continue
-                    edges_removed.append([curr_path[i], curr_path[i+1], cost])
-            
-            path_spur = dijkstra(graph, node_spur, node_end)
+            edges_banned = spur_edges(A, path_root)
+            path_spur = shortest_path(graph, node_spur, node_end, 
+                                      edges_banned=edges_banned)
             
             if path_spur['path']:
                 path_total = path_root[:-1] + path_spur['path']
@@ -76,9 +88,6 @@ def ksp_yen(graph, node_start, node_end, max_k=2):
             
                 if not (potential_k in B):
                     B.append(potential_k)
-            
-            for edge in edges_removed:
-                graph.add_edge(edge[0], edge[1], edge[2])
         
         if len(B):
             B = sorted(B, key=itemgetter('cost'))
@@ -89,16 +98,114 @@ def ksp_yen(graph, node_start, node_end, max_k=2):
     
     return A
 
+## Computes K paths from a source to each of several sinks, reusing 
+# shortest-path trees.
+#
+# Returns the same paths as calling ksp_yen for every sink. The shortest-path 
+# tree of the source is computed once for all sinks, and the reverse 
+# shortest-path tree of each sink (distances to the sink) is computed once and
+# may be shared across sources through trees_end. Spur searches use the 
+# reverse tree to bound the search: nodes that cannot lie on a shortest spur 
+# path are not expanded, which leaves the selected paths (including the 
+# tie-breaking between equal cost paths) unchanged.
+#
+# @param graph A digraph of class Graph.
+# @param node_start The source node of the graph.
+# @param nodes_end The sink nodes, defaults to every other node of the graph.
+# @param max_k The amount of paths being computed per sink.
+# @param trees_end Cache of reverse shortest-path trees keyed on the sinks, 
+# shared across calls on the same graph.
+#
+# @retval {} Dictionary keyed on the sinks of the arrays of paths returned by
+# ksp_yen.
+#
+def ksp_yen_all(graph, node_start, nodes_end=None, max_k=2, trees_end=None):
+    if nodes_end is None:
+        nodes_end = [v for v in graph if v != node_start]
+    if trees_end is None:
+        trees_end = {}
+    
+    missing = [v for v in nodes_end if v not in trees_end]
+    if missing:
+        graph_reverse = reverse(graph)
+        for node_end in missing:
+            trees_end[node_end] = dijkstra_reverse(graph, graph_reverse, 
+                                                   node_end)
+    
+    distances, previous = dijkstra(graph, node_start)
+    
+    paths = {}
+    for node_end in nodes_end:
+        distances_end, next_end = trees_end[node_end]
+        
+        A = [{'cost': distances[node_end], 
+              'path': path(previous, node_start, node_end)}]
+        B = []
+        paths[node_end] = A
+        
+        if not A[0]['path']: continue
+        
+        for k in range(1, max_k):
+            for i in range(0, len(A[-1]['path']) - 1):
+                node_spur = A[-1]['path'][i]
+                path_root = A[-1]['path'][:i+1]
+                
+                path_spur = dijkstra_bounded(graph, node_spur, node_end, 
+                                             distances_end, next_end,
+                                             spur_edges(A, path_root))
+                
+                if path_spur['path']:
+                    path_total = path_root[:-1] + path_spur['path']
+                    dist_total = distances[node_spur] + path_spur['cost']
+                    potential_k = {'cost': dist_total, 'path': path_total}
+                
+                    if not (potential_k in B):
+                        B.append(potential_k)
+            
+            if len(B):
+                B = sorted(B, key=itemgetter('cost'))
+                A.append(B[0])
+                B.pop(0)
+            else:
+                break
+    
+    return paths
+
+## The edges that Yen's algorithm removes for a spur search.
+#
+# These are the edges leaving the end of the root path on the paths already 
+# found that share that root path.
+#
+# @param A Array of the paths found so far.
+# @param path_root The root path of the spur search, ending at the spur node.
+#
+# @retval set The banned edges as (node_from, node_to) pairs.
+#
+def spur_edges(A, path_root):
+    i = len(path_root) - 1
+    edges_banned = set()
+    for path_k in A:
+        curr_path = path_k['path']
+        if len(curr_path) > i + 1 and path_root == curr_path[:i+1]:
+            edges_banned.add((curr_path[i], curr_path[i+1]))
+    return edges_banned
+
 ## Computes the shortest path from a source to a sink in the supplied graph.
 #
+# Banned edges and nodes are treated as removed from the graph, which is 
+# itself left untouched.
+#
 # @param graph A digraph of class Graph.
 # @param node_start The source node of the graph.
 # @param node_end The sink node of the graph.
+# @param edges_banned Set of (node_from, node_to) edges that may not be used.
+# @param nodes_banned Set of nodes that may not be visited.
 #
 # @retval {} Dictionary of path and cost or if the node_end is not specified,
 # the distances and previous lists are returned.
 #
-def dijkstra(graph, node_start, node_end=None):
+def dijkstra(graph, node_start, node_end=None, edges_banned=(), 
+             nodes_banned=()):
     distances = {}      
     previous = {}       
     Q = priorityDictionary()
@@ -115,6 +222,8 @@ def dijkstra(graph, node_start, node_end=None):
         if v == node_end: break
 
         for u in graph[v]:
+            if (v, u) in edges_banned or u in nodes_banned:
+                continue
             cost_vu = distances[v] + graph[v][u]
             
             if cost_vu < distances[u]:
@@ -128,6 +237,195 @@ def dijkstra(graph, node_start, node_end=None):
     else:
         return (distances, previous)
 
+## Computes the shortest path from a source to a sink with a binary heap.
+#
+# Same result as dijkstra, including the choice between equal cost paths, 
+# but only the reached nodes enter the heap, stale heap entries are skipped 
+# when popped (lazy deletion) and the distances are kept in arrays indexed on 
+# the node ids of a CompactDiGraph.
+#
+# @param graph A digraph of class CompactDiGraph, or Graph in which case a 
+# compact copy is made first.
+# @param node_start The source node of the graph.
+# @param node_end The sink node of the graph.
+# @param edges_banned Set of (node_from, node_to) edges that may not be used.
+# @param nodes_banned Set of nodes that may not be visited.
+#
+# @retval {} Dictionary of path and cost or if the node_end is not specified,
+# the distances and previous lists are returned.
+#
+def dijkstra_heap(graph, node_start, node_end=None, edges_banned=(), 
+                  nodes_banned=()):
+    if not isinstance(graph, CompactDiGraph):
+        graph = CompactDiGraph(graph)
+    nodes, index = graph.nodes, graph.index
+    
+    i_end = graph.UNDEFINDED if node_end is None else index[node_end]
+    distances, previous = dijkstra_ids(
+        graph, index[node_start], i_end, 
+        set(graph.edge(index[v], index[u]) for v, u in edges_banned),
+        set(index[v] for v in nodes_banned))
+    
+    if node_end is not None:
+        route = []
+        i = i_end
+        while previous[i] != graph.UNDEFINDED:
+            route.append(nodes[i])
+            i = previous[i]
+        if not route:
+            return {'cost': distances[i_end], 'path': []}
+        route.append(nodes[i])
+        route.reverse()
+        return {'cost': distances[i_end], 'path': route}
+    else:
+        return (dict(zip(nodes, distances)), 
+                dict((node, DiGraph.UNDEFINDED if i == graph.UNDEFINDED 
+                      else nodes[i]) for node, i in zip(nodes, previous)))
+
+## Computes the shortest path tree of a source on the node ids of a 
+# CompactDiGraph.
+#
+# @param graph A digraph of class CompactDiGraph.
+# @param i_start The id of the source node.
+# @param i_end The id of the sink node, the search stops once it is reached.
+# @param edges_banned Set of edge ids that may not be used.
+# @param nodes_banned Set of node ids that may not be visited.
+#
+# @retval () The distances and predecessor ids, as lists indexed on node ids.
+#
+def dijkstra_ids(graph, i_start, i_end=CompactDiGraph.UNDEFINDED, 
+                 edges_banned=(), nodes_banned=()):
+    indptr, indices, costs = graph.indptr, graph.indices, graph.costs
+    distances = [graph.INFINITY] * len(graph)
+    previous = [graph.UNDEFINDED] * len(graph)
+    done = [False] * len(graph)
+    
+    distances[i_start] = 0
+    Q = [(0, i_start)]
+    
+    while Q:
+        dist_v, v = heapq.heappop(Q)
+        if done[v]: continue
+        done[v] = True
+        if v == i_end: break
+        
+        for e in xrange(indptr[v], indptr[v+1]):
+            u = indices[e]
+            if e in edges_banned or u in nodes_banned:
+                continue
+            cost_vu = dist_v + costs[e]
+            
+            if cost_vu < distances[u]:
+                distances[u] = cost_vu
+                previous[u] = v
+                heapq.heappush(Q, (cost_vu, u))
+    
+    return (distances, previous)
+
+## Computes the shortest path from a source to a sink, only expanding the 
+# nodes that may lie on a shortest path.
+#
+# Nodes are popped in the same order as dijkstra, so the path (and the choice
+# between equal cost paths) is the same as dijkstra(graph, node_start, 
+# node_end). A node v is not expanded when distance(v) + distances_end[v] 
+# exceeds an upper bound on the cost of the path, where the bound is taken 
+# from the reverse tree of the sink through the allowed out-edges of 
+# node_start. Only edges out of node_start may be banned.
+#
+# @param graph A digraph of class Graph.
+# @param node_start The source node of the graph.
+# @param node_end The sink node of the graph.
+# @param distances_end Distances to node_end (see dijkstra_reverse).
+# @param next_end Successors towards node_end (see dijkstra_reverse).
+# @param edges_banned Set of (node_start, node_to) edges that may not be used.
+#
+# @retval {} Dictionary of path and cost.
+#
+def dijkstra_bounded(graph, node_start, node_end, distances_end, next_end, 
+                     edges_banned=()):
+    INFINITY = graph.INFINITY
+    
+    # bound the cost through the reverse tree paths that avoid node_start
+    bound = INFINITY
+    for u in graph[node_start]:
+        if graph[node_start][u] >= INFINITY or u not in distances_end or \
+                (node_start, u) in edges_banned:
+            continue
+        node_curr = u
+        while node_curr != node_end and node_curr != node_start:
+            node_curr = next_end[node_curr]
+        if node_curr == node_end:
+            bound = min(bound, graph[node_start][u] + distances_end[u])
+    bound += BOUND_TOL * (1 + bound)
+    
+    distances = {node_start: 0}
+    previous = {node_start: graph.UNDEFINDED}
+    Q = [(0, node_start)]
+    
+    while Q:
+        dist_v, v = heapq.heappop(Q)
+        if dist_v > distances[v]: continue
+        if v == node_end: break
+        if dist_v + distances_end.get(v, INFINITY) > bound: continue
+
+        for u, cost in graph[v].iteritems():
+            if (v, u) in edges_banned:
+                continue
+            cost_vu = dist_v + cost
+            
+            if cost_vu < distances.get(u, INFINITY):
+                distances[u] = cost_vu
+                previous[u] = v
+                heapq.heappush(Q, (cost_vu, u))
+    
+    if node_end not in previous:
+        return {'cost': INFINITY, 'path': []}
+    return {'cost': distances[node_end], 
+            'path': path(previous, node_start, node_end)}
+
+## Computes the distances from every node to a sink.
+#
+# @param graph A digraph of class Graph.
+# @param graph_reverse The edges of graph reversed (see reverse).
+# @param node_end The sink node of the graph.
+#
+# @retval () The distances to node_end and the successor of each node on its
+# shortest path to node_end, for the nodes that can reach node_end.
+#
+def dijkstra_reverse(graph, graph_reverse, node_end):
+    distances = {node_end: 0}
+    next = {node_end: graph.UNDEFINDED}
+    Q = [(0, node_end)]
+    
+    while Q:
+        dist_v, v = heapq.heappop(Q)
+        if dist_v > distances[v]: continue
+        
+        for u, cost in graph_reverse.get(v, {}).iteritems():
+            if cost >= graph.INFINITY:
+                continue
+            cost_uv = dist_v + cost
+            
+            if cost_uv < distances.get(u, graph.INFINITY):
+                distances[u] = cost_uv
+                next[u] = v
+                heapq.heappush(Q, (cost_uv, u))
+    
+    return (distances, next)
+
+## Reverses the edges of the supplied graph.
+#
+# @param graph A digraph of class Graph.
+#
+# @retval {} Dictionary of the reversed edges {node_to: {node_from: cost}}.
+#
+def reverse(graph):
+    graph_reverse = {}
+    for node_from in graph:
+        for node_to, cost in graph[node_from].iteritems():
+            graph_reverse.setdefault(node_to, {})[node_from] = cost
+    return graph_reverse
+
 ## Finds a paths from a source to a sink using a supplied previous node list.
 #
 # @param previous A list of node predecessors.
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  benchmark.py
+#
+#  Compares the shortest path backends of ksp_yen on square grid graphs.
+#
+#  Usage: python benchmark.py [max_k]
+#
+import sys
+import random
+import timeit
+
+import algorithms
+from graph import DiGraph, CompactDiGraph
+
+## Grid sizes (nodes per side) that are benchmarked.
+SIZES = [10, 20, 30, 40, 50]
+
+## Generates a grid graph with roads in both directions between neighbours.
+#
+# @param n The amount of nodes per side of the grid.
+# @param seed The seed of the random edge costs.
+#
+# @retval DiGraph The grid graph, with integer nodes numbered row by row.
+#
+def grid(n, seed=0):
+    rng = random.Random(seed)
+    G = DiGraph()
+    G._data = {}
+    for k in range(n):
+        for j in range(n):
+            if j + 1 < n:
+                G.add_edge(k*n + j, k*n + j+1, rng.randrange(1, 11))
+                G.add_edge(k*n + j+1, k*n + j, rng.randrange(1, 11))
+            if k + 1 < n:
+                G.add_edge(k*n + j, (k+1)*n + j, rng.randrange(1, 11))
+                G.add_edge((k+1)*n + j, k*n + j, rng.randrange(1, 11))
+    return G
+
+## Times a statement, returning the best of a few repeats in milliseconds.
+def best_ms(stmt, number=1, repeat=3):
+    return 1000 * min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+def main(max_k=4):
+    print "%6s %12s %12s %8s %12s %12s %8s" % ('grid', 'dijkstra', 'heap',
+                                              'speedup', 'ksp dict',
+                                              'ksp heap', 'speedup')
+    for n in SIZES:
+        G = grid(n)
+        C = CompactDiGraph(G)
+        node_start, node_end = 0, n*n - 1
+
+        assert algorithms.ksp_yen(G, node_start, node_end, max_k) == \
+            algorithms.ksp_yen(C, node_start, node_end, max_k, backend='heap')
+
+        t_dict = best_ms(lambda: algorithms.dijkstra(G, node_start))
+        t_heap = best_ms(lambda: algorithms.dijkstra_heap(C, node_start))
+        t_ksp_dict = best_ms(lambda: algorithms.ksp_yen(G, node_start,
+                                                        node_end, max_k))
+        t_ksp_heap = best_ms(lambda: algorithms.ksp_yen(C, node_start,
+                                                        node_end, max_k,
+                                                        backend='heap'))
+        print "%6s %10.2fms %10.2fms %7.1fx %10.2fms %10.2fms %7.1fx" % (
+            '%dx%d' % (n, n), t_dict, t_heap, t_dict / t_heap,
+            t_ksp_dict, t_ksp_heap, t_ksp_dict / t_ksp_heap)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -281,3 +281,57 @@ class DiGraph:
     def painter(self):
         return self._painter
 
+
+
+## @brief Read-optimized copy of a DiGraph with integer node ids.
+#
+# Nodes are numbered 0..n-1 in sorted order of their names, so that ties
+# between equal distances are broken in the same order as with DiGraph. The
+# edges out of node i are indices[indptr[i]:indptr[i+1]] with costs
+# costs[indptr[i]:indptr[i+1]].
+class CompactDiGraph:
+    ## Same meaning as DiGraph.INFINITY.
+    INFINITY = DiGraph.INFINITY
+    
+    ## Represents a NULL predecessor.
+    UNDEFINDED = -1
+    
+    ## Builds the compact copy of a graph.
+    #
+    # @param self The object pointer.
+    # @param graph A DiGraph (or a dictionary of dictionaries of edge costs).
+    #
+    def __init__(self, graph):
+        self.nodes = sorted(graph)
+        self.index = dict((node, i) for i, node in enumerate(self.nodes))
+        self.indptr, self.indices, self.costs = [0], [], []
+        self._edges = {}
+        for node in self.nodes:
+            for node_to, cost in sorted(graph[node].items()):
+                self._edges[(self.index[node], self.index[node_to])] = \
+                    len(self.indices)
+                self.indices.append(self.index[node_to])
+                self.costs.append(cost)
+            self.indptr.append(len(self.indices))
+    
+    ## Iterator over the names of the nodes.
+    #
+    # @param self The object pointer.
+    #
+    def __iter__(self):
+        return iter(self.nodes)
+    
+    ## The number of nodes of the graph.
+    #
+    # @param self The object pointer.
+    #
+    def __len__(self):
+        return len(self.nodes)
+    
+    ## The id of the edge from node id i to node id j.
+    #
+    # @param self The object pointer.
+    # @retval int The edge id, or -1 if there is no such edge.
+    #
+    def edge(self, i, j):
+        return self._edges.get((i, j), -1)
@@ -17,12 +17,17 @@ def sanity_check(A, U, b, f, x, tolerance=1e-10):
 def generate_synthetic(fname, grid_config, sensor_config, save=True):
 
     TN = GridNetwork(**grid_config)
+    return generate_from_network(fname, TN, sensor_config, save=save)
+
+def generate_from_network(fname, TN, sensor_config, save=True):
+
     S = SensorConfiguration(**sensor_config)
     S.sample_sensors(TN)
     data = S.export_matrices(TN)
 
     # Import data
     A, U, x, b, f = data['A'], data['U'], data['x_true'], data['b'], data['f']
+    A = scipy.sparse.csc_matrix(A)
     U = U.todense()
     sanity_check(A, U, b, f, x)
 
@@ -48,11 +53,10 @@ def generate_synthetic(fname, grid_config, sensor_config, save=True):
             row.append(i)
             col.append(j)
         j += block_size
-    for j in col:
-        b -= x[j] * np.squeeze(A[:,j])
+    b = b - A[:,col].dot(x[col])
     U = np.delete(U,row,0)
     U = np.delete(U,col,1)
-    A = np.delete(A,col,1)
+    A = A[:,np.setdiff1d(np.arange(A.shape[1]), col)]
     f = np.delete(f,row,0)
     x = np.delete(x,col,0)
     sanity_check(A, U, b, f, x)
@@ -103,4 +107,5 @@ def main():
     fname =  DATA_PREFIX + 'test_mat.mat'
     generate_synthetic(fname, grid_config, sensor_config, save=True)
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from __future__ import absolute_import
+
+import os
+import multiprocessing
+
+import numpy as np
+
+from networks.GridNetwork import GridNetwork
+from matrix.matrix import generate_from_network
+
+__author__ = 'cathywu'
+
+# GridNetwork arguments that fix the topology and routes; the others only
+# change the sampled flows
+SHAPE_KEYS = ('ncol', 'nrow', 'nodroutes')
+FLOW_DEFAULTS = {'o_flow': 1.0, 'nnz_oroutes': 2, 'concentration': None}
+
+# Network of the last grid shape, per process
+_network_cache = {}
+
+def _shape(grid_config):
+    return tuple(grid_config.get(k) for k in SHAPE_KEYS)
+
+def _network(grid_config, seed):
+    """
+    Network with the topology and routes of grid_config, built once per grid
+    shape (per process)
+    """
+    shape = _shape(grid_config)
+    if shape not in _network_cache:
+        _network_cache.clear()
+        args = dict((k, grid_config[k]) for k in SHAPE_KEYS + ('cache_dir',)
+                    if k in grid_config)
+        _network_cache[shape] = GridNetwork(myseed=seed, **args)
+    return _network_cache[shape]
+
+def _scenario(task):
+    """
+    Sample the flows of one (grid config, seed) and export the matrices of
+    each sensor config
+    :param task: (i, grid_config, seed, sensor_configs, out_dir)
+    :return: list of (i, seed, j, fname or data) for sensor config j
+    """
+    i, grid_config, seed, sensor_configs, out_dir = task
+    TN = _network(grid_config, seed)
+    TN.resample_flows(seed, **dict((k, grid_config.get(k, v)) for k, v in
+                                   FLOW_DEFAULTS.iteritems()))
+    results = []
+    for j, sensor_config in enumerate(sensor_configs):
+        sensor_config = dict(sensor_config)
+        sensor_config.setdefault('myseed', seed)
+        if out_dir is None:
+            data = generate_from_network(None, TN, sensor_config, save=False)
+            results.append((i, seed, j, data))
+        else:
+            fname = os.path.join(out_dir, 'grid%d_seed%d_sensor%d.mat' %
+                                 (i, seed, j))
+            generate_from_network(fname, TN, sensor_config, save=True)
+            results.append((i, seed, j, fname))
+    return results
+
+def sweep(grid_configs, sensor_configs, seeds, out_dir=None, workers=None):
+    """
+    Generate the synthetic dataset of every (grid config, seed, sensor config)
+
+    Topology and routes are built once per grid shape (ncol, nrow, nodroutes);
+    for each seed only the flows are resampled, and all sensor configs are
+    drawn on the same flows. Scenarios are streamed as they are done, from a
+    pool of worker processes if workers > 1.
+
+    :param grid_configs: list of GridNetwork arguments (myseed and workers
+                         are ignored; with a cache_dir, routes are shared
+                         across runs)
+    :param sensor_configs: list of SensorConfiguration arguments (myseed
+                           defaults to the seed of the scenario)
+    :param seeds: flow sampling seeds
+    :param out_dir: if given, each dataset is written to a .mat file in out_dir
+    :param workers: number of processes
+    :return: generator of (grid config index, seed, sensor config index,
+             .mat file name or dataset)
+    """
+    # scenarios of the same grid shape are consecutive, so each process
+    # rebuilds a network only when the shape changes
+    order = sorted(range(len(grid_configs)),
+                   key=lambda i: _shape(grid_configs[i]))
+    tasks = [(i, grid_configs[i], seed, sensor_configs, out_dir)
+             for i in order for seed in seeds]
+
+    if workers is None or workers <= 1:
+        results = (_scenario(task) for task in tasks)
+        for result in results:
+            for scenario in result:
+                yield scenario
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        chunksize = max(1, len(tasks) // (4 * workers))
+        for result in pool.imap_unordered(_scenario, tasks, chunksize):
+            for scenario in result:
+                yield scenario
+    finally:
+        pool.terminate()
+        pool.join()
+
+if __name__ == "__main__":
+    import sys
+    grid_configs = [{'ncol': n, 'nrow': n, 'nodroutes': 2} for n in (5, 7)]
+    sensor_configs = [{'num_link': np.inf, 'num_OD': np.inf,
+                       'num_cellpath_NB': nb, 'num_linkpath': 2}
+                      for nb in (10, 20)]
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else '.'
+    for scenario in sweep(grid_configs, sensor_configs, range(4),
+                          out_dir=out_dir, workers=multiprocessing.cpu_count()):
+        print scenario
@@ -0,0 +1,140 @@
+import os
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+__author__ = 'cathywu'
+
+class ArrayCache:
+    """
+    Content-addressed on-disk cache of named numpy arrays
+
+    Each entry is a directory root/<key>/ holding one .npy file per array, so
+    that entries are loaded memory-mapped instead of being read and parsed.
+    Keys are hashes of the configuration that produced the arrays (see key).
+    """
+    # bump to invalidate all entries when what is cached changes
+    VERSION = 1
+
+    def __init__(self, root):
+        self.root = os.path.expanduser(root)
+
+    @staticmethod
+    def key(*config):
+        """
+        Hash of a configuration made of numbers, strings, lists, tuples,
+        dicts and arrays
+        :param config:
+        :return: hex digest
+        """
+        return hashlib.sha1(repr(_canonical((ArrayCache.VERSION,) +
+                                            config))).hexdigest()
+
+    @staticmethod
+    def file_hash(fname):
+        """
+        Hash of the contents of a file, to key entries derived from it
+        :param fname:
+        :return: hex digest
+        """
+        h = hashlib.sha1()
+        with open(fname, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.isdir(self.path(key))
+
+    def get(self, key, mmap_mode='r'):
+        """
+        Load the arrays of an entry
+        :param key:
+        :param mmap_mode: see np.load, None to read the arrays into memory
+        :return: dict name -> array, None if the entry does not exist
+        """
+        path = self.path(key)
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return None
+        return dict((name[:-4], _load(os.path.join(path, name), mmap_mode))
+                    for name in names if name.endswith('.npy'))
+
+    def put(self, key, arrays):
+        """
+        Store the arrays of an entry; the entry appears atomically, and is left
+        as is if it already exists
+        :param key:
+        :param arrays: dict name -> array
+        :return:
+        """
+        if key in self:
+            return
+        if not os.path.isdir(self.root):
+            try:
+                os.makedirs(self.root)
+            except OSError:
+                if not os.path.isdir(self.root):
+                    raise
+        tmp = tempfile.mkdtemp(prefix='.%s.' % key, dir=self.root)
+        try:
+            for name, array in arrays.iteritems():
+                np.save(os.path.join(tmp, '%s.npy' % name), np.asarray(array))
+            os.rename(tmp, self.path(key))
+        except OSError:
+            # written concurrently by another process
+            if key not in self:
+                raise
+        finally:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
+
+def pack_lists(lists, dtype=np.int32):
+    """
+    Pack a list of lists of numbers into (values, offsets) arrays
+    :param lists:
+    :param dtype:
+    :return:
+    """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(l) for l in lists])
+    values = np.fromiter((x for l in lists for x in l), dtype=dtype,
+                         count=offsets[-1])
+    return values, offsets
+
+def unpack_lists(values, offsets):
+    """
+    Inverse of pack_lists
+    :param values:
+    :param offsets:
+    :return:
+    """
+    values, offsets = values.tolist(), offsets.tolist()
+    return [values[s:e] for s, e in zip(offsets, offsets[1:])]
+
+def _load(fname, mmap_mode):
+    try:
+        return np.load(fname, mmap_mode=mmap_mode)
+    except ValueError:
+        # empty arrays cannot be memory-mapped
+        return np.load(fname)
+
+def _canonical(x):
+    # deterministic representation, with dict items and floats normalized
+    if isinstance(x, dict):
+        return ('dict', tuple(sorted((_canonical(k), _canonical(v))
+                                     for k, v in x.iteritems())))
+    if isinstance(x, (list, tuple)):
+        return tuple(_canonical(v) for v in x)
+    if isinstance(x, np.ndarray):
+        return ('array', str(x.dtype), x.shape,
+                hashlib.sha1(np.ascontiguousarray(x).view(np.uint8)).hexdigest())
+    if isinstance(x, float):
+        return float.hex(x)
+    return x
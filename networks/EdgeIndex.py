@@ -0,0 +1,81 @@
+import numpy as np
+
+__author__ = 'cathywu'
+
+class EdgeIndex:
+    """
+    Dense integer index of the edges of a directed graph
+
+    Edge e = ids[(u,v)] goes from tails[e] to heads[e], has weight weights[e]
+    and carries flows[e]. lookup maps arrays of tails and heads to edge ids in
+    one vectorized pass, so that link-level aggregation is integer array work.
+    """
+    def __init__(self, edges, weights=None):
+        self.edges = list(edges)
+        self.ids = dict((e, i) for i, e in enumerate(self.edges))
+        if self.edges:
+            self.tails, self.heads = np.array(self.edges, dtype=np.int32).T
+        else:
+            self.tails = self.heads = np.zeros(0, dtype=np.int32)
+        if weights is None:
+            weights = np.ones(len(self.edges))
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.flows = np.zeros(len(self.edges))
+
+        # sorted (tail, head) keys for lookup
+        self._n = int(max(self.tails.max(), self.heads.max())) + 1 \
+            if self.edges else 0
+        keys = self.tails.astype(np.int64) * self._n + self.heads
+        self._order = np.argsort(keys)
+        self._keys = keys[self._order]
+
+    @staticmethod
+    def from_graph(G, weight='weight'):
+        """
+        Index the edges of a networkx graph, in the order of G.edges()
+        :param G:
+        :param weight: edge attribute holding the weight
+        :return:
+        """
+        edges = G.edges(data=True)
+        return EdgeIndex([(u, v) for (u, v, _) in edges],
+                         [data.get(weight, 1) for (_, _, data) in edges])
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __getitem__(self, edge):
+        return self.ids[edge]
+
+    def __contains__(self, edge):
+        return edge in self.ids
+
+    def lookup(self, tails, heads):
+        """
+        Edge ids of the (tails[k], heads[k]) edges
+        :param tails:
+        :param heads:
+        :return: array of edge ids, -1 for pairs that are not edges
+        """
+        tails = np.asarray(tails, dtype=np.int64)
+        heads = np.asarray(heads, dtype=np.int64)
+        if self._keys.size == 0:
+            return -np.ones(tails.size, dtype=np.int64)
+        valid = (tails >= 0) & (tails < self._n) & (heads >= 0) & \
+                (heads < self._n)
+        query = np.where(valid, tails * self._n + heads, -1)
+        idx = np.minimum(np.searchsorted(self._keys, query),
+                         self._keys.size - 1)
+        return np.where(valid & (self._keys[idx] == query), self._order[idx],
+                        -1)
+
+    def lookup_edges(self, edges):
+        """
+        Edge ids of a list of (u,v) edges, -1 for pairs that are not edges
+        :param edges:
+        :return:
+        """
+        if len(edges) == 0:
+            return np.zeros(0, dtype=np.int64)
+        tails, heads = np.array(edges, dtype=np.int64).T
+        return self.lookup(tails, heads)
@@ -4,33 +4,58 @@ import ipdb
 import scipy.io
 import numpy.random as random
 import numpy as np
+from cvxopt import matrix as mat
 
 import networks.wardrop.Graph as g
 from networks.TrafficNetwork import TrafficNetwork
 from networks.wardrop.generate_paths import find_UESOpaths
 import networks.wardrop.path_solver as path_solver
+import networks.wardrop.frank_wolfe as frank_wolfe
+import networks.wardrop.gradient_projection as gradient_projection
 
 __author__ = 'jeromethai, cathywu'
 
 class EquilibriumNetwork(TrafficNetwork):
     def __init__(self, type='LA-small', SO=False, demand=3,
                  delay_type='Polynomial', noise=0,
-                 path='networks/los_angeles_data_2.mat'):
+                 path='networks/los_angeles_data_2.mat', cache_dir=None,
+                 solver='interior-point', warm_start=None):
+        """
+        :param solver: 'interior-point' to assign the demand on the paths of
+                       find_UESOpaths with path_solver, or 'FW', 'CFW', 'BFW'
+                       to assign it with frank_wolfe and keep the paths used,
+                       or 'GP' to assign it with gradient_projection, which
+                       generates the paths as it goes
+        :param warm_start: EquilibriumNetwork of the same network (e.g. of
+                           another demand level or noise draw) whose path
+                           flows start the 'interior-point' and 'GP' solvers
+                           (the Frank-Wolfe solvers have no warm start)
+        """
+        if warm_start is not None and solver in ('FW', 'CFW', 'BFW'):
+            raise ValueError('no warm start for solver {}'.format(solver))
         TrafficNetwork.__init__(self)
         self.path = path
         self.noise = noise
         self.delay_type = delay_type
         self.SO = SO
         if type == 'LA-small':
-            from cvxopt import matrix as mat
             parameters = mat([0.0, 0.0, 0.0, 0.15])
             self.G = self.los_angeles(demand=demand,parameters=parameters)
-            paths = find_UESOpaths(SO, path=path) # find the used paths in
-
-            for p in paths:
-                self.G.add_path_from_nodes(p)
-            self.G.visualize(general=True)
-            self.p_flow = path_solver.solver(self.G, update=True, SO=SO, random=random)
+            if solver == 'interior-point':
+                paths = find_UESOpaths(SO, path=path, cache_dir=cache_dir) # find the used paths in
+
+                for p in paths:
+                    self.G.add_path_from_nodes(p)
+                self.G.visualize(general=True)
+                x0 = None
+                if warm_start is not None:
+                    x0 = self._prior_pathflows(warm_start)
+                self.p_flow = path_solver.solver(self.G, update=True, SO=SO,
+                                                 random=random, x0=x0)
+            elif solver == 'GP':
+                self.p_flow = self._gradient_projection(SO, warm_start)
+            else:
+                self.p_flow = self._frank_wolfe(SO, solver)
             # FIXME in this section, there is another dependence on los_angeles
             # in generate_graph, called through some sequence of functions
         elif type == 'LA-medium':
@@ -43,6 +68,54 @@ class EquilibriumNetwork(TrafficNetwork):
     def num_links(self):
         return len(self.G.links)
 
+    def _frank_wolfe(self, SO, method):
+        """Assign the demand with frank_wolfe.solver, add the paths it uses to
+        G and return their flows
+        """
+        G = self.G
+        _, _, paths, flows = frank_wolfe.solver(G, SO=SO, method=method,
+                                                full=True)
+        paths, flows = frank_wolfe.used_paths(G, paths, flows)
+        for p in paths:
+            G.add_path_from_nodes(p)
+        p_flow = mat(flows)
+        G.update_linkflows_linkdelays(path_solver.linkpath_incidence(G) * p_flow)
+        G.update_pathdelays()
+        G.update_pathflows(p_flow)
+        return p_flow
+
+    def _gradient_projection(self, SO, warm_start=None):
+        """Assign the demand with gradient_projection.solver, add the paths
+        it uses to G and return their flows
+        """
+        G = self.G
+        prior = None
+        if warm_start is not None:
+            prior = gradient_projection.graph_paths(warm_start.G)
+        _, _, paths, flows = gradient_projection.solver(G, SO=SO, full=True,
+                                                        warm_start=prior)
+        return gradient_projection.update_graph(G, paths, flows)
+
+    def _prior_pathflows(self, TN):
+        """Flows of the paths of TN on the paths of G with the same nodes, zero
+        for the others
+        """
+        flows = dict((self._nodes(p), p.flow) for p in TN.G.paths.values())
+        p_flow = mat(0.0, (self.G.numpaths, 1))
+        for id, p in self.G.paths.iteritems():
+            p_flow[self.G.indpaths[id]] = flows.get(self._nodes(p), 0.0)
+        return p_flow
+
+    @staticmethod
+    def _nodes(path):
+        return tuple([path.links[0].startnode] +
+                     [link.endnode for link in path.links])
+
+    def simplex_od(self):
+        """Build simplex constraints from od flows
+        """
+        return path_solver.simplex_od(self.G)
+
     def los_angeles(self, demand=3, parameters=None):
         """Generate small map of L.A. with 122 links and 44 modes
         """
@@ -98,6 +171,27 @@ class EquilibriumNetwork(TrafficNetwork):
     def get_region_weights(self):
         return [1],[(3.5, 0.5, 6.5, 3.0)]
 
+
+def sweep(demands=range(4), noises=(0,), seeds=(None,), **kwargs):
+    """Solve the equilibria of a sequence of demand levels and noise draws,
+    each warm started from the previous one
+    (so kwargs['solver'] is 'interior-point' or 'GP', see EquilibriumNetwork)
+    :param demands: demand levels (see EquilibriumNetwork.los_angeles)
+    :param noises: noise levels of the OD flows and free flow delays
+    :param seeds: seeds of the noise draws of each noise level
+    :param kwargs: other arguments of EquilibriumNetwork
+    :return: generator of (demand, noise, seed, EquilibriumNetwork)
+    """
+    TN = None
+    for demand in demands:
+        for noise in noises:
+            for seed in seeds:
+                if seed is not None:
+                    random.seed(seed)
+                TN = EquilibriumNetwork(demand=demand, noise=noise,
+                                        warm_start=TN, **kwargs)
+                yield demand, noise, seed, TN
+
 if __name__ == "__main__":
     import unittest
     from tests.test_equilibrium_network import TestEquilibriumNetwork
@@ -6,6 +6,8 @@ import itertools
 import logging
 import random
 import collections
+import multiprocessing
+from array import array
 
 import networkx as nx
 import numpy as np
@@ -18,42 +20,101 @@ from YenKSP import graph
 from YenKSP import algorithms
 
 from networks.TrafficNetwork import TrafficNetwork
-from synth_utils import to_np
+from networks.RouteStore import RouteStore, RouteStoreBuilder
+from networks.ArrayCache import ArrayCache
+from networks.EdgeIndex import EdgeIndex
+from synth_utils import labels_to_csr, simplex_csr
 
 __author__ = 'cathywu'
 
+def _origin_routes(H, u, nodes, max_k, trees_end):
+    """
+    Find the k shortest routes from origin u to every other node
+    :param H: graph with inverted weights
+    :param u: origin
+    :param nodes: all nodes of the graph
+    :param max_k: number of shortest routes per OD pair
+    :param trees_end: reverse shortest path trees cache (see ksp_yen_all)
+    :return: (nodes, lengths, costs, destinations) arrays of the routes
+    """
+    path_nodes, lengths, costs, route_dests = array('i'), [], array('d'), []
+    dests = [v for v in nodes if v != u]
+    # dijkstra would be routes.append(nx.shortest_path(G,source=v,target=w))
+    k_shortests = algorithms.ksp_yen_all(H, u, dests, max_k=max_k,
+                                         trees_end=trees_end)
+    for v in dests:
+        k_shortest = k_shortests[v]
+        saved_routes = []
+        for shortest in k_shortest:
+            if GridNetwork.has_duplicate(shortest['path']):
+                k_shortest.remove(shortest)
+            saved_routes.append(shortest)
+        for shortest in saved_routes:
+            path_nodes.extend(shortest['path'])
+            lengths.append(len(shortest['path']))
+            costs.append(shortest['cost'])
+            route_dests.append(v)
+    return path_nodes, lengths, costs, route_dests
+
+# Per-process state of the route generation workers
+_route_worker_state = {}
+
+def _init_route_worker(data, nodes, max_k):
+    H = graph.DiGraph()
+    H._data = data
+    _route_worker_state.update(H=H, nodes=nodes, max_k=max_k, trees_end={})
+
+def _route_worker(u):
+    state = _route_worker_state
+    return _origin_routes(state['H'], u, state['nodes'], state['max_k'],
+                          state['trees_end'])
+
 class GridNetwork(TrafficNetwork):
 
     def __init__(self, ncol=5, nrow=5, nodroutes=2, myseed=None, o_flow=1.0,
-                 nnz_oroutes=2, concentration=None):
+                 nnz_oroutes=2, concentration=None, workers=None,
+                 cache_dir=None):
         TrafficNetwork.__init__(self)
         # we have n*m nodes, (((of which a 5*5 grid is for Caltec and a 5*5 grid
         # is for the streets (for now) --> imagine it as a 5 rows, 10 columns
         # grid, indexed like a matrix)))
 
-        # Generate directed road network
         self.n, self.m, self.r = ncol, nrow, nodroutes
-        self.G, self.sensors = self._construct_grid()
-        self._add_weights()
-        self._add_reverse()
-        logging.debug('Graph generated')
-
-        # Generate routes
-        H = self._invert_graph_weights()
-        self.routes = self._pairwise_shortest_routes(H)
-        logging.debug('Routes generated')
+        cache, key, arrays = None, None, None
+        if cache_dir is not None:
+            # the grid and routes only depend on ncol, nrow and nodroutes
+            cache = ArrayCache(cache_dir)
+            key = cache.key('GridNetwork', ncol, nrow, nodroutes)
+            arrays = cache.get(key)
+
+        if arrays is not None:
+            self._load_arrays(arrays)
+            logging.debug('Graph and routes loaded from the cache')
+        else:
+            # Generate directed road network
+            self.G, self.sensors = self._construct_grid()
+            self._add_weights()
+            self._add_reverse()
+            # (u,v) -> edge id, with tails/heads/weights/flows arrays
+            self.edge_index = EdgeIndex.from_graph(self.G)
+            logging.debug('Graph generated')
+
+            # Generate routes
+            H = self._invert_graph_weights()
+            self.routes = self._pairwise_shortest_routes(H, workers=workers)
+            self.routes.index_edges(self.edge_index)
+            logging.debug('Routes generated')
+            if cache is not None:
+                cache.put(key, self._cache_arrays())
 
         # Routes with non-zero flow
         self.nz_routes = None
+        # Route groupings, shared by all flow samples
+        self._index_routes()
 
         self.bbox = self.get_bounding_box()
 
-        # Save seed for reproducibility
-        if myseed is None:
-            myseed = random.randint(0,4294967295)
-        np.random.seed(myseed)
-        random.seed(myseed)
-        self.myseed = myseed
+        self._seed(myseed)
 
         self.o_flow = o_flow
         self.concentration = concentration
@@ -61,11 +122,19 @@ class GridNetwork(TrafficNetwork):
         self.sample_OD_flow()
 
 
+    def _seed(self, myseed=None):
+        # Save seed for reproducibility
+        if myseed is None:
+            myseed = random.randint(0,4294967295)
+        np.random.seed(myseed)
+        random.seed(myseed)
+        self.myseed = myseed
+
     def num_links(self):
-        return len(self.G.edges())
+        return len(self.edge_index)
 
     def get_route_flow(self,i):
-        return self.routes[i]['flow']
+        return self.routes.flow[i]
 
     def _construct_grid(self):
         sensors = []
@@ -142,49 +211,113 @@ class GridNetwork(TrafficNetwork):
     def has_duplicate(path):
         return len(set(path)) == len(path)
 
-    def _pairwise_shortest_routes(self, H):
-        # Find k shortest routes between all 2 nodes
-        k_shortests = []
-
-        for pair in itertools.product(range(0, self.n*self.m), repeat=2):
-            u,v = pair[0], pair[1]
-            if u == v:
-                continue
-            # dijkstra would be routes.append(nx.shortest_path(G,source=v,target=w))
-            k_shortest = algorithms.ksp_yen(H, u, v, max_k = self.r)
-            saved_routes = []
-            for shortest in k_shortest:
-                if GridNetwork.has_duplicate(shortest['path']):
-                    k_shortest.remove(shortest)
-                shortest['o'], shortest['d'], shortest['flow'] = u, v, 0
-                saved_routes.append(shortest)
-            k_shortests.extend(saved_routes)
-        return k_shortests
+    def _cache_arrays(self):
+        """
+        Topology and routes as arrays for an ArrayCache entry (see _load_arrays)
+        :return:
+        """
+        e, routes = self.edge_index, self.routes
+        pos = nx.get_node_attributes(self.G, 'pos')
+        # the sensors of _construct_grid, before _add_reverse
+        grid_sensors = self.sensors[:len(self.sensors) // 2]
+        return {'tails': e.tails, 'heads': e.heads, 'weights': e.weights,
+                'pos': np.array([pos[v] for v in sorted(pos)]),
+                'sensors': np.array(grid_sensors, dtype=np.int64).reshape(-1, 2),
+                'nodes': routes.nodes, 'offsets': routes.offsets,
+                'cost': routes.cost, 'o': routes.o, 'd': routes.d,
+                'edges': routes.edges, 'edge_offsets': routes.edge_offsets}
+
+    def _load_arrays(self, arrays):
+        """
+        Set the graph, sensors, edge index and routes from the arrays of
+        _cache_arrays instead of generating them. The edges are added in the
+        order of _construct_grid and _add_reverse, so that G iterates over its
+        edges in the same order as a generated grid.
+        :param arrays:
+        :return:
+        """
+        self.edge_index = EdgeIndex(zip(arrays['tails'].tolist(),
+                                        arrays['heads'].tolist()),
+                                    arrays['weights'])
+        weights = self.edge_index.weights.tolist()
+        self.G, self.sensors = nx.DiGraph(), []
+        for v, pos in enumerate(arrays['pos'].tolist()):
+            self.G.add_node(v, pos=tuple(pos))
+        for (u, v) in arrays['sensors'].tolist():
+            self.G.add_edge(u, v, weight=weights[self.edge_index[(u, v)]])
+            self.sensors.append((u, v))
+        self._add_reverse()
+
+        self.routes = RouteStore(arrays['nodes'], arrays['offsets'],
+                                 arrays['cost'], arrays['o'], arrays['d'])
+        self.routes.edges = arrays['edges']
+        self.routes.edge_offsets = arrays['edge_offsets']
+
+    def _pairwise_shortest_routes(self, H, workers=None):
+        # Find k shortest routes between all 2 nodes, packed into a RouteStore
+        # (routes are only held as dicts per OD pair while they are selected)
+        builder = RouteStoreBuilder()
+        nodes = range(0, self.n*self.m)
+
+        if workers is None or workers <= 1:
+            # reverse shortest path trees of the destinations, shared by all
+            # origins to bound the spur searches
+            trees_end = {}
+            origin_routes = (_origin_routes(H, u, nodes, self.r, trees_end)
+                             for u in nodes)
+        else:
+            # shard the origins across processes, each with its own graph and
+            # trees; results come back in origin order so the routes are the
+            # same as the serial ones
+            pool = multiprocessing.Pool(workers, _init_route_worker,
+                                        (H._data, nodes, self.r))
+            chunksize = max(1, len(nodes) // (4 * workers))
+            try:
+                origin_routes = pool.map(_route_worker, nodes, chunksize)
+            finally:
+                pool.close()
+                pool.join()
+
+        for u, (path_nodes, lengths, costs, dests) in \
+                itertools.izip(nodes, origin_routes):
+            builder.extend(path_nodes, lengths, costs, [u] * len(dests), dests)
+        return builder.build()
 
     def get_route_indices_by_origin(self):
         route_indices_by_origin = collections.defaultdict(list)
-        for i, r in enumerate(self.routes):
-            route_indices_by_origin[r['o']].append(i)
+        for i, o in enumerate(self.routes.o.tolist()):
+            route_indices_by_origin[o].append(i)
         return route_indices_by_origin
 
     def _new_dict_OD(self):
         dict_OD = collections.defaultdict(list)
-        for i, r in enumerate(self.routes):
-            dict_OD[r['o']] = collections.defaultdict(list)
+        for o in np.unique(self.routes.o).tolist():
+            dict_OD[o] = collections.defaultdict(list)
         return dict_OD
 
     def get_route_indices_by_OD(self):
         route_indices_by_OD = self._new_dict_OD()
-        for i, r in enumerate(self.routes):
-            route_indices_by_OD[r['o']][r['d']].append(i)
+        for i, (o, d) in enumerate(zip(self.routes.o.tolist(),
+                                       self.routes.d.tolist())):
+            route_indices_by_OD[o][d].append(i)
         return route_indices_by_OD
 
     def _get_OD_pairs(self):
         OD_pairs = collections.defaultdict(list)
-        for i, r in enumerate(self.routes):
-            OD_pairs[(r['path'][0],r['path'][-1])] = 1
+        for od in zip(self.routes.o.tolist(), self.routes.d.tolist()):
+            OD_pairs[od] = 1
         return OD_pairs.keys()
 
+    def _index_routes(self):
+        """
+        Group the routes by origin and OD pair, once for all flow samples on
+        this topology
+        :return:
+        """
+        self._routes_by_origin = self.get_route_indices_by_origin()
+        self._routes_by_OD = self.get_route_indices_by_OD()
+        self._OD_pairs = self._get_OD_pairs()
+
     # SAMPLE VARIOUS FLOWS (HELPER)
     # --------------------------------------------------------------------------
     def _get_heavy_edges(self, thresh=5):
@@ -213,32 +346,112 @@ class GridNetwork(TrafficNetwork):
     # SAMPLE VARIOUS FLOWS
     # --------------------------------------------------------------------------
     def sample_OD_flow(self):
+        self.routes.flow[:] = 0
         if self.concentration is None:
             self._sample_flows(nnz_oroutes=self.nnz_oroutes)
         else:
             self._sample_flows_dense(concentration=self.concentration)
         self._update_nz_routes()
 
+    def resample_flows(self, myseed=None, **params):
+        """
+        Resample the route flows on the same topology and routes, as
+        GridNetwork(myseed=myseed, **params) would, without recomputing routes
+        :param myseed: seed of the sample, random if None
+        :param params: new o_flow, nnz_oroutes or concentration (the current
+                       ones are kept otherwise)
+        :return:
+        """
+        for k, v in self._flow_params('resample_flows', params).iteritems():
+            setattr(self, k, v)
+        self._seed(myseed)
+        self.sample_OD_flow()
+
+    def _flow_params(self, name, params):
+        # flow sampling parameters, defaulting to the current ones
+        for k in params:
+            if k not in ('o_flow', 'nnz_oroutes', 'concentration'):
+                raise TypeError("%s() got an unexpected keyword argument '%s'"
+                                % (name, k))
+        return dict([('o_flow', self.o_flow), ('nnz_oroutes', self.nnz_oroutes),
+                     ('concentration', self.concentration)] + params.items())
+
+    def sample_flow_matrix(self, K, myseed=None, sparse=False, **params):
+        """
+        Draw K route flow scenarios at once, from the same distribution as
+        sample_OD_flow, with vectorized Dirichlet draws per origin (or OD pair)
+        block. The flows of the network are left as they are.
+        :param K: number of scenarios
+        :param myseed: seed of the draws, random if None
+        :param sparse: return X as a scipy CSR matrix instead of an array
+        :param params: o_flow, nnz_oroutes or concentration (the current ones
+                       are used otherwise)
+        :return: X (K x routes flows), L (K x links flows, in edge_index order)
+        """
+        params = self._flow_params('sample_flow_matrix', params)
+        rng = np.random.RandomState(myseed)
+        R = len(self.routes)
+        if params['concentration'] is None:
+            # blocks of routes by origin
+            order = np.argsort(self.routes.o, kind='mergesort')
+            _, starts, counts = np.unique(self.routes.o[order],
+                                          return_index=True, return_counts=True)
+            nnz = params['nnz_oroutes']
+            blk = np.repeat(np.arange(counts.size), counts)
+            rank = np.arange(R) - starts[blk]
+            # uniform random subset of min(nnz, count) routes of each origin:
+            # the routes with the smallest random keys within their block
+            take = rank < np.minimum(nnz, counts)[blk]
+            perm = np.argsort(blk + rng.rand(K, R), axis=1)[:, take]
+            rows = np.repeat(np.arange(K), perm.shape[1])
+            cols = order[perm].ravel()
+            # uniform Dirichlet weights over nnz routes (normalized Gamma(1)),
+            # truncated for origins with fewer routes
+            W = rng.standard_gamma(1., size=(K, counts.size, nnz))
+            W /= W.sum(axis=2)[:, :, np.newaxis]
+            vals = params['o_flow'] * W[:, blk[take], rank[take]].ravel()
+        else:
+            # blocks of routes by OD pair
+            N = self.routes.d.max() + 1
+            _, od = np.unique(self.routes.o * N + self.routes.d,
+                              return_inverse=True)
+            order = np.argsort(od, kind='mergesort')
+            blk = od[order]
+            starts = np.flatnonzero(np.r_[True, blk[1:] != blk[:-1]])
+            # uniform random subset of int(concentration * pairs) OD pairs
+            num = int(starts.size * params['concentration'])
+            selected = np.zeros((K, starts.size), dtype=bool)
+            selected[np.arange(K)[:, np.newaxis],
+                     np.argsort(rng.rand(K, starts.size), axis=1)[:, :num]] = True
+            # uniform Dirichlet weights over the routes of each OD pair
+            W = rng.standard_gamma(1., size=(K, R))
+            W /= np.add.reduceat(W, starts, axis=1)[:, blk]
+            rows, pos = np.nonzero(selected[:, blk])
+            cols = order[pos]
+            vals = params['o_flow'] * W[rows, pos]
+        X = csr_matrix((vals, (rows, cols)), shape=(K, R))
+        # link x route incidence of the routes with flow in some scenario
+        used = np.unique(X.indices)
+        incidence = self.routes.edge_incidence(len(self.edge_index), used)
+        L = incidence.dot(X[:, used].T).T.toarray()
+        if not sparse:
+            X = X.toarray()
+        return X, L
+
     def _sample_flows(self, nnz_oroutes=2):
         '''Generate traffic from each origin onto some small fraction of its routes, \
                 and compute the amount of flow at each edge.'''
 
-        # collect routes by origin or by OD pair
+        # routes by origin
         # Note: All route indices are with respect to _routes_.
-        route_indices_by_origin = self.get_route_indices_by_origin()
-        route_indices_by_OD = self.get_route_indices_by_OD()
+        route_indices_by_origin = self._routes_by_origin
 
-        flow_portions = [0] * len(self.routes) # from origin
-        flow_portions_OD = [0] * len(self.routes) # from origin to destination
-        self.od_flows = self._new_dict_OD()
+        flow_portions = np.zeros(len(self.routes)) # from origin
 
-        # initialize the flows, in case a node is not in the interior of any route
-        for n in self.G.nodes():
-            self.G.node[n]['2nd_flow'] = {}
-
-        # initialize all flows on edges to 0
-        for (u,v) in self.G.edges():
-            self.G.edge[u][v]['flow'] = 0
+        # route flows of this sample, aggregated into link and turn flows
+        # once all routes are sampled
+        self._sampled_flow = np.zeros(len(self.routes))
+        self._sampled = np.zeros(len(self.routes), dtype=bool)
 
         # sample routes and compute aggregate first-order, second-order info on
         # origins and origin-destination pairs
@@ -257,16 +470,26 @@ class GridNetwork(TrafficNetwork):
             self._update_flows(flow_portions, self.o_flow,
                               selected_route_indices,selected_route_weights)
 
-            # normalize flows for each OD pair
-            for dest in self.G.nodes():
-                # normalize weights per OD pair
-                selected_route_indices_OD = route_indices_by_OD[origin][dest]
-                total = sum(flow_portions[i] for i in selected_route_indices_OD)
-                self.od_flows[origin][dest] = total
-                if total == 0:
-                    continue
-                for i in selected_route_indices_OD:
-                    flow_portions_OD[i] = flow_portions[i]/total
+        # total flow portion of each OD pair, for all pairs of nodes
+        self._update_od_flows(self._od_totals(flow_portions))
+        self._aggregate_flows()
+
+    def _od_totals(self, flow_portions):
+        """
+        Sum route flow portions by OD pair
+        :param flow_portions:
+        :return: {origin: {dest: total}} for all origins and nodes
+        """
+        nodes = self.G.nodes()
+        N = max(nodes) + 1
+        totals = np.bincount(self.routes.o * N + self.routes.d,
+                             weights=flow_portions,
+                             minlength=N*N).reshape((N, N))
+        od_flows = collections.defaultdict(list)
+        for o in np.unique(self.routes.o).tolist():
+            od_flows[o] = collections.defaultdict(list, itertools.izip(
+                nodes, totals[o][nodes].tolist()))
+        return od_flows
 
     def _sample_flows_dense(self, concentration=0.1):
         '''Generate traffic from each origin onto some small fraction of its routes, \
@@ -274,19 +497,16 @@ class GridNetwork(TrafficNetwork):
 
         # collect routes by origin or by OD pair
         # Note: All route indices are with respect to _routes_.
-        route_indices_by_OD = self.get_route_indices_by_OD()
+        route_indices_by_OD = self._routes_by_OD
 
-        flow_portions_OD = [0] * len(self.routes) # from origin to destination
+        flow_portions_OD = np.zeros(len(self.routes)) # from origin to destination
         self.od_flows = self._new_dict_OD()
-        OD_pairs = self._get_OD_pairs()
+        OD_pairs = self._OD_pairs
 
-        # initialize the flows, in case a node is not in the interior of any route
-        for n in self.G.nodes():
-            self.G.node[n]['2nd_flow'] = {}
-
-        # initialize all flows on edges to 0
-        for (u,v) in self.G.edges():
-            self.G.edge[u][v]['flow'] = 0
+        # route flows of this sample, aggregated into link and turn flows
+        # once all routes are sampled
+        self._sampled_flow = np.zeros(len(self.routes))
+        self._sampled = np.zeros(len(self.routes), dtype=bool)
 
         # sample OD pairs
         selected_OD_pairs = random.sample(OD_pairs,int(len(OD_pairs) * concentration))
@@ -299,6 +519,8 @@ class GridNetwork(TrafficNetwork):
             self._update_flows(flow_portions_OD, self.o_flow,
                               selected_route_indices,selected_route_weights)
 
+        self._aggregate_flows()
+
     # FLOW UPDATE
     # --------------------------------------------------------------------------
     def _update_od_flows(self, od_flows):
@@ -306,7 +528,8 @@ class GridNetwork(TrafficNetwork):
 
     def _update_flows(self, flow_portions, flow_from_each_node, r_ind, r_weights):
         """
-        Update route flows, compute link flows and split ratios
+        Update route flows; link flows and split ratios are computed from them
+        by _aggregate_flows
         :param flow_portions:
         :param flow_from_each_node:
         :param r_ind:
@@ -315,48 +538,80 @@ class GridNetwork(TrafficNetwork):
         """
         for i, w in zip(r_ind, r_weights):
             flow_portions[i] = w
-            self.routes[i]['flow'] = flow_from_each_node * w
-
-            # add up flows on each link
-            for u, v in zip(self.routes[i]['path'], self.routes[i]['path'][1:]):
-                self.G.edge[u][v]['flow'] += flow_from_each_node * w
-
-            # add up "turn" information on each transition
-            # p = predecessor, n = node, s = successor
-            for p, n, s in zip(self.routes[i]['path'], self.routes[i]['path'][1:],
-                               self.routes[i]['path'][2:]):
-                # add "second order flow"
-                node = self.G.node[n]
-                current_flow = node['2nd_flow'][(p, s)][0] if (p, s) in \
-                                                    node['2nd_flow'] else 0
-                current_routes = node['2nd_flow'][(p, s)][1] if (p, s) in \
-                                                    node['2nd_flow'] else set()
-                node['2nd_flow'][(p, s)] = (current_flow+flow_from_each_node*w,
-                                            current_routes | set([i]))
+            self.routes.flow[i] = flow_from_each_node * w
+            self._sampled_flow[i] += flow_from_each_node * w
+            self._sampled[i] = True
+
+    def _aggregate_flows(self):
+        """
+        Compute link flows (incidence x route flows) and turn flows (flow
+        through each pair of consecutive edges) of the sampled routes
+        :return:
+        """
+        E = len(self.edge_index)
+        r_ids = np.flatnonzero(self._sampled)
+
+        # add up flows on each link
+        self.edge_index.flows = self.routes.edge_incidence(E, r_ids).dot(
+            self._sampled_flow[r_ids])
+
+        # add up "turn" information on each transition: edge e_in = (p, n)
+        # followed by e_out = (n, s), p = predecessor, n = node, s = successor
+        pos, lengths = self.routes.edge_ranges(r_ids)
+        is_turn = np.ones(pos.size, dtype=bool)
+        is_turn[np.cumsum(lengths)[lengths > 0] - 1] = False
+        e_in = self.routes.edges[pos[is_turn]]
+        e_out = self.routes.edges[pos[is_turn] + 1]
+        turn_routes = np.repeat(r_ids, np.maximum(lengths - 1, 0))
+        self.turn_flows = coo_matrix((self._sampled_flow[turn_routes],
+                                      (e_in, e_out)), shape=(E, E)).tocsr()
+        self._turns = (e_in, e_out, turn_routes)
+        self._flows_stored = False
+
+    def store_flows(self):
+        """
+        Write the link flows to the 'flow' edge attributes and the turn flows
+        to the '2nd_flow' node attributes of G, {(p, s): (flow, route ids)}
+        for the transitions p -> n -> s through node n
+        :return:
+        """
+        if self._flows_stored:
+            return
+        for (u, v), flow in zip(self.edge_index.edges,
+                                self.edge_index.flows.tolist()):
+            self.G.edge[u][v]['flow'] = flow
+
+        # initialize the flows, in case a node is not in the interior of any route
+        for n in self.G.nodes():
+            self.G.node[n]['2nd_flow'] = {}
+        tails = self.edge_index.tails.tolist()
+        heads = self.edge_index.heads.tolist()
+        T = self.turn_flows.tocoo()
+        for a, b, flow in zip(T.row.tolist(), T.col.tolist(), T.data.tolist()):
+            self.G.node[heads[a]]['2nd_flow'][(tails[a], heads[b])] = \
+                (flow, set())
+        e_in, e_out, turn_routes = self._turns
+        for a, b, i in zip(e_in.tolist(), e_out.tolist(), turn_routes.tolist()):
+            self.G.node[heads[a]]['2nd_flow'][(tails[a], heads[b])][1].add(i)
+        self._flows_stored = True
 
     def _update_nz_routes(self, tol=1e-3):
-        self.nz_routes = [i for (i,r) in enumerate(self.routes) if r['flow']>tol]
+        self.nz_routes = np.flatnonzero(self.routes.flow > tol).tolist()
 
     # SIMPLEX
     # --------------------------------------------------------------------------
     def simplex_od(self):
         """Build simplex constraints from od flows
         """
-        from cvxopt import matrix, spmatrix
-        rids = self.get_route_indices_by_OD()
-        n = sum([len(v) for v in self.od_flows.values()])
-        m = len(self.routes)
-        I, J, d, k = [], [], matrix(0.0, (n,1)), 0
+        rows, d = {}, []
         for i in self.od_flows.keys():
             for j, od_flow in self.od_flows[i].iteritems():
-                d[k] = od_flow
-                for rid in rids[i][j]:
-                    I.append(k)
-                    J.append(rid)
-                k += 1
-        T = coo_matrix(([1.0] * len(I),(I,J)), shape=(n,m)).tocsr()
-        d = to_np(d)
-        return T, d
+                rows[(i,j)] = len(d)
+                d.append(od_flow)
+        labels = [rows.get(od, -1) for od in zip(self.routes.o.tolist(),
+                                                 self.routes.d.tolist())]
+        indptr, indices = labels_to_csr(labels, len(d))
+        return simplex_csr(len(self.routes), indptr, indices, d)
 
     # ART
     # --------------------------------------------------------------------------
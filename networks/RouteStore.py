@@ -0,0 +1,221 @@
+from array import array
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+__author__ = 'cathywu'
+
+class RouteStore:
+    """
+    Compact array-backed store of routes
+
+    Route i visits nodes[offsets[i]:offsets[i+1]], goes from o[i] to d[i] and
+    carries cost[i] and flow[i]. Indexing the store returns a RouteView, a lazy
+    dict-like view of one route, so that code written against the former list
+    of {'path','cost','o','d','flow'} dicts keeps working.
+
+    Once index_edges has been called, route i also traverses the edge ids
+    edges[edge_offsets[i]:edge_offsets[i+1]] of an EdgeIndex.
+    """
+    def __init__(self, nodes, offsets, cost, o, d, flow=None):
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.cost = np.asarray(cost, dtype=np.float64)
+        self.o = np.asarray(o, dtype=np.int32)
+        self.d = np.asarray(d, dtype=np.int32)
+        if flow is None:
+            flow = np.zeros(self.cost.size)
+        self.flow = np.asarray(flow, dtype=np.float64)
+        self.edges, self.edge_offsets = None, None
+
+    @staticmethod
+    def from_routes(routes):
+        """
+        Build a store from a list of route dicts
+        :param routes: list of {'path','cost','o','d'[,'flow']} dicts
+        :return:
+        """
+        builder = RouteStoreBuilder()
+        for r in routes:
+            builder.append(r['path'], r['cost'], r['o'], r['d'],
+                           r.get('flow', 0))
+        return builder.build()
+
+    def __len__(self):
+        return self.cost.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('route index out of range')
+        return RouteView(self, i)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield RouteView(self, i)
+
+    def path(self, i):
+        """
+        Returns the sequence of nodes of route i as a list
+        :param i:
+        :return:
+        """
+        return self.nodes[self.offsets[i]:self.offsets[i+1]].tolist()
+
+    def paths(self):
+        nodes, offsets = self.nodes.tolist(), self.offsets.tolist()
+        return [nodes[s:e] for s, e in zip(offsets, offsets[1:])]
+
+    def lengths(self):
+        """
+        Returns the number of nodes of each route
+        :return:
+        """
+        return np.diff(self.offsets)
+
+    def index_edges(self, edge_index):
+        """
+        Express the routes as sequences of edge ids
+        :param edge_index: EdgeIndex of the graph the routes live on
+        :return:
+        """
+        # every route of n nodes has n-1 edges
+        self.edge_offsets = self.offsets - np.arange(len(self) + 1)
+        last = np.zeros(self.nodes.size, dtype=bool)
+        last[self.offsets[1:] - 1] = True
+        tails = np.flatnonzero(~last)
+        self.edges = edge_index.lookup(self.nodes[tails],
+                                       self.nodes[tails + 1]).astype(np.int32)
+        if (self.edges < 0).any():
+            raise KeyError('routes use edges that are not in the edge index')
+
+    def edge_ids(self, i):
+        """
+        Returns the edge ids of route i (see index_edges)
+        :param i:
+        :return:
+        """
+        return self.edges[self.edge_offsets[i]:self.edge_offsets[i+1]]
+
+    def edge_ranges(self, route_ids):
+        """
+        Positions in edges of the edges of the given routes (see index_edges)
+        :param route_ids: array of route indices
+        :return: concatenated positions, number of edges of each route
+        """
+        starts = self.edge_offsets[route_ids]
+        lengths = self.edge_offsets[route_ids + 1] - starts
+        pos = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + \
+              np.arange(lengths.sum())
+        return pos, lengths
+
+    def edge_incidence(self, num_edges, route_ids):
+        """
+        Sparse link-route incidence of the given routes, A[e,j] counting the
+        times route route_ids[j] traverses edge e
+        :param num_edges: number of edges of the edge index
+        :param route_ids: array of route indices
+        :return: CSC matrix, whose index arrays are the route edge arrays
+        """
+        pos, lengths = self.edge_ranges(route_ids)
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        return csc_matrix((np.ones(pos.size), self.edges[pos], indptr),
+                          shape=(num_edges, route_ids.size))
+
+    def nbytes(self):
+        arrays = [self.nodes, self.offsets, self.cost, self.o, self.d, self.flow]
+        if self.edges is not None:
+            arrays.extend([self.edges, self.edge_offsets])
+        return sum(x.nbytes for x in arrays)
+
+class RouteStoreBuilder:
+    """
+    Accumulates routes into compact typed buffers and packs them into a
+    RouteStore, without materializing per-route dicts
+    """
+    def __init__(self):
+        self.nodes = array('i')
+        self.offsets = array('l', [0])
+        self.cost = array('d')
+        self.o, self.d = array('i'), array('i')
+        self.flow = array('d')
+
+    def append(self, path, cost, o, d, flow=0):
+        self.nodes.extend(path)
+        self.offsets.append(len(self.nodes))
+        self.cost.append(cost)
+        self.o.append(o)
+        self.d.append(d)
+        self.flow.append(flow)
+
+    def extend(self, nodes, lengths, cost, o, d):
+        """
+        Append a batch of routes given as flat arrays, route j visiting the
+        next lengths[j] nodes
+        """
+        self.nodes.extend(nodes)
+        end = self.offsets[-1]
+        for length in lengths:
+            end += length
+            self.offsets.append(end)
+        self.cost.extend(cost)
+        self.o.extend(o)
+        self.d.extend(d)
+        self.flow.extend([0] * len(lengths))
+
+    def build(self):
+        return RouteStore(np.frombuffer(self.nodes, dtype=np.int32),
+                          np.frombuffer(self.offsets, dtype=np.int_),
+                          np.frombuffer(self.cost, dtype=np.float64),
+                          np.frombuffer(self.o, dtype=np.int32),
+                          np.frombuffer(self.d, dtype=np.int32),
+                          flow=np.frombuffer(self.flow, dtype=np.float64))
+
+class RouteView:
+    """
+    Lazy dict-like view of route i of a RouteStore (compatibility layer for
+    the former list of route dicts). Writes to 'flow' and 'cost' go through to
+    the store.
+    """
+    _keys = ('path', 'cost', 'o', 'd', 'flow')
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    def __getitem__(self, key):
+        if key == 'path':
+            return self.store.path(self.i)
+        elif key == 'flow':
+            return self.store.flow[self.i]
+        elif key == 'cost':
+            return self.store.cost[self.i]
+        elif key == 'o':
+            return int(self.store.o[self.i])
+        elif key == 'd':
+            return int(self.store.d[self.i])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'flow':
+            self.store.flow[self.i] = value
+        elif key == 'cost':
+            self.store.cost[self.i] = value
+        else:
+            raise KeyError('%s is read-only' % key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def get(self, key, default=None):
+        return self[key] if key in self._keys else default
+
+    def keys(self):
+        return list(self._keys)
+
+    def items(self):
+        return [(k, self[k]) for k in self._keys]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
@@ -8,6 +8,7 @@ import matplotlib
 import networkx as nx
 import numpy as np
 import scipy.io
+from scipy.sparse import csr_matrix
 import logging
 
 from networks.GridNetwork import GridNetwork
@@ -67,16 +68,16 @@ def generate_static_matrix(grid, flow_from_each_node=1.0):
     xs, ws, As, num_routes = [], [], [], []
     for node in grid.G.nodes():
         route_indices_from_node = route_indices_by_origin[node]
-        edges_in_route = [collections.Counter(zip(grid.routes[i]['path'],
-                                    grid.routes[i]['path'][1:])) for i in \
-                          route_indices_from_node]
+        paths = [grid.routes.path(i) for i in route_indices_from_node]
+        edges_in_route = [collections.Counter(zip(path, path[1:])) for path in \
+                          paths]
 
         x = np.zeros(shape=len(route_indices_from_node))
         w = np.zeros(shape=len(route_indices_from_node))
         A = np.zeros(shape=(len(grid.sensors), len(route_indices_from_node)))
         for j in xrange(len(route_indices_from_node)):
-            x[j] = grid.routes[route_indices_from_node[j]]['flow']
-            route = grid.routes[route_indices_from_node[j]]['path']
+            x[j] = grid.routes.flow[route_indices_from_node[j]]
+            route = paths[j]
             w[j] = sum(1./grid.G[de[0]][de[1]]['weight'] for de in \
                        zip(route, route[1:]))
 
@@ -99,59 +100,65 @@ def generate_static_matrix(grid, flow_from_each_node=1.0):
 
     return A, x, w, b, T, d, U, f, V, g, np.array(num_routes)
 
-def generate_static_matrix_OD(grid, only_Ab=False):
-    # All route indices are with respect to _routes_.
+def route_order_OD(grid):
+    """
+    Route indices in the column order of the OD matrices (OD pair by OD pair)
+    :param grid:
+    :return: route indices, number of routes of each OD pair
+    """
     route_indices_by_OD = grid.get_route_indices_by_OD()
-
-    # link flow vector
-    # b = np.array([grid.G[u][v]['flow'] for (u,v) in grid.sensors])
-
-    # initialize
-    xs, ws, As, num_routes = [], [], [], []
-
-    # build x, w, A, num_routes (for L1 constraints)
+    route_indices, num_routes = [], []
     for origin in grid.G.nodes():
         for dest in grid.G.nodes():
-            if origin not in grid.od_flows or dest not in grid.od_flows[origin]:
-                pass
-
             selected_route_indices_by_OD = route_indices_by_OD[origin][dest]
-            edges_in_route = [collections.Counter(zip(grid.routes[i]['path'],
-                                        grid.routes[i]['path'][1:])) for i in \
-                              selected_route_indices_by_OD]
-            # CAUTION: routes may double-count links for some reason
-
-            # initialize
-            x = np.zeros(shape=len(selected_route_indices_by_OD))
-            w = np.zeros(shape=len(selected_route_indices_by_OD))
-            A = np.zeros(shape=(len(grid.sensors),
-                                len(selected_route_indices_by_OD)))
-
-            # skip OD blocks that are all 0
-            # if grid.od_flows[origin][dest] == 0:
-            #     continue
-            # if grid.od_flows[origin][dest] == []:
-            #     continue
-
-            # build A, x, w block by block (1 origin)
-            for j in xrange(len(selected_route_indices_by_OD)):
-                x[j] = grid.routes[selected_route_indices_by_OD[j]]['flow']
-                route = grid.routes[selected_route_indices_by_OD[j]]['path']
-                # TODO what is w?
-                w[j] = sum(1./grid.G[u][v]['weight'] for (u,v) in zip(route,
-                                                                    route[1:]))
-
-                for i in xrange(len(grid.sensors)):
-                    if grid.sensors[i] in edges_in_route[j]:
-                        A[i, j] = 1
-
+            route_indices.extend(selected_route_indices_by_OD)
             num_routes.append(len(selected_route_indices_by_OD))
-            As.append(A)
-            ws.append(w)
-            xs.append(x)
+    return np.array(route_indices, dtype=np.int64), np.array(num_routes)
 
+def route_edges(grid, route_indices):
+    """
+    Edge ids of the given routes as a flat array, in route order
+    :param grid:
+    :param route_indices: column j is route route_indices[j]
+    :return: column and edge id of each route edge
+    """
+    pos, lengths = grid.routes.edge_ranges(route_indices)
+    cols = np.repeat(np.arange(route_indices.size), lengths)
+    return cols, grid.routes.edges[pos]
 
-    A,x,w = np.hstack(As), np.concatenate(xs), np.concatenate(ws)
+def link_route_incidence(grid, edges, route_indices):
+    """
+    Sparse link-route incidence matrix, built in one pass over route edges
+    :param grid:
+    :param edges: list of (u,v) links, one row each
+    :param route_indices: routes, one column each
+    :return: CSR matrix with A[i,j] = 1 if route j uses link i
+    """
+    cols, edge_ids = route_edges(grid, route_indices)
+    # edge id -> row
+    edge_rows = -np.ones(len(grid.edge_index), dtype=np.int64)
+    row_edge_ids = grid.edge_index.lookup_edges(edges)
+    found = row_edge_ids >= 0
+    edge_rows[row_edge_ids[found]] = np.flatnonzero(found)
+    rows = edge_rows[edge_ids]
+    found = rows >= 0
+    A = csr_matrix((np.ones(found.sum()), (rows[found], cols[found])),
+                   shape=(len(edges), route_indices.size))
+    # CAUTION: routes may double-count links for some reason
+    A.sum_duplicates()
+    A.data[:] = 1
+    return A
+
+def generate_static_matrix_OD(grid, only_Ab=False):
+    # All route indices are with respect to _routes_.
+    # Columns are ordered OD pair by OD pair (num_routes for L1 constraints)
+    route_indices, num_routes = route_order_OD(grid)
+
+    # link flow vector
+    # b = np.array([grid.G[u][v]['flow'] for (u,v) in grid.sensors])
+
+    A = link_route_incidence(grid, grid.sensors, route_indices)
+    x = grid.routes.flow[route_indices]
     # FIXME need to regenerate b because some routes went over the same link
     # twice, which we aren't counting
     b = A.dot(x)
@@ -159,11 +166,16 @@ def generate_static_matrix_OD(grid, only_Ab=False):
     if only_Ab is True:
         return A,b,x
 
+    # TODO what is w?
+    cols, edge_ids = route_edges(grid, route_indices)
+    w = np.bincount(cols, weights=1./grid.edge_index.weights[edge_ids],
+                    minlength=route_indices.size)
+
     T, d = grid.simplex_od()
     U, f = grid.simplex_cp() if grid.cp is not None else (None, None)
     V, g = grid.simplex_lp() if grid.lp is not None else (None, None)
 
-    return A, x, w, b, T, d, U, f, V, g, np.array(num_routes)
+    return A, x, w, b, T, d, U, f, V, g, num_routes
 
           
 def generate_random_matrix(grid, flow_from_each_node=1.0):
@@ -181,8 +193,8 @@ def generate_random_matrix(grid, flow_from_each_node=1.0):
         x = np.zeros(shape=len(route_indices_from_node))
         w = np.zeros(shape=len(route_indices_from_node))
         for j in xrange(len(route_indices_from_node)):
-            x[j] = grid.routes[route_indices_from_node[j]]['flow']
-            route = grid.routes[route_indices_from_node[j]]['path']
+            x[j] = grid.routes.flow[route_indices_from_node[j]]
+            route = grid.routes.path(route_indices_from_node[j])
             w[j] = sum(1./grid.G[de[0]][de[1]]['weight'] for de in zip(route,
                                                                 route[1:]))
         num_routes.append(len(route_indices_from_node))
@@ -8,6 +8,7 @@ from __future__ import division
 from cvxopt import matrix
 import numpy as np
 import logging
+from networks.wardrop.delays import FAMILIES
 
 class Graph:
     """Class Graph containing nodes, links, ODs, paths for traffic assignment"""
@@ -25,6 +26,7 @@ class Graph:
         self.indlinks = {} # indexation for matrix generations
         self.indods = {} # indexation for matrix generations
         self.indpaths = {} # indexation for matrix generations
+        self.table = LinkTable() # link attributes as arrays indexed by indlinks
         
     
     def add_node(self, position=None):
@@ -50,7 +52,7 @@ class Graph:
         if (startnode, endnode, route) in self.links:
             logging.error('link ({},{},{}) already exists.'.format(startnode, endnode, route)); return
         else:
-            link = Link(startnode, endnode, route, float(flow), float(delay), float(ffdelay), delayfunc)
+            link = Link(startnode, endnode, route, float(flow), float(delay), float(ffdelay), delayfunc, self.table)
             self.indlinks[(startnode, endnode, route)] = self.numlinks
             self.numlinks += 1
             self.links[(startnode, endnode, route)] = link
@@ -189,23 +191,17 @@ class Graph:
         
     def get_linkflows(self):
         """Get link flows in a column cvxopt matrix"""
-        linkflows = matrix(0.0, (self.numlinks, 1))
-        for id,link in self.links.items(): linkflows[self.indlinks[id]] = link.flow
-        return linkflows
+        return matrix(self.table.flow[:self.numlinks])
     
     
     def get_ffdelays(self):
         """Get ffdelays in a column cvxopt matrix"""
-        ffdelays = matrix(0.0, (self.numlinks, 1))
-        for id,link in self.links.items(): ffdelays[self.indlinks[id]] = link.delayfunc.ffdelay
-        return ffdelays
+        return matrix(self.table.ffdelay[:self.numlinks])
     
     
     def get_slopes(self):
         """Get slopes in a column cvxopt matrix"""
-        slopes = matrix(0.0, (self.numlinks, 1))
-        for id,link in self.links.items(): slopes[self.indlinks[id]] = link.delayfunc.slope
-        return slopes
+        return matrix(self.table.slope[:self.numlinks])
     
     
     def get_coefs(self):
@@ -218,10 +214,7 @@ class Graph:
         type = self.links.values()[0].delayfunc.type
         if type != 'Polynomial': logging.error('Delay functions must be polynomial'); return
         n, degree = self.numlinks, self.links.values()[0].delayfunc.degree
-        coefs = matrix(0.0, (n, degree))
-        for id,link in self.links.items():
-            for j in range(degree): coefs[self.indlinks[id],j] = link.delayfunc.coef[j]
-        return coefs
+        return matrix(self.table.coefs[:n,:degree])
     
     
     def get_ks(self):
@@ -233,11 +226,7 @@ class Graph:
         """
         type = self.links.values()[0].delayfunc.type
         if type != 'Hyperbolic': logging.error('Delay functions must be hyperbolic'); return
-        ks = matrix(0.0, (self.numlinks,2))
-        for id,link in self.links.items():
-            i = self.indlinks[id]
-            ks[i,0], ks[i,1] = link.delayfunc.k1, link.delayfunc.k2
-        return ks
+        return matrix(self.table.ks[:self.numlinks])
         
         
     def get_parameters(self):
@@ -249,9 +238,16 @@ class Graph:
     
     def update_linkflows_linkdelays(self, linkflows):
         """Update link flows and link delays in Graph object"""
-        for id,link in self.links.items():
-            flow = linkflows[self.indlinks[id]]
-            link.flow, link.delay = flow, link.delayfunc.compute_delay(flow)
+        n = self.numlinks
+        self.table.flow[:n] = np.array(linkflows, dtype=float).ravel()[:n]
+        self.table.delay[:n] = self.table.compute_delays(self.table.flow[:n])
+        
+        
+    def update_linkdelays(self, marginal=False):
+        """Update link delays in Graph object from the link flows, with the
+        marginal delays d(flow*delay)/dflow if marginal (e.g. for SO)"""
+        n = self.numlinks
+        self.table.delay[:n] = self.table.compute_delays(self.table.flow[:n], marginal)
         
         
     def update_pathdelays(self):
@@ -300,21 +296,126 @@ class Graph:
         return start_pos, end_pos
 
 
-class Link:
-    """A link in the graph"""
-    def __init__(self, startnode, endnode, route, flow=0.0, delay=0.0, ffdelay=0.0, delayfunc=None):
+class Link(object):
+    """A link in the graph
+    flow, delay and ffdelay are stored in the row index of a LinkTable"""
+    def __init__(self, startnode, endnode, route, flow=0.0, delay=0.0, ffdelay=0.0, delayfunc=None, table=None):
         self.startnode = startnode
         self.endnode = endnode
         self.route = route  #if multiple edges
+        self.delayfunc = delayfunc
+        if table is None: table = LinkTable()
+        self.table, self.index = table, table.append(delayfunc)
         self.flow = flow  #flow on the link
         self.delay = delay  #delay on the link
         self.ffdelay = ffdelay #free flow delay
-        self.delayfunc = delayfunc
         self.paths = {}  #set of paths passing through
         self.numpaths = 0
 
     def repr(self):
         return (self.startnode,self.endnode,self.route)
+
+    def _column(name):
+        def get(self): return getattr(self.table, name)[self.index]
+        def set(self, value): getattr(self.table, name)[self.index] = value
+        return property(get, set)
+
+    flow = _column('flow')
+    delay = _column('delay')
+    ffdelay = _column('ffdelay')
+    del _column
+
+
+class LinkTable(object):
+    """Columnar table of the link attributes of a Graph, one row per link in
+    the order of Graph.indlinks
+    flow, delay, ffdelay are shared with the Link objects (see Link)
+    slope, coefs (padded with zeros to the largest degree) and ks = (k1, k2)
+    are copied from the delay functions, which are not modified after the
+    link is added"""
+    def __init__(self):
+        self.size = 0
+        self.delayfuncs = []
+        self.flow, self.delay, self.ffdelay, self.slope = [np.zeros(0) for i in range(4)]
+        self.coefs, self.ks = np.zeros((0,0)), np.zeros((0,2))
+        self._families, self._others = None, None
+        
+    def append(self, delayfunc=None):
+        """Add a row for a link with delay function delayfunc, return its index"""
+        i, self.size = self.size, self.size+1
+        if self.size > len(self.flow): self._resize(max(2*len(self.flow), 16))
+        self.delayfuncs.append(delayfunc)
+        self._families = None
+        type = getattr(delayfunc, 'type', None)
+        if delayfunc is not None:
+            self.ffdelay[i], self.slope[i] = delayfunc.ffdelay, getattr(delayfunc, 'slope', 0.0)
+        if type == 'Polynomial':
+            if delayfunc.degree > self.coefs.shape[1]:
+                self.coefs = np.hstack((self.coefs, np.zeros((len(self.coefs), delayfunc.degree-self.coefs.shape[1]))))
+            self.coefs[i,:delayfunc.degree] = delayfunc.coef
+        if type == 'Hyperbolic': self.ks[i] = delayfunc.k1, delayfunc.k2
+        return i
+        
+    def _resize(self, capacity):
+        """Grow the arrays to capacity rows"""
+        def grow(a):
+            b = np.zeros((capacity,) + a.shape[1:])
+            b[:len(a)] = a
+            return b
+        self.flow, self.delay, self.ffdelay, self.slope = [grow(a) for a in
+                (self.flow, self.delay, self.ffdelay, self.slope)]
+        self.coefs, self.ks = grow(self.coefs), grow(self.ks)
+        
+    def families(self):
+        """Delay function families (see delays.FAMILIES) of the groups of links
+        of each type, as a list of (indices, family), and the indices of the
+        links of other types"""
+        if self._families is None:
+            types = np.array([getattr(f, 'type', None) for f in self.delayfuncs], dtype=object)
+            self._families, known = [], np.zeros(self.size, dtype=bool)
+            for type, family in sorted(FAMILIES.items()):
+                ind = np.flatnonzero(types == type)
+                if len(ind) == 0: continue
+                self._families.append((ind, family.from_funcs([self.delayfuncs[i] for i in ind])))
+                known[ind] = True
+            self._others = np.flatnonzero(~known)
+        return self._families, self._others
+        
+    def compute_delays(self, flows, marginal=False):
+        """Compute the delays (the marginal delays if marginal) of all the links
+        for link flows flows, at once for each type of delay function"""
+        flows = np.asarray(flows, dtype=float)
+        delays, (families, others) = self.delay[:self.size].copy(), self.families()
+        for ind, family in families:
+            delays[ind] = (family.marginal if marginal else family.delay)(flows[ind])
+        if marginal and len(others) > 0: raise ValueError('no marginal delays for links {}'.format(others))
+        for i in others:
+            if self.delayfuncs[i] is not None: delays[i] = self.delayfuncs[i].compute_delay(flows[i])
+        return delays
+        
+    def compute_integrals(self, flows):
+        """Compute the integrals of the delays of all the links from 0 to flows"""
+        flows = np.asarray(flows, dtype=float)
+        integrals, (families, others) = np.zeros(self.size), self.families()
+        if len(others) > 0: raise ValueError('no delay integrals for links {}'.format(others))
+        for ind, family in families: integrals[ind] = family.integral(flows[ind])
+        return integrals
+        
+    def compute_derivatives(self, flows, marginal=False):
+        """Compute the derivatives of the delays (of the marginal delays if
+        marginal) of all the links at flows"""
+        flows = np.asarray(flows, dtype=float)
+        derivatives, (families, others) = np.zeros(self.size), self.families()
+        if len(others) > 0: raise ValueError('no delay derivatives for links {}'.format(others))
+        for ind, family in families:
+            derivatives[ind] = (family.marginal_derivative if marginal else family.derivative)(flows[ind])
+        return derivatives
+        
+    def flow_bounds(self):
+        """Flows above which the delays of the links are not defined"""
+        bounds, (families, others) = np.inf*np.ones(self.size), self.families()
+        for ind, family in families: bounds[ind] = family.bound
+        return bounds
         
 
 class Node:
@@ -362,7 +463,9 @@ class PolyDelay:
         
     def compute_delay(self, flow):
         """Compute delay"""
-        return self.ffdelay + np.dot(self.coef, np.power(flow, range(1,self.degree+1)))
+        delay = 0.0
+        for c in reversed(self.coef): delay = (delay + c)*flow
+        return self.ffdelay + delay
     
     
 class HyperDelay:
@@ -381,6 +484,23 @@ class HyperDelay:
         """Compute delay"""
         k1, k2, ffdelay = self.k1, self.k2, self.ffdelay
         return ffdelay - k1/k2 + k1/(k2-flow)
+    
+    
+class BPRDelay:
+    """BPR Delay function
+    delay(x) = ffdelay*(1 + alpha*(slope*x)^beta)
+    slope is the inverse capacity, (alpha, beta) = (0.15, 4) is equivalent to
+    a polynomial delay with theta = [0.0, 0.0, 0.0, 0.15]"""
+    def __init__(self, ffdelay, slope, alpha=0.15, beta=4.0):
+        self.ffdelay = ffdelay
+        self.slope = slope
+        self.alpha = alpha
+        self.beta = beta
+        self.type = 'BPR'
+        
+    def compute_delay(self, flow):
+        """Compute delay"""
+        return self.ffdelay*(1.0 + self.alpha*(self.slope*flow)**self.beta)
         
 
 def create_delayfunc(type, parameters=None):
@@ -391,6 +511,8 @@ def create_delayfunc(type, parameters=None):
         return PolyDelay(parameters[0], parameters[1], parameters[2])
     if type == 'Hyperbolic':
         return HyperDelay(parameters[0], parameters[1], parameters[2], parameters[3])
+    if type == 'BPR':
+        return BPRDelay(*parameters)
     if type == 'Other':
         return Other(parameters[0], parameters[1], parameters[2])
 
@@ -15,6 +15,7 @@ from cvxopt import matrix, spmatrix
 import scipy.spatial as spa
 
 from networks.wardrop.util import find_basis
+from synth_utils import group_trajs, traj_paths
 import networks.wardrop.path_solver as path
 
 
@@ -202,17 +203,13 @@ class Waypoints:
             ids = self.closest_to_path(graph, path_id, n, fast)
 
             path_wps[path_id] = ids
-        wps_list, paths_list, flows_list = [], [], []
-        for path_id, wps in path_wps.items():
-            try:
-                index = wps_list.index(wps) # find the index of wps in wps_list
-                paths_list[index].append(path_id)
-                flows_list[index] += graph.paths[path_id].flow
-            except ValueError: # wps not in wps_list
-                wps_list.append(wps)
-                paths_list.append([path_id])
-                flows_list.append(graph.paths[path_id].flow)
-        return path_wps, zip(wps_list, paths_list, flows_list)
+        path_ids = path_wps.keys()
+        wps, _, indptr, indices, flows = group_trajs(
+            [path_wps[id] for id in path_ids],
+            [graph.paths[id].flow for id in path_ids])
+        paths = traj_paths(wps, indptr, indices, ids=path_ids)
+        return path_wps, [(list(wp), paths[wp], flow) for wp, flow in
+                          zip(wps, flows)]
 
     def _get_cp_trajs(self, graph, n, fast=False, tol=1e-3):
         path_cps, cp_trajs = self.cp.get_wp_trajs(graph.G,graph.routes,
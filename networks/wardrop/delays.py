@@ -0,0 +1,123 @@
+"""
+Delay functions of groups of links, evaluated on whole flow vectors at once
+
+Each family holds the parameter arrays of the links of one delay function
+type and computes, for link flows x,
+    delay(x):    t(x)
+    marginal(x): t(x) + x*t'(x), the marginal delay d/dx (x*t(x)) (SO)
+    integral(x): int_0^x t(u) du (UE objective)
+    derivative(x), marginal_derivative(x): derivatives of delay and marginal
+and bound, the flows above which delays are not defined (inf if none).
+See FAMILIES for the family of each Graph delay function type.
+"""
+
+import numpy as np
+
+__author__ = 'cathywu'
+
+
+def horner(c, u):
+    """Evaluate sum_j c[:,j] u^j for all the links at once
+
+    Parameters
+    ----------
+    c: array of size (n,m) of coefficients
+    u: array of size n
+    """
+    v = np.zeros(len(u))
+    for j in range(c.shape[1]-1, -1, -1): v = v*u + c[:,j]
+    return v
+
+
+class PolyDelays(object):
+    """Polynomial delays t(x) = ffdelay + sum_{k>=1} coefs[:,k-1] x^k"""
+    def __init__(self, ffdelay, coefs):
+        self.ffdelay = np.asarray(ffdelay, dtype=float)
+        self.coefs = np.asarray(coefs, dtype=float).reshape(len(self.ffdelay), -1)
+        self.bound = np.inf
+
+    @classmethod
+    def from_funcs(cls, funcs):
+        """Family of a list of PolyDelay, coefs padded with zeros"""
+        coefs = np.zeros((len(funcs), max([f.degree for f in funcs] + [0])))
+        for i, f in enumerate(funcs): coefs[i,:f.degree] = f.coef
+        return cls([f.ffdelay for f in funcs], coefs)
+
+    def delay(self, x):
+        return self.ffdelay + x*horner(self.coefs, x)
+
+    def marginal(self, x):
+        k = np.arange(2, self.coefs.shape[1]+2)
+        return self.ffdelay + x*horner(self.coefs*k, x)
+
+    def integral(self, x):
+        k = np.arange(2, self.coefs.shape[1]+2)
+        return x*(self.ffdelay + x*horner(self.coefs/k, x))
+
+    def derivative(self, x):
+        return horner(self.coefs*np.arange(1, self.coefs.shape[1]+1), x)
+
+    def marginal_derivative(self, x):
+        k = np.arange(1, self.coefs.shape[1]+1)
+        return horner(self.coefs*k*(k+1), x)
+
+
+class HyperDelays(object):
+    """Hyperbolic delays t(x) = ffdelay - k1/k2 + k1/(k2-x), for x < k2"""
+    def __init__(self, ffdelay, k1, k2):
+        self.ffdelay = np.asarray(ffdelay, dtype=float)
+        self.k1, self.k2 = np.asarray(k1, dtype=float), np.asarray(k2, dtype=float)
+        self.bound = self.k2
+
+    @classmethod
+    def from_funcs(cls, funcs):
+        """Family of a list of HyperDelay"""
+        return cls(*zip(*[(f.ffdelay, f.k1, f.k2) for f in funcs]))
+
+    def delay(self, x):
+        return self.ffdelay - self.k1/self.k2 + self.k1/(self.k2-x)
+
+    def marginal(self, x):
+        return self.delay(x) + x*self.k1/(self.k2-x)**2
+
+    def integral(self, x):
+        return (self.ffdelay - self.k1/self.k2)*x - self.k1*np.log(1.0 - x/self.k2)
+
+    def derivative(self, x):
+        return self.k1/(self.k2-x)**2
+
+    def marginal_derivative(self, x):
+        return 2.0*self.k1*self.k2/(self.k2-x)**3
+
+
+class BPRDelays(object):
+    """BPR delays t(x) = ffdelay*(1 + alpha*(slope*x)^beta), with slope the
+    inverse capacity"""
+    def __init__(self, ffdelay, slope, alpha=0.15, beta=4.0):
+        self.ffdelay, self.slope = np.asarray(ffdelay, dtype=float), np.asarray(slope, dtype=float)
+        self.alpha, self.beta = np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float)
+        self.bound = np.inf
+
+    @classmethod
+    def from_funcs(cls, funcs):
+        """Family of a list of BPRDelay"""
+        return cls(*zip(*[(f.ffdelay, f.slope, f.alpha, f.beta) for f in funcs]))
+
+    def delay(self, x):
+        return self.ffdelay*(1.0 + self.alpha*(self.slope*x)**self.beta)
+
+    def marginal(self, x):
+        return self.ffdelay*(1.0 + self.alpha*(1.0+self.beta)*(self.slope*x)**self.beta)
+
+    def integral(self, x):
+        return self.ffdelay*x*(1.0 + self.alpha*(self.slope*x)**self.beta/(1.0+self.beta))
+
+    def derivative(self, x):
+        return self.ffdelay*self.alpha*self.beta*self.slope*(self.slope*x)**(self.beta-1.0)
+
+    def marginal_derivative(self, x):
+        return (1.0+self.beta)*self.derivative(x)
+
+
+# family of each type of delay function (see Graph.create_delayfunc)
+FAMILIES = {'Polynomial': PolyDelays, 'Hyperbolic': HyperDelays, 'BPR': BPRDelays}
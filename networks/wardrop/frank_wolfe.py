@@ -0,0 +1,261 @@
+'''
+Link-based traffic assignment with the Frank-Wolfe algorithm and its
+conjugate (CFW) and bi-conjugate (BFW) variants
+(see Mitradjieva and Lindberg, The stiff is moving - conjugate direction
+Frank-Wolfe methods with applications to traffic assignment, 2013)
+
+All-or-nothing assignments are computed on shortest path trees from each
+origin (scipy.sparse.csgraph), and flows are kept in numpy arrays indexed
+like Graph.indlinks.
+
+@author: cathywu
+'''
+
+import logging
+
+import numpy as np
+from cvxopt import matrix
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+class Network:
+    """Arrays of the links and OD pairs of a Graph for all-or-nothing loading
+
+    Parameters
+    ----------
+    graph: graph object
+    """
+    def __init__(self, graph):
+        self.numnodes, self.numlinks = graph.numnodes, graph.numlinks
+        self.tails, self.heads = np.zeros(self.numlinks, dtype=int), np.zeros(self.numlinks, dtype=int)
+        for (s,t,r), i in graph.indlinks.items(): self.tails[i], self.heads[i] = s-1, t-1
+        ods = sorted((graph.indods[id], od.o-1, od.d-1, od.flow) for id, od in graph.ODs.items())
+        _, o, d, flow = zip(*ods) if ods else ((),)*4
+        self.origins, od_origins = np.unique(np.array(o, dtype=int), return_inverse=True)
+        self.od_origins, self.od_dests = od_origins, np.array(d, dtype=int)
+        self.demands = np.array(flow, dtype=float)
+        # (tail, head) pairs of the links, parallel links share a pair
+        keys = self.tails*self.numnodes + self.heads
+        self.pair_keys, self.pair_of_link = np.unique(keys, return_inverse=True)
+        self.indptr = np.searchsorted(self.pair_keys // self.numnodes, np.arange(self.numnodes+1))
+        self.pair_heads = self.pair_keys % self.numnodes
+
+    def shortest_links(self, costs):
+        """Cheapest link of each (tail, head) pair and its cost"""
+        order = np.lexsort((costs, self.pair_of_link))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = self.pair_of_link[order][1:] != self.pair_of_link[order][:-1]
+        links = order[first]
+        return links, costs[links]
+
+    def all_or_nothing(self, costs, paths=False):
+        """Assign all the demand of each OD pair to a shortest path for link
+        costs costs
+
+        Return value
+        ------------
+        flows: link flows
+        nodes: if paths, array of size (numODs, length) of the nodes of the
+               shortest path of each OD pair from the destination back to the
+               origin, padded with -1
+        """
+        links, pair_costs = self.shortest_links(costs)
+        G = csr_matrix((pair_costs, self.pair_heads, self.indptr), shape=(self.numnodes,)*2)
+        dist, pred = dijkstra(G, indices=self.origins, return_predecessors=True)
+        if np.isinf(dist[self.od_origins, self.od_dests]).any():
+            raise ValueError('some OD pairs are not connected')
+        # walk back from the destinations of all OD pairs at once
+        flows, cur = np.zeros(self.numlinks), self.od_dests.copy()
+        active = np.flatnonzero(cur != self.origins[self.od_origins])
+        steps = [cur.copy()]
+        while len(active) > 0:
+            head = cur[active]
+            tail = pred[self.od_origins[active], head]
+            pair = np.searchsorted(self.pair_keys, tail*self.numnodes + head)
+            np.add.at(flows, links[pair], self.demands[active])
+            cur[active] = tail
+            if paths:
+                steps.append(-np.ones(len(cur), dtype=int))
+                steps[-1][active] = tail
+            active = active[tail != self.origins[self.od_origins[active]]]
+        if not paths: return flows
+        return flows, np.array(steps).T
+
+    def path_links(self, nodes, costs):
+        """Link indices of the shortest paths of all_or_nothing(costs,
+        paths=True) from their nodes, as a list of arrays from the origin to
+        the destination"""
+        links, _ = self.shortest_links(costs)
+        heads, tails = nodes[:,:-1], nodes[:,1:]
+        valid = tails >= 0
+        pairs = np.searchsorted(self.pair_keys, np.where(valid, tails*self.numnodes + heads, 0))
+        return [links[row[ok]][::-1] for row, ok in zip(pairs, valid)]
+
+
+class PathFlows:
+    """Decomposition of the assignments of the algorithm into path flows:
+    columns are the paths found by all-or-nothing assignments and each
+    assignment is a vector of path flows"""
+    def __init__(self, network):
+        self.network = network
+        self.ids = {}   # (OD index, nodes) -> column
+        self.paths = [] # node ids of each column
+        self.ods = []   # OD index of each column
+
+    def columns(self, nodes):
+        """Columns of the shortest paths of all-or-nothing nodes (see
+        Network.all_or_nothing), added if needed"""
+        cols = np.zeros(len(nodes), dtype=int)
+        for i, row in enumerate(nodes):
+            key = (i, tuple(row[row >= 0]))
+            if key not in self.ids:
+                self.ids[key] = len(self.paths)
+                self.paths.append([u+1 for u in reversed(key[1])])
+                self.ods.append(i)
+            cols[i] = self.ids[key]
+        return cols
+
+    def assignment(self, nodes):
+        """Path flows of an all-or-nothing assignment"""
+        cols = self.columns(nodes)
+        flows = np.zeros(len(self.paths))
+        np.add.at(flows, cols, self.network.demands)
+        return flows
+
+    def extend(self, flows):
+        """Path flows padded with zeros to the current number of paths"""
+        if flows is None or len(flows) == len(self.paths): return flows
+        return np.concatenate([flows, np.zeros(len(self.paths)-len(flows))])
+
+
+def line_search(graph, x, d, SO=False, tol=1e-10):
+    """Step size a in [0,1] minimizing the objective on x + a*d, by bisection
+    on its derivative, restricted to the domain of the delay functions"""
+    table = graph.table
+    grad = lambda a: np.dot(table.compute_delays(x + a*d, SO), d)
+    bounded = (d > 0) & np.isfinite(table.flow_bounds())
+    amax = 1.0
+    if bounded.any():
+        amax = min(amax, np.min((table.flow_bounds() - x)[bounded]/d[bounded])*(1.0-1e-9))
+    if grad(amax) <= 0.0: return amax
+    lo, hi = 0.0, amax
+    while hi - lo > tol:
+        a = 0.5*(lo + hi)
+        if grad(a) > 0.0: hi = a
+        else: lo = a
+    return 0.5*(lo + hi)
+
+
+def combine(b, vectors):
+    """sum_i b[i]*vectors[i] over the nonzero b[i]"""
+    return sum([bi*v for bi, v in zip(b, vectors) if bi != 0.0])
+
+
+def conjugate_weights(method, H, x, y, s, s2, a):
+    """Weights b of the new search point b[0]*y + b[1]*s + b[2]*s2, with y
+    the all-or-nothing assignment, s, s2 the previous search points and a
+    the previous step size, such that the direction is conjugate to the
+    previous ones w.r.t. the diagonal Hessian H (falls back to CFW, FW)"""
+    if method == 'BFW' and s2 is not None and a < 1.0:
+        d1, d2 = s - x, a*s - x + (1.0-a)*s2
+        n2, n1 = np.dot(d2*H, s2 - s), np.dot(d1*H, d1)
+        if n2 != 0.0 and n1 != 0.0:
+            mu = max(0.0, -np.dot(d2*H, y - x) / n2)
+            nu = max(0.0, -np.dot(d1*H, y - x) / n1 + mu*a/(1.0-a))
+            return np.array([1.0, nu, mu]) / (1.0 + nu + mu)
+    if method in ('CFW', 'BFW') and s is not None:
+        den = np.dot((s - x)*H, y - s)
+        alpha = np.dot((s - x)*H, y - x) / den if den != 0.0 else 0.0
+        # s would be (nearly) kept as is and the iterations jam: FW step
+        if alpha > 1.0-1e-5: alpha = 0.0
+        return np.array([1.0-max(alpha, 0.0), max(alpha, 0.0), 0.0])
+    return np.array([1.0, 0.0, 0.0])
+
+
+def solver(graph, update=False, SO=False, method='BFW', tol=1e-4, max_iter=1000, full=False, increments=10):
+    """Find the UE (SO) link flows with the Frank-Wolfe algorithm
+
+    Parameters
+    ----------
+    graph: graph object, with delay functions of types in delays.FAMILIES
+    update: if True, update link flows and link, path delays in graph
+    SO: if True compute SO
+    method: 'FW' (Frank-Wolfe), 'CFW' (conjugate) or 'BFW' (bi-conjugate)
+    tol: stop when the relative gap is below tol
+    max_iter: maximum number of iterations
+    full: if True, also return the relative gaps and a decomposition in
+          path flows
+    increments: if some delays are bounded (hyperbolic), the initial flows
+                are loaded in this number of all-or-nothing increments
+
+    Return value
+    ------------
+    linkflows: matrix of link flows
+    gaps: if full, relative gap of each iteration
+    paths, pathflows: if full, node ids of the paths used by the assignment,
+                      and their flows
+    """
+    if method not in ('FW', 'CFW', 'BFW'): raise ValueError('unknown method {}'.format(method))
+    network, table = Network(graph), graph.table
+    paths = PathFlows(network) if full else None
+
+    def aon(x):
+        costs = table.compute_delays(x, SO)
+        if not full: return costs, network.all_or_nothing(costs), None
+        y, nodes = network.all_or_nothing(costs, paths=True)
+        return costs, y, paths.assignment(nodes)
+
+    bounds = table.flow_bounds()
+    n = increments if np.isfinite(bounds).any() else 1
+    x, px = np.zeros(network.numlinks), np.zeros(0)
+    for i in range(n):
+        _, y, py = aon(x)
+        x = x + y/n
+        if full: px = paths.extend(px) + py/n
+    if (x >= bounds).any(): raise ValueError('initial flows exceed the bounds of the delays')
+
+    s = s2 = ps = ps2 = None
+    a, gaps = 1.0, []
+    for k in range(max_iter):
+        costs, y, py = aon(x)
+        gap = (np.dot(costs, x) - np.dot(costs, y)) / np.dot(costs, x)
+        gaps.append(gap)
+        logging.debug('{} iteration {}: relative gap {}'.format(method, k, gap))
+        if gap < tol: break
+        if full: px, ps, ps2 = [paths.extend(p) for p in (px, ps, ps2)]
+        b = conjugate_weights(method, table.compute_derivatives(x, SO) if method != 'FW' else None, x, y, s, s2, a)
+        # restart from a FW step, without the previous search points, if the
+        # direction is not a descent direction
+        restart = b[0] < 1.0 and np.dot(costs, combine(b, (y, s, s2)) - x) >= 0.0
+        if restart: b = np.array([1.0, 0.0, 0.0])
+        s, s2 = combine(b, (y, s, s2)), None if restart else s
+        if full: ps, ps2 = combine(b, (py, ps, ps2)), None if restart else ps
+        a = line_search(graph, x, s - x, SO)
+        x = x + a*(s - x)
+        if full: px = px + a*(ps - px)
+
+    linkflows = matrix(x)
+    if update:
+        logging.debug('Update link flows, delays in Graph.'); graph.update_linkflows_linkdelays(linkflows)
+        logging.debug('Update path delays in Graph.'); graph.update_pathdelays()
+    if not full: return linkflows
+    return linkflows, gaps, paths.paths, paths.extend(px)
+
+
+def used_paths(graph, paths, pathflows, tol=1e-3):
+    """Paths carrying more than tol of the demand of their OD pair, and their
+    flows rescaled to the demands
+
+    Parameters
+    ----------
+    graph: graph object
+    paths, pathflows: from solver(graph, full=True)
+    tol: threshold relative to the demand
+    """
+    keep, total = {}, {}
+    for p, f in zip(paths, pathflows):
+        od = graph.ODs[(p[0], p[-1])]
+        if f > tol*od.flow: keep[tuple(p)] = f; total[(p[0], p[-1])] = total.get((p[0], p[-1]), 0.0) + f
+    used = sorted(keep)
+    return [list(p) for p in used], np.array([keep[p]*graph.ODs[(p[0], p[-1])].flow/total[(p[0], p[-1])] for p in used])
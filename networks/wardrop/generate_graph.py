@@ -72,6 +72,10 @@ def los_angeles(parameters=None, delaytype='None', noise=0.0, path=None):
         for startnode, endnode, route, ffdelay, slope in tmp:
             k1, k2 = a*ffdelay/slope, b/slope
             links.append((startnode, endnode, route, ffdelay, (ffdelay, slope, k1, k2)))
+    if delaytype=='BPR':
+        alpha, beta = parameters
+        for startnode, endnode, route, ffdelay, slope in tmp:
+            links.append((startnode, endnode, route, ffdelay, (ffdelay, slope, alpha, beta)))
     if delaytype=='None':
         for startnode, endnode, route, ffdelay, slope in tmp: links.append((startnode, endnode, route, ffdelay, None))
            
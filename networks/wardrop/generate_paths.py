@@ -10,10 +10,58 @@ import networks.wardrop.path_solver as path
 from cvxopt import matrix
 from networks.wardrop.generate_graph import los_angeles
 import networks.wardrop.shortest_paths as sh
+from networks.ArrayCache import ArrayCache, pack_lists, unpack_lists
 
 
 theta = matrix([0.0, 0.0, 0.0, 0.15])
 
+# In-process memo of UE/SO link flows and path sets, see cached
+_memo = {}
+
+
+def cached(key, compute, cache_dir=None):
+    """Memoize compute(), which returns a dict of arrays, in process and in an
+    ArrayCache in cache_dir if given
+    """
+    if key in _memo: return _memo[key]
+    cache = ArrayCache(cache_dir) if cache_dir is not None else None
+    arrays = cache.get(key, mmap_mode=None) if cache is not None else None
+    if arrays is None:
+        arrays = compute()
+        if cache is not None: cache.put(key, arrays)
+    _memo[key] = arrays
+    return arrays
+
+
+def data_hash(path=None):
+    """Hash of the contents of the L.A. data file (see los_angeles)"""
+    if not path: path = 'los_angeles_data_2.mat'
+    key = ('data_hash', path)
+    if key not in _memo: _memo[key] = ArrayCache.file_hash(path)
+    return _memo[key]
+
+
+def ue_linkflows(g, SO, demand, path=None, cache_dir=None):
+    """Compute the UE/SO link flows of los_angeles(theta, 'Polynomial')[demand]
+    (g) with the node-link formulation, memoized, and update g with them
+    
+    Parameters:
+    -----------
+    g: graph of the demand, modified in place like ue.solver(g, update=True)
+    SO: if False, compute the UE, if True, compute the SO
+    demand: choice of OD demand
+    path: data file
+    cache_dir: directory of the persistent cache
+    """
+    key = ArrayCache.key('ue_linkflows', SO, demand, list(theta), 'Polynomial',
+                         data_hash(path))
+    arrays = cached(key, lambda: {'l': np.array(ue.solver(g, SO=SO)).ravel()},
+                    cache_dir)
+    l = matrix(arrays['l'].tolist())
+    g.update_linkflows_linkdelays(l)
+    g.update_pathdelays()
+    return l
+
 
 def test_helper(demand, paths):
     g = los_angeles(theta, 'Polynomial')[demand]
@@ -43,7 +91,8 @@ def get_shortest_paths(g, K):
     return paths
     
 
-def get_paths(SO, K, demand, return_paths=True, ffdelays=False, path=None):
+def get_paths(SO, K, demand, return_paths=True, ffdelays=False, path=None,
+              cache_dir=None):
     """This experiment does the following tests:
     1. compute the UE/SO link flows using node-link formulation 
     2. get the link delays for the UE/SO link flow
@@ -59,17 +108,16 @@ def get_paths(SO, K, demand, return_paths=True, ffdelays=False, path=None):
     demand: choice of OD demand
     return_paths: if True, return paths
     ffdelays: if True the k-shortest paths are obtained from ff delays
+    cache_dir: directory of the persistent cache of the UE/SO link flows
     
     Return value:
     ------------
     """
     g = los_angeles(theta, 'Polynomial', path=path)[demand]
     if ffdelays: paths = get_shortest_paths(g, K)
-    l1 = ue.solver(g, update=True, SO=SO)
+    l1 = ue_linkflows(g, SO, demand, path, cache_dir)
     d1 = sum([link.delay*link.flow for link in g.links.values()])
-    if SO:
-        for link in g.links.values():
-            link.delay = link.ffdelay*(1+0.75*(link.flow*link.delayfunc.slope)**4)
+    if SO: g.update_linkdelays(marginal=True)
     if not ffdelays: paths = get_shortest_paths(g, K)
     if return_paths: return paths
     for p in paths: g.add_path_from_nodes(p)
@@ -101,7 +149,8 @@ def find_optimum_K(tol=1.0):
         print result
 
 
-def find_UESOpaths(SO, return_paths=True, random=False, path=None):
+def find_UESOpaths(SO, return_paths=True, random=False, path=None,
+                   cache_dir=None):
     """
     1. take the union for all optimum shortest paths for UE/SO
     2. compute UE/SO using node-link and link-path formulation for all demands
@@ -111,14 +160,22 @@ def find_UESOpaths(SO, return_paths=True, random=False, path=None):
     -----------
     SO: if False, compute the UE, if True, compute the SO
     return_paths: if True, do only step 1 and return paths, if False, do steps 2 and 3
+    cache_dir: directory of the persistent cache of the paths and UE/SO link flows
     """
-    paths, ls, ds, ps = [], [], [], []
+    ls, ds, ps = [], [], []
     K = [2,3,3,4] #[2, 2, 2, 3] [5,5,5,5]
     if SO: K = [2, 2, 4, 7] #[2,4,7,9]
-    for i in range(4):
-        tmp = get_paths(SO, K[i], i, path=path)
-        for p in tmp:
-            if p not in paths: paths.append(p)
+    def union():
+        paths = []
+        for i in range(4):
+            tmp = get_paths(SO, K[i], i, path=path, cache_dir=cache_dir)
+            for p in tmp:
+                if p not in paths: paths.append(p)
+        nodes, offsets = pack_lists(paths)
+        return {'nodes': nodes, 'offsets': offsets}
+    key = ArrayCache.key('find_UESOpaths', SO, K, list(theta), data_hash(path))
+    arrays = cached(key, union, cache_dir)
+    paths = unpack_lists(arrays['nodes'], arrays['offsets'])
     if return_paths: return paths
     for i in range(4):
         g = los_angeles(theta, 'Polynomial')[i]
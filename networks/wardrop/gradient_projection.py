@@ -0,0 +1,256 @@
+'''
+Path-based traffic assignment with gradient projection and column generation
+(see Jayakrishnan et al., A faster path-based algorithm for traffic
+assignment, 1994)
+
+Each iteration adds the current shortest path of every OD pair to the path
+set, then moves flow from the other paths of the OD pair to it by projected
+Newton steps, scaled by a line search on the link flows. Paths are kept in
+compact arrays (a sparse link-path incidence matrix and a vector of path
+flows) and dropped once they carry no flow.
+
+@author: cathywu
+'''
+
+import logging
+
+import numpy as np
+from cvxopt import matrix
+from scipy.sparse import csc_matrix
+
+from networks.wardrop.frank_wolfe import Network, line_search
+
+
+class PathSet:
+    """Paths of the OD pairs as arrays of link indices and their flows
+
+    Parameters
+    ----------
+    network: frank_wolfe.Network of the graph
+    """
+    def __init__(self, network):
+        self.network = network
+        self.ids = {}    # (OD index, link indices) -> column
+        self.links = []  # link indices of each column
+        self.ods = np.zeros(0, dtype=int)  # OD index of each column
+        self.flows = np.zeros(0)
+
+    def add(self, links, ods=None):
+        """Columns of the paths links[i] of each OD pair i (of OD pair ods[i]
+        if given), added with zero flow if needed"""
+        if ods is None: ods = range(len(links))
+        cols, new = np.zeros(len(links), dtype=int), []
+        for j, (i, path) in enumerate(zip(ods, links)):
+            key = (i, tuple(path))
+            if key not in self.ids:
+                self.ids[key] = len(self.links)
+                self.links.append(np.asarray(path, dtype=int)); new.append(i)
+            cols[j] = self.ids[key]
+        self.ods = np.concatenate([self.ods, np.array(new, dtype=int)])
+        self.flows = np.concatenate([self.flows, np.zeros(len(new))])
+        return cols
+
+    def incidence(self):
+        """Sparse link-path incidence matrix"""
+        indptr = np.cumsum([0] + [len(p) for p in self.links])
+        indices = np.concatenate(self.links) if self.links else np.zeros(0, dtype=int)
+        return csc_matrix((np.ones(len(indices)), indices, indptr),
+                          shape=(self.network.numlinks, len(self.links)))
+
+    def keep(self, mask):
+        """Keep the columns in mask only"""
+        self.links = [p for p, k in zip(self.links, mask) if k]
+        self.ods, self.flows = self.ods[mask], self.flows[mask]
+        self.ids = dict(((i, tuple(p)), j) for j, (i, p) in enumerate(zip(self.ods, self.links)))
+
+
+def projection(P, ods, flows, demands, shortest, costs, derivatives):
+    """Path flows after a projected Newton step moving flow to the shortest
+    path of each OD pair
+
+    Parameters
+    ----------
+    P: link-path incidence matrix
+    ods: OD index of each path
+    flows: path flows
+    demands: demand of each OD pair
+    shortest: column of the shortest path of each OD pair
+    costs, derivatives: link costs and their derivatives
+    """
+    C, D = P.T.dot(costs), P.T.dot(derivatives)
+    s = shortest[ods]
+    # second derivative along the shift of flow from a path to the shortest
+    # one: derivatives of the links in one path but not in both
+    H = D + D[s] - 2.0*np.asarray(P.multiply(P[:,s]).T.dot(derivatives)).ravel()
+    step = np.maximum(C - C[s], 0.0) / np.maximum(H, 1e-12)
+    new = np.where(np.arange(len(flows)) == s, 0.0, np.maximum(flows - step, 0.0))
+    new[shortest] = demands - np.bincount(ods, new, minlength=len(demands))
+    return new
+
+
+def solver(graph, update=False, SO=False, tol=1e-4, max_iter=1000, full=False, increments=10,
+           warm_start=None):
+    """Find the UE (SO) link and path flows by gradient projection
+
+    Parameters
+    ----------
+    graph: graph object, with delay functions of types in delays.FAMILIES
+    update: if True, add the used paths to graph and update link flows, link
+            and path delays, and path flows in graph
+    SO: if True compute SO
+    tol: stop when the relative gap is below tol
+    max_iter: maximum number of iterations
+    full: if True, also return the relative gaps and the path flows
+    increments: if some delays are bounded (hyperbolic), the initial flows
+                are loaded in this number of all-or-nothing increments
+    warm_start: (paths, pathflows) to start from, e.g. of a previous solve on
+                the same network (with full=True or from graph_paths), with
+                the flows scaled to the demands of each OD pair of graph
+
+    Return value
+    ------------
+    linkflows: matrix of link flows
+    gaps: if full, relative gap of each iteration
+    paths, pathflows: if full, link indices of the used paths and their flows
+    """
+    network, table = Network(graph), graph.table
+    paths, demands = PathSet(network), network.demands
+
+    def shortest(x):
+        costs = table.compute_delays(x, SO)
+        y, nodes = network.all_or_nothing(costs, paths=True)
+        return costs, y, paths.add(network.path_links(nodes, costs))
+
+    bounds = table.flow_bounds()
+    x = None
+    if warm_start is not None:
+        x = initial_flows(paths, warm_start, lambda x: table.compute_delays(x, SO))
+        if x is not None and (x >= bounds).any():
+            logging.info('Warm start exceeds the bounds of the delays, start from scratch.')
+            paths.keep(np.zeros(len(paths.links), dtype=bool)); x = None
+    if x is None:
+        n = increments if np.isfinite(bounds).any() else 1
+        x = np.zeros(network.numlinks)
+        for i in range(n):
+            _, y, cols = shortest(x)
+            paths.flows[cols] += demands/n
+            x = x + y/n
+        if (x >= bounds).any(): raise ValueError('initial flows exceed the bounds of the delays')
+
+    gaps = []
+    for k in range(max_iter):
+        costs, y, cols = shortest(x)
+        gap = (np.dot(costs, x) - np.dot(costs, y)) / np.dot(costs, x)
+        gaps.append(gap)
+        logging.debug('GP iteration {}: relative gap {}, {} paths'.format(k, gap, len(paths.links)))
+        if gap < tol: break
+        P = paths.incidence()
+        new = projection(P, paths.ods, paths.flows, demands, cols, costs,
+                         table.compute_derivatives(x, SO))
+        a = line_search(graph, x, P.dot(new - paths.flows), SO)
+        paths.flows += a*(new - paths.flows)
+        x = P.dot(paths.flows)
+        # drop the paths left without flow
+        mask = paths.flows > 0.0
+        if not mask.all(): paths.keep(mask)
+
+    linkflows = matrix(paths.incidence().dot(paths.flows))
+    if update: update_graph(graph, paths.links, paths.flows)
+    if not full: return linkflows
+    return linkflows, gaps, paths.links, paths.flows
+
+
+def initial_flows(paths, warm_start, delays):
+    """Add the paths of warm_start to paths with their flows scaled to the
+    demands, and the shortest paths of the OD pairs without flow
+
+    Parameters
+    ----------
+    paths: PathSet
+    warm_start: (paths, pathflows) as in solver
+    delays: function of the link costs at link flows
+
+    Return value
+    ------------
+    x: link flows, None if no path of warm_start is in the network
+    """
+    network = paths.network
+    index = dict(((o, d), i) for i, (o, d) in enumerate(zip(
+        network.origins[network.od_origins], network.od_dests)))
+    links, ods, flows = [], [], []
+    for p, f in zip(*warm_start):
+        p = np.asarray(p, dtype=int)
+        i = index.get((network.tails[p[0]], network.heads[p[-1]]))
+        if i is not None and f > 0.0: links.append(p); ods.append(i); flows.append(f)
+    if not links: return None
+    cols = paths.add(links, ods)
+    totals = np.bincount(ods, flows, minlength=len(network.demands))
+    missing = totals <= 0.0
+    np.add.at(paths.flows, cols, np.array(flows) * (network.demands/np.where(missing, 1.0, totals))[ods])
+    x = paths.incidence().dot(paths.flows)
+    if missing.any():
+        costs = delays(x)
+        _, nodes = network.all_or_nothing(costs, paths=True)
+        cols = paths.add(network.path_links(nodes, costs))
+        paths.flows[cols[missing]] += network.demands[missing]
+        x = paths.incidence().dot(paths.flows)
+    return x
+
+
+def graph_paths(graph):
+    """Paths of graph as link indices and their flows, e.g. to warm start
+    solver on another graph of the same network"""
+    return ([[graph.indlinks[(l.startnode, l.endnode, l.route)] for l in p.links] for p in graph.paths.values()],
+            [p.flow for p in graph.paths.values()])
+
+
+def update_graph(graph, paths, flows):
+    """Add paths given by link indices to graph if they are not in it yet, and
+    update link flows, link and path delays, and path flows in graph
+
+    Parameters
+    ----------
+    graph: graph object
+    paths, flows: link indices of the paths and their flows, e.g. from
+                  solver(graph, full=True)
+
+    Return value
+    ------------
+    p_flow: matrix of the flows of all the paths of graph (see pathflows)
+    """
+    logging.debug('Add used paths to Graph.'); p_flow = pathflows(graph, paths, flows)
+    linkflows = matrix(0.0, (graph.numlinks, 1))
+    for p, f in zip(paths, flows): linkflows[list(p)] += f
+    logging.debug('Update link flows, delays in Graph.'); graph.update_linkflows_linkdelays(linkflows)
+    logging.debug('Update path delays in Graph.'); graph.update_pathdelays()
+    logging.debug('Update path flows in Graph object.'); graph.update_pathflows(p_flow)
+    return p_flow
+
+
+def add_paths(graph, paths):
+    """Add paths given by link indices to graph if they are not in it yet
+
+    Return value
+    ------------
+    ids: ids of the paths in graph
+    """
+    link_ids = dict((i, id) for id, i in graph.indlinks.items())
+    ids = []
+    for p in paths:
+        p = [link_ids[i] for i in p]
+        od, found = graph.ODs[(p[0][0], p[-1][1])], None
+        for id, path in od.paths.items():
+            if [(l.startnode, l.endnode, l.route) for l in path.links] == p: found = id
+        if found is None:
+            graph.add_path(p); found = (od.o, od.d, od.numpaths)
+        ids.append(found)
+    return ids
+
+
+def pathflows(graph, paths, flows):
+    """Matrix of the flows of all the paths of graph (indexed by indpaths),
+    zero for the paths not in paths"""
+    ids = add_paths(graph, paths)
+    x = matrix(0.0, (graph.numpaths, 1))
+    for id, f in zip(ids, flows): x[graph.indpaths[id]] = f
+    return x
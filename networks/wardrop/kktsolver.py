@@ -20,22 +20,25 @@ along with CVXPY.  If not, see <http://www.gnu.org/licenses/>.
 # A custom KKT solver for CVXOPT that can handle redundant constraints.
 # Uses regularization and iterative refinement.
 
-from cvxopt import blas, lapack
-from cvxopt.base import matrix
+from cvxopt import blas, lapack, umfpack
+from cvxopt.base import matrix, sparse, spdiag, mul
 from cvxopt.misc import scale, pack, unpack
 
 # Regularization constant.
 REG_EPS = 1e-9
 
 # Returns a kktsolver for linear cone programs (or nonlinear if F is given).
-def get_kktsolver(G, dims, A, F=None):
+# With sparse_kkt=True, the KKT system is factored with a sparse LU (only for
+# programs with linear inequalities, see kkt_sparse).
+def get_kktsolver(G, dims, A, F=None, sparse_kkt=False):
+    kkt = kkt_sparse if sparse_kkt else kkt_ldl
     if F is None:
-        factor = kkt_ldl(G, dims, A)
+        factor = kkt(G, dims, A)
         def kktsolver(W):
             return factor(W)
     else:
         mnl, x0 = F()
-        factor = kkt_ldl(G, dims, A, mnl)
+        factor = kkt(G, dims, A, mnl)
         def kktsolver(x, z, W):
             f, Df, H = F(x, z)
             return factor(W, H, Df)
@@ -109,4 +112,71 @@ def kkt_ldl(G, dims, A, mnl = 0):
 
         return solve
 
-    return factor
\ No newline at end of file
+    return factor
+
+def kkt_sparse(G, dims, A, mnl = 0):
+    """
+    Solution of KKT equations by a sparse LU factorization of the reduced
+    2 x 2 system, for programs with linear inequalities only (dims['q'] and
+    dims['s'] empty), where the scaling W is diagonal.
+
+    Returns a function that (1) computes the LU factorization of
+
+        [ H + GG'*W^{-2}*GG   A' ]
+        [ A                   0  ]
+
+    given H, Df, W, where GG = [Df; G], and (2) returns a function for
+    solving
+
+        [ H     A'   GG'   ]   [ ux ]   [ bx ]
+        [ A     0    0     ] * [ uy ] = [ by ],
+        [ GG    0   -W'*W  ]   [ uz ]   [ bz ]
+
+    with uz = W^{-2}*(GG*ux - bz) eliminated.
+
+    The factorization keeps the sparsity of H, G and A (e.g. the block
+    diagonal equality constraints and Hessian of the node-link UE program),
+    where kkt_ldl fills a dense matrix of size n + p + mnl + dims['l'].
+    The same regularization as in kkt_ldl is used.
+    """
+
+    if dims['q'] or dims['s']:
+        raise ValueError("kkt_sparse only handles linear inequalities")
+    p, n = A.size
+    G, A = sparse(G), sparse(A)
+    reg = spdiag([-REG_EPS] * p)
+    # symbolic factorization, reused while the sparsity pattern is unchanged
+    symbolic = {}
+
+    def factor(W, H = None, Df = None):
+        GG = sparse([Df, G]) if mnl else G
+        di = matrix([W['dnli'], W['di']]) if mnl else W['di']
+        K11 = GG.T * spdiag(di**2) * GG + spdiag([REG_EPS] * n)
+        if H is not None: K11 = K11 + sparse(H)
+        K = sparse([[K11, A], [A.T, reg]])
+        pattern = (list(K.CCS[0]), list(K.CCS[1]))
+        if symbolic.get('pattern') != pattern:
+            symbolic['pattern'] = pattern
+            symbolic['factor'] = umfpack.symbolic(K)
+        numeric = umfpack.numeric(K, symbolic['factor'])
+
+        def solve(x, y, z):
+
+            # Solve
+            #
+            #     [ H + GG'*W^{-2}*GG   A' ]   [ ux ]   [ bx + GG'*W^{-2}*bz ]
+            #     [ A                   0  ] * [ uy ] = [ by                 ]
+            #
+            # and W*uz = W^{-1}*(GG*ux - bz).
+            #
+            # On entry, x, y, z contain bx, by, bz.  On exit, they contain
+            # the solution ux, uy, W*uz.
+            u = matrix([x + GG.T * mul(di**2, z), y])
+            umfpack.solve(K, numeric, u)
+            z[:] = mul(di, GG * u[:n] - z)
+            x[:] = u[:n]
+            y[:] = u[n:]
+
+        return solve
+
+    return factor
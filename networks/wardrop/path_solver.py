@@ -6,10 +6,13 @@ Created on Jul 23, 2014
 
 import logging
 
+import numpy as np
 import numpy.random as ra
 from cvxopt import matrix, spmatrix, spdiag, solvers, div
 
 import networks.wardrop.ue_solver as ue
+from networks.wardrop.kktsolver import get_kktsolver
+from synth_utils import labels_to_csr, simplex_csr
 
 if logging.getLogger().getEffectiveLevel() >= logging.DEBUG:
     solvers.options['show_progress'] = False
@@ -51,6 +54,23 @@ def simplex(graph):
     return spmatrix(1.0, I, J), r
 
 
+def simplex_od(graph):
+    """Construct the constraints of simplex as a scipy CSR matrix and an array
+    
+    Return value
+    ------------
+    U: scipy CSR matrix of simplex constraints
+    r: array of OD flows
+    """
+    labels, r = -np.ones(graph.numpaths, dtype=np.int64), np.zeros(graph.numODs)
+    for id1,od in graph.ODs.items():
+        r[graph.indods[id1]] = od.flow
+        for id2 in od.paths:
+            labels[graph.indpaths[id2]] = graph.indods[id1]
+    indptr, indices = labels_to_csr(labels, graph.numODs)
+    return simplex_csr(graph.numpaths, indptr, indices, r)
+
+
 def solver_init(U,r, random=False):
     """Initialize with a feasible point
     
@@ -74,7 +94,8 @@ def solver_init(U,r, random=False):
     return x0
 
 
-def solver(graph, update=False, data=None, SO=False, random=False):
+def solver(graph, update=False, data=None, SO=False, random=False,
+           sparse_kkt=False, x0=None):
     """Solve for the UE equilibrium using link-path formulation
     
     Parameters
@@ -86,6 +107,9 @@ def solver(graph, update=False, data=None, SO=False, random=False):
             U,r: simplex constraints 
     SO: if True compute SO
     random: if True, initialize with a random feasible point
+    sparse_kkt: if True, solve the KKT systems with a sparse factorization
+    x0: starting path flows, e.g. of a previous solve, instead of
+        solver_init (they do not need to match the OD flows)
     """
     type = graph.links.values()[0].delayfunc.type
     if data is None:
@@ -111,7 +135,12 @@ def solver(graph, update=False, data=None, SO=False, random=False):
             return f, Df*P
         f, Df, H = G(P*x, z, parameters, 1)
         return f, Df*P, P.T*H*P    
-    x = solvers.cp(F, G=A, h=b, A=U, b=r)['x']
+    if x0 is not None: F = ue.warm_start(F, x0)
+    kktsolver = None
+    if sparse_kkt:
+        kktsolver = get_kktsolver(A, {'l': m, 'q': [], 's': []}, U, F,
+                                  sparse_kkt=True)
+    x = solvers.cp(F, G=A, h=b, A=U, b=r, kktsolver=kktsolver)['x']
     if update:
         logging.debug('Update link flows, delays in Graph.'); graph.update_linkflows_linkdelays(P*x)
         logging.debug('Update path delays in Graph.'); graph.update_pathdelays()
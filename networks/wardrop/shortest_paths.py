@@ -8,11 +8,15 @@ Created on Aug 7, 2014
 import numpy as np
 
 
-def Dijkstra(graph, sink, sources=None):
+def Dijkstra(graph, sink, sources=None, banned_links=(), banned_nodes=()):
     """Find the shortest path in ffdelays to sink from every other vertex
     Stops when the shortest path form sources to sink have been found
     (see http://en.wikipedia.org/wiki/Dijkstra_algorithm)
     
+    The graph is only read, so it can be shared by concurrent searches:
+    banned_links: ids of links treated as removed
+    banned_nodes: nodes that no path to sink may go through
+    
     Return value:
     -------------
     dist: dist[u] = distance from u to sink
@@ -32,7 +36,9 @@ def Dijkstra(graph, sink, sources=None):
             if u == s: S.remove(u)
         if len(S)==0: return dist,next
         Q.remove(u)
-        for link in graph.nodes[u].inlinks.values():
+        if u in banned_nodes: continue
+        for id,link in graph.nodes[u].inlinks.items():
+            if id in banned_links: continue
             v, alt = link.startnode, dist[u] + link.delay
             if alt < dist[v]: dist[v] = alt; next[v] = u
     return dist, next
@@ -66,33 +72,23 @@ def YenKSP(graph, source, sink, K, A0):
     """"Find the k-shortest paths from source to sink
     A0: initialization with the shortest path from source to sink
     {see http://en.wikipedia.org/wiki/Yen's_algorithm}
+    The removed edges and root path nodes are masked in the spur searches
+    instead of being set to infinite delay, so the graph is left untouched
     """
-    A, B, costs, j, tmp, k2 = [A0], {}, {}, 0, {}, 0
+    A, B, costs, j, k2 = [A0], {}, {}, 0, 0
     for k in range(K-1):
         for i in range(len(A[k2])-1):
             spurNode, rootPath = A[k2][i], A[k2][:i+1]
             costRootPath = 0
             for l in range(i):
                 costRootPath += graph.links[(A[k2][l],A[k2][l+1],1)].delay
-            for p in A:
-                if rootPath == p[:i+1]:
-                    if (p[i],p[i+1],1) not in tmp.keys():
-                        link = graph.links[(p[i],p[i+1],1)]
-                        tmp[(p[i],p[i+1],1)] = link.delay #save p.edge(i, i + 1)
-                        link.delay = np.inf #remove p.edge(i, i + 1)
-            for node in rootPath:
-                for link in graph.nodes[node].inlinks.values():
-                    if (link.startnode,node,1) not in tmp.keys():
-                        tmp[(link.startnode,node,1)] = link.delay #save edge
-                        link.delay = np.inf #remove edge
-            dist, next = Dijkstra(graph, sink, [spurNode])
+            banned_links = set((p[i],p[i+1],1) for p in A if rootPath == p[:i+1])
+            dist, next = Dijkstra(graph, sink, [spurNode], banned_links, set(rootPath))
             cost = costRootPath + dist[spurNode]
             if dist[spurNode] < np.inf and cost not in costs.values():
                 B[j] = rootPath[:-1] + get_path(spurNode, sink, next)
                 costs[j] = cost
                 j += 1
-            for id,delay in tmp.items(): graph.links[id].delay = delay
-            tmp = {}
         if len(B) == 0: break
         min_cost = min(costs.values())
         for key,cost in costs.items():    
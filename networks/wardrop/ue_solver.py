@@ -7,6 +7,7 @@ Created on Apr 20, 2014
 import numpy as np
 from cvxopt import matrix, spmatrix, solvers, spdiag, mul, div, sparse
 from networks.wardrop.kktsolver import get_kktsolver
+from networks.wardrop.delays import horner
 import logging
 if logging.getLogger().getEffectiveLevel() >= logging.DEBUG:
     solvers.options['show_progress'] = False
@@ -73,6 +74,39 @@ def get_demands(graph, ind, node_id):
     return d[ind]
 
 
+def link_flows(x, n, p):
+    """Link flows l = sum_w x_w of the stacked flows x = [x_1; ...; x_p]"""
+    return np.array(x).reshape(p, n).sum(axis=0)
+
+
+def block_derivatives(Df, H, z, n, p):
+    """Gradient and Hessian w.r.t. x = [x_1; ...; x_p] of a function of
+    l = sum_w x_w, given its gradient Df and diagonal Hessian H w.r.t. l
+    
+    Return value
+    ------------
+    Df: matrix of size (1,p*n) [Df ... Df]
+    H: sparse matrix of size (p*n,p*n) with z[0]*diag(H) in every block
+    """
+    Df = matrix(np.tile(Df, p)[None,:])
+    if z is None: return Df, None
+    if p == 1: return Df, spdiag(matrix(z[0] * H))
+    i = np.arange(n)
+    rows = (np.arange(p)[:,None,None]*n + i).repeat(p, axis=1).ravel()
+    cols = (np.arange(p)[None,:,None]*n + i).repeat(p, axis=0).ravel()
+    values = np.tile(z[0] * H, p*p)
+    return Df, spmatrix(matrix(values), matrix(rows), matrix(cols), (p*n,p*n))
+
+
+def warm_start(F, x0):
+    """F(x,z) function for cvxopt.solvers.cp starting from x0 instead of the
+    starting point of F"""
+    def G(x=None, z=None):
+        if x is None: return F()[0], matrix(x0, tc='d')
+        return F(x, z)
+    return G
+
+
 def objective_poly(x, z, ks, p, w_obs=0.0, obs=None, l_obs=None, w_gap=1.0):
     """Objective function of UE program with polynomial delay functions
     f(x) = sum_i f_i(l_i) (+ 0.5*w_obs*||l[obs]-l_obs||^2)
@@ -90,25 +124,21 @@ def objective_poly(x, z, ks, p, w_obs=0.0, obs=None, l_obs=None, w_gap=1.0):
     """
     n, d = ks.size
     if x is None: return 0, matrix(1.0/p, (p*n,1))
-    l = matrix(0.0, (n,1))
-    for k in range(p): l += x[k*n:(k+1)*n]
-    f, Df, H = 0.0, matrix(0.0, (1,n)), matrix(0.0, (n,1))
-    for i in range(n):
-        tmp = matrix(np.power(l[i],range(d+1)))
-        f += ks[i,:] * tmp[1:]
-        Df[i] = ks[i,:] * mul(tmp[:-1], matrix(range(1,d+1)))
-        H[i] = ks[i,1:] * mul(tmp[:-2], matrix(range(2,d+1)), matrix(range(1,d)))
+    l, ks = link_flows(x, n, p), np.array(ks)
+    f = np.dot(l, horner(ks, l))
+    Df = horner(ks * np.arange(1, d+1), l)
+    H = horner(ks[:,1:] * (np.arange(2, d+1) * np.arange(1, d)), l)
     if w_gap != 1.0: f, Df, H = w_gap*f, w_gap*Df, w_gap*H
     
     if w_obs > 0.0:
-        num_obs, e = len(obs), l[obs]-l_obs
-        f += 0.5*w_obs*e.T*e
-        Df += w_obs*spmatrix(e, [0]*num_obs, obs, (1,n))
-        H += spmatrix([w_obs]*num_obs, obs, [0]*num_obs, (n,1))
+        e = l[obs] - np.array(l_obs).ravel()
+        f += 0.5*w_obs*np.dot(e, e)
+        np.add.at(Df, obs, w_obs*e)
+        np.add.at(H, obs, w_obs)
     
-    Df = matrix([[Df]]*p)
-    if z is None: return f, Df
-    return f, Df, matrix([[spdiag(z[0] * H)]*p]*p)
+    Df, H = block_derivatives(Df, H, z, n, p)
+    if z is None: return matrix(f), Df
+    return matrix(f), Df, H
 
 
 def objective_hyper(x, z, ks, p):
@@ -125,17 +155,14 @@ def objective_hyper(x, z, ks, p):
     """
     n = ks.size[0]
     if x is None: return 0, matrix(1.0/p, (p*n,1))
-    l = matrix(0.0, (n,1))
-    for k in range(p): l += x[k*n:(k+1)*n]
-    f, Df, H = 0.0, matrix(0.0, (1,n)), matrix(0.0, (n,1))
-    for i in range(n):
-        tmp = 1.0/(ks[i,2]-l[i])
-        f += ks[i,0]*l[i] - ks[i,1]*np.log(max(ks[i,2]-l[i], 1e-13))
-        Df[i] = ks[i,0] + ks[i,1]*tmp
-        H[i] = ks[i,1]*tmp**2
-    Df = matrix([[Df]]*p)
+    l, ks = link_flows(x, n, p), np.array(ks)
+    tmp = 1.0/(ks[:,2]-l)
+    f = np.sum(ks[:,0]*l - ks[:,1]*np.log(np.maximum(ks[:,2]-l, 1e-13)))
+    Df = ks[:,0] + ks[:,1]*tmp
+    H = ks[:,1]*tmp**2
+    Df, H = block_derivatives(Df, H, z, n, p)
     if z is None: return f, Df
-    return f, Df, sparse([[spdiag(z[0] * H)]*p]*p)
+    return f, Df, H
 
 
 def objective_hyper_SO(x, z, ks, p):
@@ -152,17 +179,14 @@ def objective_hyper_SO(x, z, ks, p):
     """
     n = ks.size[0]
     if x is None: return 0, matrix(1.0/p, (p*n,1))
-    l = matrix(0.0, (n,1))
-    for k in range(p): l += x[k*n:(k+1)*n]
-    f, Df, H = 0.0, matrix(0.0, (1,n)), matrix(0.0, (n,1))
-    for i in range(n):
-        tmp = 1.0/(ks[i,2]-l[i])
-        f += ks[i,0]*l[i] + ks[i,1]*l[i]*tmp
-        Df[i] = ks[i,0] + ks[i,1]*tmp + ks[i,1]*l[i]*tmp**2
-        H[i] = 2.0*ks[i,1]*tmp**2 + 2.0*ks[i,1]*l[i]*tmp**3
-    Df = matrix([[Df]]*p)
+    l, ks = link_flows(x, n, p), np.array(ks)
+    tmp = 1.0/(ks[:,2]-l)
+    f = np.sum(ks[:,0]*l + ks[:,1]*l*tmp)
+    Df = ks[:,0] + ks[:,1]*tmp + ks[:,1]*l*tmp**2
+    H = 2.0*ks[:,1]*tmp**2 + 2.0*ks[:,1]*l*tmp**3
+    Df, H = block_derivatives(Df, H, z, n, p)
     if z is None: return f, Df
-    return f, Df, matrix([[spdiag(z[0] * H)]*p]*p)
+    return f, Df, H
 
 
 def get_data(graph):
@@ -174,7 +198,8 @@ def get_data(graph):
     return Aeq, beq, ffdelays, parameters, type
 
 
-def solver(graph=None, update=False, full=False, data=None, SO=False):
+def solver(graph=None, update=False, full=False, data=None, SO=False,
+           sparse_kkt=False, x0=None):
     """Find the UE link flow
     
     Parameters
@@ -183,6 +208,9 @@ def solver(graph=None, update=False, full=False, data=None, SO=False):
     update: if update==True: update link flows and link,path delays in graph
     full: if full=True, also return x (link flows per OD pair)
     data: (Aeq, beq, ffdelays, parameters, type) from get_data(graph)
+    sparse_kkt: if True, solve the KKT systems with a sparse factorization
+    x0: starting point, e.g. x of a previous solve with full=True (it does
+        not need to satisfy the constraints, only to be in the domain)
     """
     if data is None: data = get_data(graph)
     Aeq, beq, ffdelays, pm, type = data
@@ -197,8 +225,9 @@ def solver(graph=None, update=False, full=False, data=None, SO=False):
             def F(x=None, z=None): return objective_hyper_SO(x, z, matrix([[ffdelays-div(pm[:,0],pm[:,1])], [pm]]), p)
         else:
             def F(x=None, z=None): return objective_hyper(x, z, matrix([[ffdelays-div(pm[:,0],pm[:,1])], [pm]]), p)
+    if x0 is not None: F = warm_start(F, x0)
     dims = {'l': p*n, 'q': [], 's': []}
-    x = solvers.cp(F, G=A, h=b, A=Aeq, b=beq, kktsolver=get_kktsolver(A, dims, Aeq, F))['x']
+    x = solvers.cp(F, G=A, h=b, A=Aeq, b=beq, kktsolver=get_kktsolver(A, dims, Aeq, F, sparse_kkt=sparse_kkt))['x']
     linkflows = matrix(0.0, (n,1))
     for k in range(p): linkflows += x[k*n:(k+1)*n]
     
@@ -12,8 +12,10 @@ import logging
 import numpy as np
 from matplotlib import pyplot as plt
 import numpy.linalg as la
+from scipy.spatial import cKDTree
 
-from synth_utils import matrix, simplex as simplex_base, to_np, to_sp
+from synth_utils import matrix, simplex_csr, group_trajs, traj_flows, \
+    traj_paths
 
 __author__ = 'cathywu'
 
@@ -27,6 +29,8 @@ class CellPath:
         self.NB, self.NL, self.NS = NB, NL, NS
         self.freq, self.thresh = freq, thresh # GridNetwork only
         self.scale = scale # EquilibriumNetwork only
+        self._cell_index = None # KD-tree over the cells of cp, see cell_index
+        self._line_cells = None # cells of each edge, see closest_to_lines
         if TN is not None:
             self.sample_from_TN(TN)
 
@@ -74,7 +78,8 @@ class CellPath:
         for w,b in zip(weights,bboxes):
             WP.add_rectangle(b, self.NS*w/weights_total)
 
-        self.cp = {'AllTypes' : matrix(WP.wp.values())}
+        self.cp = {}
+        self._set_cells('AllTypes', matrix(WP.wp.values()))
     def _sample_from_TN_grid(self,TN):
         self.bbox = TN.get_bounding_box() # x1, y1, x2, y2
         # uniformly sample points in bbox
@@ -115,6 +120,33 @@ class CellPath:
             return True
         return False
 
+    # checks which rows of an array of points are in bounding box
+    def in_box_all(self,X):
+        return (X[:,0] >= self.bbox[0]) & (X[:,0] <= self.bbox[2]) & \
+               (X[:,1] >= self.bbox[1]) & (X[:,1] <= self.bbox[3])
+
+    # rejection sampling in bounding box, in vectorized rounds
+    def _sample_in_box(self,n,draw):
+        """Draw points with draw(k) (k x 2 array of k points), drop the ones
+        outside of the bounding box and top up until there are n"""
+        cells, count = [], 0
+        while count < n:
+            x = draw(n - count)
+            x = x[self.in_box_all(x)]
+            cells.append(x)
+            count += x.shape[0]
+        if len(cells) == 0:
+            return np.array([])
+        return np.vstack(cells)
+
+    # gaussian noise, with standard deviation 1/tau of the bounding box
+    def _gaussian_noise(self,samples,tau):
+        dx = np.random.normal(scale=(self.bbox[2]-self.bbox[0])/tau,
+                              size=samples)
+        dy = np.random.normal(scale=(self.bbox[3]-self.bbox[1])/tau,
+                              size=samples)
+        return np.vstack((dx,dy)).T
+
     # uniform (deterministic)
     def uniform(self,n):
         if n is None:
@@ -131,7 +163,8 @@ class CellPath:
             return
         bbox = self.bbox
         samples = np.random.rand(n,2)
-        self.cp['uniform_random'] = matrix(self.shift_and_scale(samples))
+        self._set_cells('uniform_random',
+                        matrix(self.shift_and_scale(samples)))
 
     # uniform (random) in a polygon
     def uniform_random_bbox(self,pop,bbox,n=None):
@@ -139,27 +172,17 @@ class CellPath:
             n = self.n
         elif n == 0:
             return
-        cells = np.array([])
-        while cells.shape[0] < n:
-            if cells.size == 0:
-                samples = n
-            else:
-                samples = 1
-            # select bbox for each of n samples
-            bbox_freq = np.random.multinomial(samples,pop/np.sum(pop))
-            # for each bbox, uniformly sample
-            for i,freq in enumerate(bbox_freq):
-                if freq == 0:
-                    continue
-                x = self.shift_and_scale(np.random.rand(freq,2),bbox=bbox[i])
-                x = np.array([p for p in x if self.in_box(p)])
-                if x.size == 0:
-                    continue
-                if cells.size != 0:
-                    cells = np.vstack((cells,x))
-                else:
-                    cells = x
-        self.cp['uniform_rand_bbox'] = matrix(cells)
+        pop = np.asarray(pop, dtype=float)
+        bbox = np.asarray(bbox, dtype=float)
+        def draw(samples):
+            # select bbox for each sample, then uniformly sample in it
+            i = np.random.choice(len(pop), size=samples, p=pop/np.sum(pop))
+            D = np.random.rand(samples,2)
+            x = bbox[i,0] + D[:,0] * (bbox[i,2]-bbox[i,0])
+            y = bbox[i,1] + D[:,1] * (bbox[i,3]-bbox[i,1])
+            return np.vstack((x,y)).T
+        self._set_cells('uniform_rand_bbox',
+                        matrix(self._sample_in_box(n,draw)))
 
     # gaussian sampling along polyline
     def gaussian_polyline(self,p,n=None,log=False,bounded=True,tau=300):
@@ -177,36 +200,20 @@ class CellPath:
                 np.array(points)[1:,:]),axis=1) for points in p]
         total = np.sum(dists)
 
-        cells = np.array([])
-        while cells.shape[0] < n:
-            if cells.size == 0:
-                samples = n
-            else:
-                samples = 1
-            # select polyline for each of n samples
-            road_freq = np.random.multinomial(samples,dists/total)
-            # for each selected polyline, select segment for each of n samples
-            seq_freq = [np.random.multinomial(j,dists_sub[i] / \
-                    sum(dists_sub[i])) for i,j in enumerate(road_freq)]
-            # for each segment, uniformly sample
-            locs = np.random.random(samples)
-            for i,freqs in enumerate(seq_freq):
-                for j,freq in enumerate(freqs):
-                    if freq == 0:
-                        continue
-                    for k in range(freq):
-                        pos = np.random.random()
-                        x = p[i][j] + (np.subtract(p[i][j], p[i][j+1])) * pos
-                        dx = np.random.normal(scale=(self.bbox[2]-self.bbox[0])/tau)
-                        dy = np.random.normal(scale=(self.bbox[3]-self.bbox[1])/tau)
-                        x = x + np.array([dx,dy])
-                        if not self.in_box(x):
-                            continue
-                        if cells.size != 0:
-                            cells = np.vstack((cells,x))
-                        else:
-                            cells = x
-        self.cp['gaussian_polyline'] = matrix(cells)
+        # all segments of all polylines, each selected with the probability
+        # of its polyline times its probability within the polyline
+        starts = np.vstack([np.array(points, dtype=float)[:-1,:] for points in p])
+        ends = np.vstack([np.array(points, dtype=float)[1:,:] for points in p])
+        seg_prob = np.concatenate([dists[i]/total * sub/np.sum(sub) for i,sub \
+                                   in enumerate(dists_sub)])
+        def draw(samples):
+            seg = np.random.choice(seg_prob.size, size=samples,
+                                   p=seg_prob/np.sum(seg_prob))
+            pos = np.random.random(samples)[:,np.newaxis]
+            x = starts[seg] + (starts[seg] - ends[seg]) * pos
+            return x + self._gaussian_noise(samples,tau)
+        self._set_cells('gaussian_polyline',
+                        matrix(self._sample_in_box(n,draw)))
 
     # gaussian sampling around points
     def gaussian_points(self,p,n=None,bounded=True,tau=300):
@@ -214,25 +221,12 @@ class CellPath:
             n = self.n
         elif n == 0:
             return
-        # select point for each of n samples
-        cells = np.array([])
-        while cells.shape[0] < n:
-            if cells.size == 0:
-                samples = n
-            else:
-                samples = 1
+        p = np.array(p, dtype=float)
+        def draw(samples):
+            # select point for each sample
             points_ind = np.random.randint(0,len(p),samples)
-            for ind in points_ind:
-                dx = np.random.normal(scale=(self.bbox[2]-self.bbox[0])/tau)
-                dy = np.random.normal(scale=(self.bbox[3]-self.bbox[1])/tau)
-                x = p[ind] + np.array([dx,dy])
-                if not self.in_box(x):
-                    continue
-                if cells.size != 0:
-                    cells = np.vstack((cells,x))
-                else:
-                    cells = x
-        self.cp['gaussian_points'] = matrix(cells)
+            return p[points_ind] + self._gaussian_noise(samples,tau)
+        self._set_cells('gaussian_points', matrix(self._sample_in_box(n,draw)))
 
     def draw(self):
         colors = 'rbmgcyk'
@@ -269,29 +263,79 @@ class CellPath:
         import pickle
         return pickle.load(open('%s/%s' % (c.DATA_DIR,c.WAYPOINTS_FILE)))
 
+    def _set_cells(self, key, cells):
+        """Set the cells of group key of cp, the KD-tree of cell_index is
+        rebuilt on its next call"""
+        self.cp[key] = cells
+        self._cell_index = None
+
+    def cell_index(self):
+        """KD-tree over the cells of all the groups of cp, built once and
+        rebuilt whenever cells are set with _set_cells (i.e. resampled)
+
+        Return value:
+        ------------
+        (tree, keys, groups, indices): cell k of the tree is cell indices[k] of
+        group keys[groups[k]]
+        """
+        if self._cell_index is None:
+            keys = [k for k, v in self.cp.items() if np.size(v) > 0]
+            if len(keys) == 0:
+                self._cell_index = (None,)
+                return None
+            cells = [np.asarray(self.cp[k])[:,:2] for k in keys]
+            sizes = [c.shape[0] for c in cells]
+            groups = np.repeat(np.arange(len(keys)), sizes)
+            indices = np.arange(groups.size) - \
+                      np.repeat(np.cumsum(sizes) - sizes, sizes)
+            self._cell_index = ((cKDTree(np.vstack(cells)), keys,
+                                 groups.tolist(), indices.tolist()),)
+        return self._cell_index[0]
+
+    def closest_to_points(self, points):
+        """Find closest cell to each point, in one batched query
+
+        Parameters:
+        ----------
+        points: array of (x,y) points
+
+        Return value:
+        ------------
+        list of (group, index) ids of cells of cp, None if there are no cells
+        """
+        index = self.cell_index()
+        if index is None:
+            return [None] * len(points)
+        tree, keys, groups, indices = index
+        _, nearest = tree.query(np.asarray(points, dtype=float).reshape(-1,2))
+        return [(keys[groups[k]], indices[k]) for k in nearest.tolist()]
+
     def closest_to_point(self, point, fast=False):
         """Find closest cell to a point (x,y)
-        Note: fast is only available in Rectangle class"""
-        id = None
-        min_dist = np.inf
-        # FIXME UPDATE fast method not used here
-        if fast:
-            x1,y1,x2,y2 = self.geometry
-            res = self.partition[0]
-            w, h = (x2-x1)/res[0], (y2-y1)/res[1]
-            i = min(int(np.floor((point[0]-x1)/w)), res[0]-1)
-            j = min(int(np.floor((point[1]-y1)/h)), res[1]-1)
-            ids = self.partition[1][(i,j)]
-        else:
-            ids = self.cp.keys() #explore all ids
-        for id in ids:
-            x, y = self.cp[id][:,0], self.cp[id][:,1]
-            d = np.linalg.norm([point[0]-x, point[1]-y], axis=0)
-            d_min, i_min = np.min(d), np.argmin(d)
-            if d_min < min_dist: min_dist, id = d_min, (id,i_min)
-
-        return id
+        Note: the cells are always searched through the KD-tree (fast is
+        kept for compatibility)"""
+        return self.closest_to_points([point])[0]
+
+    @staticmethod
+    def _dedup(ids):
+        """Drop consecutive repeated cells"""
+        if len(ids) == 0:
+            return []
+        ids_deduped = [ids[0]]
+        ids_deduped.extend([y for (x,y) in zip(ids,ids[1:]) if x!=y])
+        return ids_deduped
 
+    @staticmethod
+    def _interpolate(polyline, n):
+        """n points on each directed line of the polyline, line by line"""
+        lines = np.asarray(polyline, dtype=float).reshape(-1,4)
+        t = np.linspace(0, 1, num=n)
+        x = lines[:,[0]] + (lines[:,[2]] - lines[:,[0]]) * t
+        y = lines[:,[1]] + (lines[:,[3]] - lines[:,[1]]) * t
+        # match np.linspace, which ends exactly on the end points
+        if n > 1:
+            x[:,-1], y[:,-1] = lines[:,2], lines[:,3]
+        return np.vstack((x.ravel(), y.ravel())).T
 
     def closest_to_line(self, directed_line, n, fast=False):
         """Find list of closest cells to a directed_line
@@ -301,28 +345,58 @@ class CellPath:
         directed_line: (x1,y1,x2,y2)
         n: number of points to take on the line
         """
-        x1,y1,x2,y2 = directed_line
-        interp_x = np.linspace(x1,x2,num=n)
-        interp_y = np.linspace(y1,y2,num=n)
-        ids = [self.closest_to_point((x,y), fast) for (x,y) in zip(interp_x,interp_y)]
-        ids_deduped = [ids[0]]
-        ids_deduped.extend([y for (x,y) in zip(ids,ids[1:]) if x!=y])
-        return ids_deduped
+        return self.closest_to_polyline([directed_line], n, fast)
 
 
     def closest_to_polyline(self, polyline, n, fast=False):
-        """Find list of closest cells to a directed polyline
+        """Find list of closest cells to a directed polyline, querying the
+        points of all lines at once
 
         Parameters:
         ----------
         polyline: list of directed lines [(x1,y1,x2,y2)]
         n: number of points to take on each line of the polyline
         """
-        ids = [self.closest_to_line(line, n, fast) for line in polyline]
-        ids = [item for sublist in ids for item in sublist]
-        ids_deduped = [ids[0]]
-        ids_deduped.extend([y for (x,y) in zip(ids,ids[1:]) if x!=y])
-        return ids_deduped
+        return self._dedup(self.closest_to_points(self._interpolate(polyline,
+                                                                    n)))
+
+    def closest_to_lines(self, keys, lines, n):
+        """Find list of closest cells to each directed line, cached on the keys
+        of the lines (e.g. the edges of the TN) until the cells are resampled
+
+        Parameters:
+        ----------
+        keys: hashable key of each line
+        lines: list of directed lines [(x1,y1,x2,y2)]
+        n: number of points to take on each line
+        """
+        self.cell_index()
+        if self._line_cells is None or \
+                self._line_cells[0] is not self._cell_index or \
+                self._line_cells[1] != n:
+            self._line_cells = (self._cell_index, n, {})
+        cache = self._line_cells[2]
+
+        missing = {}
+        for key, line in zip(keys, lines):
+            if key not in cache:
+                missing[key] = line
+        if missing:
+            ids = self.closest_to_points(self._interpolate(missing.values(), n))
+            for j, key in enumerate(missing.keys()):
+                cache[key] = self._dedup(ids[j*n:(j+1)*n])
+        return [cache[key] for key in keys]
+
+    @staticmethod
+    def _concat(ids_list):
+        """Concatenate cell sequences, dropping repeats at the boundaries"""
+        ids = []
+        for ids_line in ids_list:
+            if ids and ids_line and ids_line[0] == ids[-1]:
+                ids.extend(ids_line[1:])
+            else:
+                ids.extend(ids_line)
+        return ids
 
 
     def closest_to_path(self, graph, path, n, fast=False):
@@ -334,22 +408,24 @@ class CellPath:
         path: sequence of nodes in path
         n: number of points to take on each link of the path
         """
-        polyline = []
+        keys, polyline = [], []
         if graph.__class__.__name__ == 'Graph':
             path_id = path
             for link in graph.paths[path_id].links:
                 x1, y1 = graph.nodes_position[link.startnode]
                 x2, y2 = graph.nodes_position[link.endnode]
+                keys.append((link.startnode, link.endnode, link.route))
                 polyline.append((x1,y1,x2,y2))
         elif graph.__class__.__name__ == 'DiGraph':
             pos = [graph.node[x]['pos'] for x in path]
             for (i,x) in enumerate(pos[:-1]):
                 x1, y1 = x
                 x2, y2 = pos[i+1]
+                keys.append((path[i], path[i+1]))
                 polyline.append((x1,y1,x2,y2))
         else:
             return NotImplemented
-        return self.closest_to_polyline(polyline, n, fast)
+        return self._concat(self.closest_to_lines(keys, polyline, n))
 
     def _get_trajs_grid(self, TN, n, r_ids=None, fast=False, tol=1e-3):
         """Compute cellpath trajectories and returns {path_id: ids}, [(traj, path_list, flow)]
@@ -368,16 +444,23 @@ class CellPath:
         """
         if not r_ids:
             r_ids = xrange(len(TN.routes))
-        path_cps = [self.closest_to_path(TN.G, TN.routes[r]['path'], n,
-                                         fast=fast) for r in r_ids]
-        cps = {}
-        for value,key in enumerate(path_cps):
-            cps.setdefault(tuple(key), []).append(value)
-        self.path_cps, self.trajs = path_cps, cps
+        # cells of every edge, in one batch, then of every route by edge id
+        pos = TN.G.node
+        edges = TN.edge_index.edges
+        edge_cps = self.closest_to_lines(edges, [tuple(pos[u]['pos']) +
+                                                 tuple(pos[v]['pos'])
+                                                 for (u,v) in edges], n)
+        path_cps = [self._concat([edge_cps[e] for e in
+                                  TN.routes.edge_ids(r).tolist()])
+                    for r in r_ids]
+        trajs, self.traj_labels, indptr, indices, _ = group_trajs(path_cps)
+        self.path_cps = path_cps
+        self.trajs = traj_paths(trajs, indptr, indices)
+        self.traj_routes = indptr, indices
 
     def _update_flows_grid(self, TN):
-        self.flows = [sum([TN.routes[i]['flow'] for i in paths]) for \
-                         paths in self.trajs.values()]
+        self.flows = traj_flows(self.traj_labels, TN.routes.flow,
+                                len(self.trajs))
 
     def _get_trajs_eq(self, TN, n, r_ids=None, fast=False, tol=1e-3):
         """Compute CellPath trajectories and returns {path_id: ids}, [(traj, path_list, flow)]
@@ -397,6 +480,10 @@ class CellPath:
         """
         if self.cp == None or len(self.cp) == 0:
             return None, None
+        # cells of every link, in one batch, reused by all paths
+        pos = TN.G.nodes_position
+        self.closest_to_lines(TN.G.links.keys(), [tuple(pos[s]) + tuple(pos[t])
+                                                  for (s,t,_) in TN.G.links], n)
         path_cps, k = {}, 0
         for path_id, path in TN.G.paths.items():
             # if path.flow > tol:
@@ -405,17 +492,16 @@ class CellPath:
             ids = self.closest_to_path(TN.G, path_id, n, fast)
 
             path_cps[path_id] = ids
-        cps_list, paths_list, flows_list = [], [], []
-        for path_id, cps in path_cps.items():
-            try:
-                index = cps_list.index(cps) # find the index of cps in cps_list
-                paths_list[index].append(path_id)
-                flows_list[index] += TN.G.paths[path_id].flow
-            except ValueError: # cps not in cps_list
-                cps_list.append(cps)
-                paths_list.append([path_id])
-                flows_list.append(TN.G.paths[path_id].flow)
-        self.path_cps, self.trajs = path_cps, zip(cps_list, paths_list, flows_list)
+        path_ids = path_cps.keys()
+        trajs, _, indptr, indices, flows = group_trajs(
+            [path_cps[id] for id in path_ids],
+            [TN.G.paths[id].flow for id in path_ids])
+        paths = traj_paths(trajs, indptr, indices, ids=path_ids)
+        self.path_cps = path_cps
+        self.trajs = [(list(traj), paths[traj], flow) for traj, flow in
+                      zip(trajs, flows)]
+        cols = np.array([TN.G.indpaths[id] for id in path_ids], dtype=np.int64)
+        self.traj_routes = indptr, cols[indices]
 
     def _update_flows_eq(self, TN):
         # TODO I AM HERE
@@ -432,21 +518,13 @@ class CellPath:
     def _simplex_eq(self,TN):
         """Build simplex constraints from lp flows
         """
-        from cvxopt import matrix as mat, spmatrix
-        n = len(self.trajs)
-        I, J, r, i = [], [], mat(0.0, (n,1)), 0
-        for wp_traj, path_ids, flow in self.trajs:
-            r[i] = flow
-            for id in path_ids:
-                I.append(i)
-                J.append(TN.G.indpaths[id])
-            i += 1
-        U = to_sp(spmatrix(1.0, I, J, (n, TN.G.numpaths)))
-        r = to_np(r)
-        return U, r
+        indptr, indices = self.traj_routes
+        return simplex_csr(TN.G.numpaths, indptr, indices,
+                           [flow for _,_,flow in self.trajs])
 
     def _simplex_grid(self,TN):
-        return simplex_base(len(TN.routes),self.trajs,self.flows)
+        indptr, indices = self.traj_routes
+        return simplex_csr(len(TN.routes), indptr, indices, self.flows)
 
 if __name__ == "__main__":
     import unittest
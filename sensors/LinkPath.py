@@ -1,7 +1,9 @@
 import ipdb
 import random
 
-from synth_utils import to_np, to_sp, simplex as simplex_base
+import numpy as np
+
+from synth_utils import simplex_csr, group_trajs, traj_flows, traj_paths
 
 __author__ = 'cathywu'
 
@@ -33,33 +35,40 @@ class LinkPath:
         rs = TN.G.paths
         path_lps = [(r,[e.repr() for e in rs[r].links if e.repr() in self.lp]) \
                     for r in rs.keys()]
-        lps = {}
-        for value,key in path_lps:
-            lps.setdefault(tuple(key), []).append(value)
-        if () in lps:
-            del lps[()]
-        self.path_lps, self.trajs = path_lps, lps
+        trajs, self.traj_labels, indptr, indices, _ = group_trajs(
+            [key for _,key in path_lps], drop_empty=True)
+        self.path_lps = path_lps
+        self.trajs = traj_paths(trajs, indptr, indices,
+                                ids=[value for value,_ in path_lps])
+        cols = np.array([TN.G.indpaths[r] for r,_ in path_lps], dtype=np.int64)
+        self.traj_routes = indptr, cols[indices]
     def _get_trajs_grid(self, TN, r_ids=None):
-        rs = TN.routes
+        rs, edge_index = TN.routes, TN.edge_index
         if not r_ids:
             r_ids = xrange(len(rs))
-        path_lps = [[e for e in zip(rs[r]['path'],rs[r]['path'][1:]) \
-                     if e in self.lp] for r in r_ids]
-        lps = {}
-        for value,key in enumerate(path_lps):
-            lps.setdefault(tuple(key), []).append(value)
-        if () in lps:
-            del lps[()]
-        self.path_lps, self.trajs = path_lps, lps
+        # work on edge ids, only the sensed links are mapped back to (u,v)
+        lp_ids = edge_index.lookup_edges(self.lp)
+        if (lp_ids < 0).any():
+            raise KeyError('link-path sensors on links that are not edges: %s'
+                           % [e for e, i in zip(self.lp, lp_ids) if i < 0])
+        is_lp = np.zeros(len(edge_index), dtype=bool)
+        is_lp[lp_ids] = True
+        edges = edge_index.edges
+        path_lps = [[edges[e] for e in ids[is_lp[ids]].tolist()] for ids in \
+                    (rs.edge_ids(r) for r in r_ids)]
+        trajs, self.traj_labels, indptr, indices, _ = group_trajs(
+            path_lps, drop_empty=True)
+        self.path_lps = path_lps
+        self.trajs = traj_paths(trajs, indptr, indices)
+        self.traj_routes = indptr, indices
 
     # FIXME unify
     def _update_flows_eq(self, TN):
-        # FIXME
-        self.flows = [sum([TN.G.paths[i].flow for i in paths]) for \
-                         paths in self.trajs.values()]
+        self.flows = traj_flows(self.traj_labels, [TN.G.paths[r].flow for \
+                                r,_ in self.path_lps], len(self.trajs))
     def _update_flows_grid(self, TN):
-        self.flows = [sum([TN.get_route_flow(i) for i in paths]) for \
-                         paths in self.trajs.values()]
+        self.flows = traj_flows(self.traj_labels, TN.routes.flow,
+                                len(self.trajs))
 
     # FIXME unify
     def simplex(self,TN):
@@ -71,20 +80,10 @@ class LinkPath:
     def _simplex_eq(self,TN):
         """Build simplex constraints from lp flows
         """
-        from cvxopt import matrix, spmatrix
-        n = len(self.trajs)
-        m = len(TN.G.paths)
-        if n == 0:
+        if len(self.trajs) == 0:
             return None, None
-        I, J, r = [], [], matrix(0.0, (n,1))
-        for i, path_ids in enumerate(self.trajs.itervalues()):
-            r[i] = self.flows[i]
-            for id in path_ids:
-                I.append(i)
-                J.append(TN.G.indpaths[id])
-        V = to_sp(spmatrix(1.0, I, J, (n, m)))
-        r = to_np(r)
-        return V, r
+        indptr, indices = self.traj_routes
+        return simplex_csr(len(TN.G.paths), indptr, indices, self.flows)
     def _simplex_grid(self,TN):
-        return simplex_base(len(TN.routes),self.trajs,self.flows)
-
+        indptr, indices = self.traj_routes
+        return simplex_csr(len(TN.routes), indptr, indices, self.flows)
@@ -78,8 +78,9 @@ class SensorConfiguration:
         if TN.__class__.__name__ == 'EquilibriumNetwork':
             data['x_true'] = TN.p_flow
         elif TN.__class__.__name__ == 'GridNetwork':
+            # sparse link-route incidence, built once for x_true and A,b
             from networks.grid_networks.static_matrix import generate_static_matrix_OD
-            _, _, data['x_true'] = generate_static_matrix_OD(TN, only_Ab=True)
+            A, b, data['x_true'] = generate_static_matrix_OD(TN, only_Ab=True)
         else:
             return NotImplemented
 
@@ -91,19 +92,12 @@ class SensorConfiguration:
                 A_full = to_sp(path_solver.linkpath_incidence(TN.G))
                 data['A'], data['b'] = A_full, A_full.dot(TN.p_flow)
             elif TN.__class__.__name__ == 'GridNetwork':
-                from networks.grid_networks.static_matrix import generate_static_matrix_OD
-                data['A'], data['b'], _ = generate_static_matrix_OD(TN, only_Ab=True)
+                data['A'], data['b'] = A, b
             else:
                 return NotImplemented
         # Export T,d
         if self.num_OD > 0:
-            # FIXME common interface
-            if TN.__class__.__name__ == 'EquilibriumNetwork':
-                import networks.wardrop.path_solver as path_solver
-                T, d = path_solver.simplex(TN.G)
-                data['T'], data['d'] = to_sp(T),d
-            else:
-                data['T'], data['d'] = TN.simplex_od()
+            data['T'], data['d'] = TN.simplex_od()
         # Export U,f
         if self.num_cellpath_NB+self.num_cellpath_NL+self.num_cellpath_NS > 0:
             data['U'], data['f'] = self.cp.simplex(TN)
@@ -5,6 +5,7 @@ import numpy as np
 import scipy.sparse as sps
 from scipy.sparse import csr_matrix, coo_matrix
 import functools
+import itertools
 import cPickle as pickle
 from random import randint
 import time
@@ -72,6 +73,117 @@ def deprecated(func):
         return func(*args, **kwargs)
     return new_func
 
+def group_trajs(seqs, flows=None, drop_empty=False):
+    """
+    Group the paths that share a trajectory (sequence of cells, links, ...)
+
+    Tokens are interned to integers and each trajectory is keyed on its
+    packed int32 string, so grouping is one hash lookup per path.
+
+    :param seqs: trajectory of each path, as a sequence of hashable tokens
+    :param flows: path flows (optional)
+    :param drop_empty: leave out paths with an empty trajectory
+    :return: trajs (distinct trajectories as tuples, in order of first
+             occurrence), labels (traj of each path, -1 if left out),
+             indptr, indices (the paths of traj i are
+             indices[indptr[i]:indptr[i+1]]) and the traj flows (or None)
+    """
+    tokens, keys, trajs = {}, {}, []
+    labels = np.empty(len(seqs), dtype=np.int64)
+    for k, seq in enumerate(seqs):
+        if drop_empty and len(seq) == 0:
+            labels[k] = -1
+            continue
+        key = np.array([tokens.setdefault(t, len(tokens)) for t in seq],
+                       dtype=np.int32).tostring()
+        label = keys.setdefault(key, len(trajs))
+        if label == len(trajs):
+            trajs.append(tuple(seq))
+        labels[k] = label
+    indptr, indices = labels_to_csr(labels, len(trajs))
+    if flows is None:
+        return trajs, labels, indptr, indices, None
+    return trajs, labels, indptr, indices, traj_flows(labels, flows, len(trajs))
+
+def labels_to_csr(labels, ngroups):
+    """
+    Members of each group as CSR: the members of group i are
+    indices[indptr[i]:indptr[i+1]], in increasing order
+    :param labels: group of each member, -1 for members left out
+    :param ngroups: number of groups
+    :return: indptr, indices
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    kept = np.flatnonzero(labels >= 0)
+    indices = kept[np.argsort(labels[kept], kind='mergesort')]
+    indptr = np.zeros(ngroups + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(labels[kept], minlength=ngroups))
+    return indptr, indices
+
+def groups_to_csr(groups):
+    """
+    Flatten a list of lists of ids into CSR (indptr, indices)
+    :param groups:
+    :return:
+    """
+    indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(g) for g in groups])
+    indices = np.fromiter(itertools.chain.from_iterable(groups),
+                          dtype=np.int64, count=indptr[-1])
+    return indptr, indices
+
+def traj_flows(labels, flows, ntrajs):
+    """
+    Sum path flows by trajectory
+    :param labels: traj of each path, -1 for paths left out
+    :param flows: path flows
+    :param ntrajs: number of trajectories
+    :return:
+    """
+    kept = np.flatnonzero(labels >= 0)
+    return np.bincount(labels[kept], minlength=ntrajs,
+                       weights=np.asarray(flows, dtype=np.float64)[kept])
+
+def traj_paths(trajs, indptr, indices, ids=None):
+    """
+    Map each trajectory to the list of its paths, in the order of trajs
+    :param ids: path ids, indices are used if not given
+    :return: OrderedDict {traj: [path ids]}
+    """
+    from collections import OrderedDict
+    if ids is None:
+        return OrderedDict((traj, indices[indptr[i]:indptr[i+1]].tolist())
+                           for i, traj in enumerate(trajs))
+    return OrderedDict((traj, [ids[k] for k in indices[indptr[i]:indptr[i+1]]])
+                       for i, traj in enumerate(trajs))
+
+def simplex_csr(nroutes, indptr, indices, flows):
+    """
+    Build simplex matrix from nroutes (n), the routes of each group (m) as CSR
+    and the group flows
+
+    We represent each group (trajectory, OD pair) as its own row of "1"s (X),
+    on the routes indices[indptr[i]:indptr[i+1]] (a route listed twice in a
+    group still counts once). We represent the respective group flow vector
+    (r).
+
+    Applicable to cellpath, linkpath and OD flows
+
+    :param nroutes: number of routes
+    :param indptr:
+    :param indices: route ids
+    :param flows: group flows
+    :return: X (scipy CSR), r
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    indices = np.asarray(indices, dtype=np.int64)
+    X = csr_matrix((np.ones(indices.size), indices, indptr),
+                   shape=(indptr.size - 1, nroutes))
+    X.sum_duplicates()
+    X.data[:] = 1
+    r = np.asarray(flows, dtype=np.float64).reshape(indptr.size - 1)
+    return X, r
+
 def simplex(nroutes, traj, flows):
     """
     Build simplex matrix from nroutes (n), trajectories (m), and trajectory
@@ -88,15 +200,6 @@ def simplex(nroutes, traj, flows):
     :param flows: trajectory flows
     :return:
     """
-    from cvxopt import matrix, spmatrix
-    m, n = nroutes, len(traj)
-    I, J, r = [], [], matrix(0.0, (n,1))
-    for i, path_ids in enumerate(traj.itervalues()):
-        r[i] = flows[i]
-        for id in path_ids:
-            I.append(i)
-            J.append(id)
-    X = coo_matrix(([1.0] * len(I),(I,J)), shape=(n,m)).tocsr()
-    r = to_np(r)
-    return X, r
+    indptr, indices = groups_to_csr(traj.values())
+    return simplex_csr(nroutes, indptr, indices, flows)
 
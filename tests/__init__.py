@@ -0,0 +1,13 @@
+__author__ = 'cathywu'
+
+# grid of the GridNetwork tests, small enough to check routes one by one
+SMALL_GRID = {'ncol': 4, 'nrow': 3, 'nodroutes': 3, 'myseed': 0}
+
+def small_grid(**kwargs):
+    """
+    GridNetwork of SMALL_GRID
+    :param kwargs: other arguments of GridNetwork, or SMALL_GRID overrides
+    :return:
+    """
+    from networks.GridNetwork import GridNetwork
+    return GridNetwork(**dict(SMALL_GRID, **kwargs))
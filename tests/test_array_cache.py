@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from networks.ArrayCache import ArrayCache, pack_lists, unpack_lists
+
+__author__ = 'cathywu'
+
+class TestArrayCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ArrayCache(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_key(self):
+        key = ArrayCache.key('a', 1, 0.1, {'x': [1, 2], 'y': np.arange(3)})
+        self.assertEqual(key, ArrayCache.key('a', 1, 0.1, {'y': np.arange(3),
+                                                           'x': [1, 2]}))
+        self.assertNotEqual(key, ArrayCache.key('a', 1, 0.1,
+                                                {'x': [1, 2],
+                                                 'y': np.arange(4)}))
+
+    def test_put_get(self):
+        key = ArrayCache.key('test')
+        self.assertTrue(self.cache.get(key) is None)
+        values, offsets = pack_lists([[1, 2, 3], [], [4]])
+        self.cache.put(key, {'values': values, 'offsets': offsets,
+                             'empty': np.zeros(0)})
+        self.assertTrue(key in self.cache)
+        arrays = self.cache.get(key)
+        self.assertEqual(sorted(arrays), ['empty', 'offsets', 'values'])
+        self.assertTrue(isinstance(arrays['values'], np.memmap))
+        self.assertEqual(unpack_lists(arrays['values'], arrays['offsets']),
+                         [[1, 2, 3], [], [4]])
+        # existing entries are left as is
+        self.cache.put(key, {'values': np.zeros(1)})
+        self.assertEqual(sorted(self.cache.get(key)),
+                         ['empty', 'offsets', 'values'])
+
+    def test_grid_network(self):
+        from networks.GridNetwork import GridNetwork
+        from tests import SMALL_GRID, small_grid
+        class CachedGrid(GridNetwork):
+            def _construct_grid(self):
+                raise AssertionError('grid generated on a cache hit')
+        TN1 = small_grid(cache_dir=self.root)
+        TN2 = CachedGrid(cache_dir=self.root, **SMALL_GRID)
+        TN3 = small_grid()
+        for k in ['nodes', 'offsets', 'cost', 'o', 'd', 'edges',
+                  'edge_offsets', 'flow']:
+            self.assertTrue(np.array_equal(getattr(TN2.routes, k),
+                                           getattr(TN3.routes, k)))
+        self.assertEqual(TN2.edge_index.flows.tolist(),
+                         TN3.edge_index.flows.tolist())
+        # the graph is loaded with the same edge order as a generated one
+        self.assertEqual(TN2.G.edges(data=True), TN3.G.edges(data=True))
+        self.assertEqual(TN2.G.nodes(data=True), TN3.G.nodes(data=True))
+        self.assertEqual(TN2.sensors, TN3.sensors)
+        self.assertEqual(TN2.edge_index.edges, TN3.edge_index.edges)
+        # one entry, reused by the second network
+        self.assertEqual(len(os.listdir(self.root)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
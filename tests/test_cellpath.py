@@ -1,5 +1,7 @@
 import unittest
 
+import numpy as np
+
 __author__ = 'cathywu'
 
 class TestCellPath(unittest.TestCase):
@@ -8,5 +10,59 @@ class TestCellPath(unittest.TestCase):
         cp = CellPath(NB=10,NL=100,NS=0)
         self.assertTrue(True)
 
+    def test_closest(self):
+        from sensors.CellPath import CellPath
+        cp = CellPath()
+        cp.uniform_random(n=20)
+        cp.gaussian_points([(0.5,0.5)], n=10, tau=10)
+        points = np.random.rand(50,2)
+        for point, (key, i) in zip(points, cp.closest_to_points(points)):
+            dist = min(np.min(np.linalg.norm(v - point, axis=1)) for v in
+                       cp.cp.values())
+            self.assertAlmostEqual(np.linalg.norm(cp.cp[key][i] - point), dist)
+        # resampled cells are indexed again
+        cp.uniform_random(n=5)
+        self.assertTrue(cp.closest_to_point((0.1,0.1)) is not None)
+        self.assertEqual(cp.cell_index()[0].n, 15)
+        # cells resampled with the same shape are indexed again too
+        cp.uniform_random(n=5)
+        tree, keys, groups, _ = cp.cell_index()
+        group = np.array(groups) == keys.index('uniform_random')
+        self.assertTrue(np.array_equal(tree.data[group],
+                                       np.asarray(cp.cp['uniform_random'])))
+        ids = cp.closest_to_line((0,0,1,1), 10)
+        self.assertTrue(all(x != y for x, y in zip(ids, ids[1:])))
+
+    def test_samplers(self):
+        from sensors.CellPath import CellPath
+        cp = CellPath()
+        p = [[(0.1,0.1),(0.5,0.5),(0.9,0.5)],[(0.2,0.9),(0.8,0.9)]]
+        cp.gaussian_polyline(p, n=200, tau=5)
+        cp.gaussian_points([(0.05,0.05),(0.5,0.5)], n=100, tau=5)
+        cp.uniform_random_bbox([1,3], [(-1,-1,0.5,0.5),(0.5,0.5,2,2)], n=100)
+        for key, n in [('gaussian_polyline',200),('gaussian_points',100),
+                       ('uniform_rand_bbox',100)]:
+            self.assertEqual(cp.cp[key].shape, (n,2))
+            self.assertTrue(cp.in_box_all(np.asarray(cp.cp[key])).all())
+
+    def test_edge_cache(self):
+        from sensors.CellPath import CellPath
+        from tests import small_grid
+        TN = small_grid()
+        cp = CellPath(TN=TN, NB=20, NL=20, NS=0)
+        pos = TN.G.node
+        def path_cps():
+            return [cp.closest_to_polyline([tuple(pos[u]['pos']) +
+                                            tuple(pos[v]['pos']) for (u,v) in
+                                            zip(path, path[1:])], 10)
+                    for path in TN.routes.paths()]
+        cp._get_trajs_grid(TN, 10)
+        self.assertEqual(cp.path_cps, path_cps())
+        self.assertEqual(len(cp._line_cells[2]), TN.num_links())
+        # resampling the cells invalidates the cache
+        cp.uniform_random(n=20)
+        cp._get_trajs_grid(TN, 10)
+        self.assertEqual(cp.path_cps, path_cps())
+
 if __name__ == '__main__':
     unittest.main()
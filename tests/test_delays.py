@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+import networks.wardrop.Graph as g
+from networks.wardrop.delays import PolyDelays, HyperDelays, BPRDelays
+
+__author__ = 'cathywu'
+
+class TestDelays(unittest.TestCase):
+    def setUp(self):
+        self.x = np.array([0.0, 0.5, 1.0, 2.5])
+        self.funcs = {
+            'Polynomial': [g.PolyDelay(1.0, 0.5, [0.1, 0.0, 0.3]),
+                           g.PolyDelay(2.0, 0.5, [0.2]),
+                           g.PolyDelay(1.5, 0.5, [0.0, 0.0, 0.0, 0.15]),
+                           g.PolyDelay(0.5, 0.5, [])],
+            'Hyperbolic': [g.HyperDelay(1.0, 0.5, 3.0, 4.0)] * 2 +
+                          [g.HyperDelay(2.0, 0.5, 1.0, 8.0)] * 2,
+            'BPR': [g.BPRDelay(1.0, 0.5), g.BPRDelay(2.0, 0.2, 0.5, 2.0)] * 2,
+        }
+        self.families = {'Polynomial': PolyDelays, 'Hyperbolic': HyperDelays,
+                         'BPR': BPRDelays}
+
+    def test_families(self):
+        x, e = self.x, 1e-6
+        for type, funcs in self.funcs.items():
+            family = self.families[type].from_funcs(funcs)
+            delays = family.delay(x)
+            self.assertTrue(np.allclose(delays, [f.compute_delay(u) for f, u
+                                                 in zip(funcs, x)]))
+            # marginal = d(x*delay)/dx, delay = d(integral)/dx
+            marginal = ((x+e) * family.delay(x+e) -
+                        (x-e) * family.delay(x-e)) / (2*e)
+            self.assertTrue(np.allclose(family.marginal(x), marginal))
+            integral = (family.integral(x+e) - family.integral(x-e)) / (2*e)
+            self.assertTrue(np.allclose(integral, delays))
+            derivative = (family.delay(x+e) - family.delay(x-e)) / (2*e)
+            self.assertTrue(np.allclose(family.derivative(x), derivative))
+            derivative = (family.marginal(x+e) - family.marginal(x-e)) / (2*e)
+            self.assertTrue(np.allclose(family.marginal_derivative(x),
+                                        derivative))
+            self.assertEqual(family.integral(np.zeros(4)).tolist(), [0] * 4)
+
+    def test_graph(self):
+        G = g.Graph()
+        G.add_nodes_from_list([(0,0), (1,0), (1,1)])
+        funcs = [self.funcs['Polynomial'][0], self.funcs['Hyperbolic'][0],
+                 self.funcs['BPR'][1]]
+        for (s, t), f in zip([(1,2), (2,3), (1,3)], funcs):
+            G.add_link(s, t, delayfunc=f)
+        G.update_linkflows_linkdelays(self.x[1:])
+        self.assertTrue(np.allclose([l.delay for l in sorted(G.links.values(),
+                                     key=lambda l: l.index)],
+                                    [f.compute_delay(u) for f, u
+                                     in zip(funcs, self.x[1:])]))
+        G.update_linkdelays(marginal=True)
+        marginals = [self.families[f.type].from_funcs([f]).marginal(
+            np.array([u]))[0] for f, u in zip(funcs, self.x[1:])]
+        self.assertTrue(np.allclose(G.table.delay[:3], marginals))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from networks.EdgeIndex import EdgeIndex
+from networks.RouteStore import RouteStore
+
+__author__ = 'cathywu'
+
+class TestEdgeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.edges = [(0, 1), (1, 2), (0, 3), (3, 4), (4, 2)]
+        self.index = EdgeIndex(self.edges, weights=[1, 2, 3, 4, 5])
+
+    def test_arrays(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index[(3, 4)], 3)
+        self.assertTrue((4, 2) in self.index)
+        self.assertFalse((2, 4) in self.index)
+        self.assertEqual(self.index.tails.tolist(), [0, 1, 0, 3, 4])
+        self.assertEqual(self.index.heads.tolist(), [1, 2, 3, 4, 2])
+        self.assertEqual(self.index.flows.tolist(), [0] * 5)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup([4, 2, 0, 7], [2, 4, 1, 0]).tolist(),
+                         [4, -1, 0, -1])
+        self.assertEqual(self.index.lookup_edges(self.edges).tolist(),
+                         range(5))
+
+    def test_route_edges(self):
+        routes = [{'path': [0, 1, 2], 'cost': 2.0, 'o': 0, 'd': 2},
+                  {'path': [0, 3, 4, 2], 'cost': 3.0, 'o': 0, 'd': 2},
+                  {'path': [4, 2], 'cost': 0.5, 'o': 4, 'd': 2}]
+        store = RouteStore.from_routes(routes)
+        store.index_edges(self.index)
+        self.assertEqual(store.edge_offsets.tolist(), [0, 2, 5, 6])
+        self.assertEqual(store.edge_ids(1).tolist(), [2, 3, 4])
+        self.assertEqual(store.edge_ids(2).tolist(), [4])
+        store = RouteStore.from_routes([{'path': [2, 4], 'cost': 1.0,
+                                         'o': 2, 'd': 4}])
+        self.assertRaises(KeyError, store.index_edges, self.index)
+
+if __name__ == '__main__':
+    unittest.main()
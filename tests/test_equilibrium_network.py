@@ -36,5 +36,77 @@ class TestEquilibriumNetwork(unittest.TestCase):
         TN = load(fname)
         self.assertTrue(True)
 
+    def test_simplex_od(self):
+        import numpy as np
+        import networks.wardrop.Graph as g
+        import networks.wardrop.path_solver as path_solver
+        from synth_utils import to_sp
+        G = g.Graph()
+        G.add_nodes_from_list([(0,0), (1,0), (1,1), (0,1)])
+        for (s,t) in [(1,2), (2,3), (1,4), (4,3), (2,4), (4,2)]:
+            G.add_link(s, t)
+        G.add_ods_from_list([(1,3,2.0), (2,3,1.0), (4,2,3.0)])
+        for p in [[1,2,3], [1,4,3], [1,2,4,3], [2,3], [2,4,3], [4,2]]:
+            G.add_path_from_nodes(p)
+        T, d = path_solver.simplex_od(G)
+        U, r = path_solver.simplex(G)
+        self.assertTrue(np.array_equal(T.toarray(), to_sp(U).toarray()))
+        self.assertTrue(np.array_equal(d, np.array(r).ravel()))
+
+    def test_cached_paths(self):
+        import shutil
+        import tempfile
+        import networks.wardrop.generate_paths as gp
+        path = 'networks/los_angeles_data_2.mat'
+        cache_dir = tempfile.mkdtemp()
+        try:
+            gp._memo.clear()
+            paths = gp.find_UESOpaths(False, path=path, cache_dir=cache_dir)
+            self.assertTrue(len(gp._memo) > 0)
+            # reloaded from disk
+            gp._memo.clear()
+            self.assertEqual(gp.find_UESOpaths(False, path=path,
+                                               cache_dir=cache_dir), paths)
+            # and from memory
+            self.assertEqual(gp.find_UESOpaths(False, path=path), paths)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_frank_wolfe(self):
+        import numpy as np
+        from networks.EquilibriumNetwork import EquilibriumNetwork
+        TN = EquilibriumNetwork(solver='BFW')
+        T, d = TN.simplex_od()
+        self.assertTrue(np.allclose(T.dot(np.array(TN.p_flow).ravel()), d))
+        self.assertEqual(TN.G.numpaths, len(TN.p_flow))
+
+    def test_gradient_projection(self):
+        import numpy as np
+        from networks.EquilibriumNetwork import EquilibriumNetwork
+        TN = EquilibriumNetwork(solver='GP')
+        T, d = TN.simplex_od()
+        self.assertTrue(np.allclose(T.dot(np.array(TN.p_flow).ravel()), d))
+        self.assertEqual(TN.G.numpaths, len(TN.p_flow))
+
+    def test_sweep(self):
+        import numpy as np
+        import numpy.random as random
+        from networks.EquilibriumNetwork import EquilibriumNetwork, sweep
+        TNs = list(sweep(demands=[2, 3], noises=[0.01], seeds=[1, 2],
+                         solver='GP'))
+        self.assertEqual([t[:3] for t in TNs], [(2, 0.01, 1), (2, 0.01, 2),
+                                                (3, 0.01, 1), (3, 0.01, 2)])
+        for _, _, _, TN in TNs:
+            T, d = TN.simplex_od()
+            self.assertTrue(np.allclose(T.dot(np.array(TN.p_flow).ravel()), d))
+        # same equilibrium as a solve from scratch of the same draw
+        random.seed(2)
+        TN = EquilibriumNetwork(demand=3, noise=0.01, solver='GP')
+        l = np.array(TN.G.get_linkflows()).ravel()
+        l2 = np.array(TNs[-1][3].G.get_linkflows()).ravel()
+        self.assertTrue(np.abs(l - l2).max() < 1e-2 * l.max())
+        # Frank-Wolfe solves cannot be warm started
+        self.assertRaises(ValueError, list, sweep(demands=[2, 3], solver='BFW'))
+
 if __name__ == '__main__':
     unittest.main()
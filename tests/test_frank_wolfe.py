@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+import networks.wardrop.frank_wolfe as fw
+import networks.wardrop.ue_solver as ue
+from networks.wardrop.generate_graph import los_angeles
+from networks.wardrop.generate_paths import theta
+
+__author__ = 'cathywu'
+
+PATH = 'networks/los_angeles_data_2.mat'
+
+class TestFrankWolfe(unittest.TestCase):
+    def check(self, graph, SO, method, rtol=1e-2):
+        ref = np.array(ue.solver(graph, SO=SO, sparse_kkt=True)).ravel()
+        l, gaps, paths, flows = fw.solver(graph, SO=SO, method=method,
+                                          max_iter=3000, full=True)
+        l = np.array(l).ravel()
+        self.assertTrue(gaps[-1] < 1e-4)
+        self.assertTrue(np.abs(l - ref).max() < rtol * ref.max())
+        # the path flows add up to the link flows and the demands
+        P = np.zeros((graph.numlinks, len(paths)))
+        d = dict((od, 0.0) for od in graph.ODs)
+        for j, (p, f) in enumerate(zip(paths, flows)):
+            for u, v in zip(p, p[1:]):
+                P[graph.indlinks[(u, v, 1)], j] = 1.0
+            d[(p[0], p[-1])] += f
+        self.assertTrue(np.allclose(P.dot(flows), l))
+        for od, flow in d.items():
+            self.assertAlmostEqual(flow, graph.ODs[od].flow)
+
+    def test_polynomial(self):
+        for method in ['FW', 'CFW', 'BFW']:
+            self.check(los_angeles(theta, 'Polynomial', path=PATH)[3], False,
+                       method)
+        self.check(los_angeles(theta, 'Polynomial', path=PATH)[3], True,
+                   'BFW')
+
+    def test_hyperbolic(self):
+        # the initial flows are loaded incrementally below the capacities
+        for SO in [False, True]:
+            self.check(los_angeles((3.5, 3.0), 'Hyperbolic', path=PATH)[3], SO,
+                       'BFW')
+
+    def test_restart(self):
+        graph = los_angeles(theta, 'Polynomial', path=PATH)[3]
+        weights, calls = fw.conjugate_weights, []
+        def conjugate_weights(method, H, x, y, s, s2, a):
+            calls.append(s2 is None)
+            if len(calls) == 3:
+                # search point s + t*(s-y), an ascent direction from x for t
+                # large enough
+                costs = graph.table.compute_delays(x)
+                t = max(0.0, -np.dot(costs, s - x)) / np.dot(costs, s - y)
+                return np.array([-t-1.0, t+2.0, 0.0])
+            return weights(method, H, x, y, s, s2, a)
+        fw.conjugate_weights = conjugate_weights
+        try:
+            l, gaps, _, _ = fw.solver(graph, method='BFW', full=True)
+        finally:
+            fw.conjugate_weights = weights
+        # the FW step forgets the previous search points
+        self.assertEqual(calls[:4], [True, True, False, True])
+        self.assertTrue(gaps[-1] < 1e-4)
+
+if __name__ == '__main__':
+    unittest.main()
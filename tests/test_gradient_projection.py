@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+from cvxopt import matrix
+
+import networks.wardrop.gradient_projection as gp
+import networks.wardrop.path_solver as path_solver
+import networks.wardrop.ue_solver as ue
+from networks.wardrop.generate_graph import los_angeles
+from networks.wardrop.generate_paths import theta
+
+__author__ = 'cathywu'
+
+PATH = 'networks/los_angeles_data_2.mat'
+
+class TestGradientProjection(unittest.TestCase):
+    def check(self, graph, SO, rtol=1e-2):
+        ref = np.array(ue.solver(graph, SO=SO, sparse_kkt=True)).ravel()
+        l, gaps, paths, flows = gp.solver(graph, SO=SO, full=True)
+        l = np.array(l).ravel()
+        self.assertTrue(gaps[-1] < 1e-4)
+        self.assertTrue(np.abs(l - ref).max() < rtol * ref.max())
+        self.assertTrue((flows > 0).all())
+        # the paths go from the origins to the destinations of their OD pairs
+        # and their flows add up to the demands
+        d = dict((od, 0.0) for od in graph.ODs)
+        for p, f in zip(paths, flows):
+            ids = [id for i in p for id, j in graph.indlinks.items() if i == j]
+            for a, b in zip(ids, ids[1:]):
+                self.assertEqual(a[1], b[0])
+            d[(ids[0][0], ids[-1][1])] += f
+        for od, flow in d.items():
+            self.assertAlmostEqual(flow, graph.ODs[od].flow)
+
+    def test_polynomial(self):
+        for SO in [False, True]:
+            self.check(los_angeles(theta, 'Polynomial', path=PATH)[3], SO)
+
+    def test_hyperbolic(self):
+        for SO in [False, True]:
+            self.check(los_angeles((3.5, 3.0), 'Hyperbolic', path=PATH)[3], SO)
+
+    def test_warm_start(self):
+        graphs = los_angeles(theta, 'Polynomial', path=PATH)
+        _, _, paths, flows = gp.solver(graphs[2], full=True)
+        l, gaps, _, _ = gp.solver(graphs[3], full=True)
+        l2, gaps2, paths2, flows2 = gp.solver(graphs[3], full=True,
+                                              warm_start=(paths, flows))
+        self.assertTrue(gaps2[-1] < 1e-4)
+        self.assertTrue(len(gaps2) < len(gaps))
+        self.assertTrue(np.abs(np.array(l2 - l)).max() < 1e-2 * max(l))
+        # the prior flows are scaled to the demands
+        d = dict((od, 0.0) for od in graphs[3].ODs)
+        link_ids = dict((i, id) for id, i in graphs[3].indlinks.items())
+        for p, f in zip(paths2, flows2):
+            d[(link_ids[p[0]][0], link_ids[p[-1]][1])] += f
+        for od, flow in d.items():
+            self.assertAlmostEqual(flow, graphs[3].ODs[od].flow)
+        # and G.paths can warm start another solve
+        gp.solver(graphs[2], update=True)
+        _, gaps3, _, _ = gp.solver(graphs[3], full=True,
+                                   warm_start=gp.graph_paths(graphs[2]))
+        self.assertTrue(len(gaps3) < len(gaps))
+
+    def test_update(self):
+        graph = los_angeles(theta, 'Polynomial', path=PATH)[3]
+        l = gp.solver(graph, update=True)
+        # G.paths holds the used paths and their flows
+        x = np.array([graph.paths[id].flow for id in
+                      sorted(graph.indpaths, key=graph.indpaths.get)])
+        P = path_solver.linkpath_incidence(graph)
+        self.assertTrue(np.allclose(np.array(P * matrix(x)).ravel(),
+                                    np.array(l).ravel()))
+        self.assertTrue(np.allclose(graph.get_linkflows(), l))
+        for od in graph.ODs.values():
+            self.assertAlmostEqual(sum([p.flow for p in od.paths.values()]),
+                                   od.flow)
+
+if __name__ == '__main__':
+    unittest.main()
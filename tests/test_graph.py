@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+from cvxopt import matrix
+
+import networks.wardrop.Graph as g
+
+__author__ = 'cathywu'
+
+class TestGraph(unittest.TestCase):
+    def setUp(self):
+        self.G = g.Graph()
+        self.G.add_nodes_from_list([(0,0), (1,0), (1,1)])
+        self.G.add_link(1, 2, delayfunc=g.PolyDelay(1.0, 0.5, [0.0, 0.1, 0.2]))
+        self.G.add_link(2, 3, delayfunc=g.HyperDelay(2.0, 0.5, 3.0, 4.0))
+        self.G.add_link(1, 3, delayfunc=g.PolyDelay(3.0, 0.2, [0.5]))
+
+    def test_link_table(self):
+        G = self.G
+        self.assertEqual(list(G.get_ffdelays()), [1.0, 2.0, 3.0])
+        self.assertEqual(list(G.get_slopes()), [0.5, 0.5, 0.2])
+        self.assertEqual(G.table.coefs[:3].tolist(), [[0.0, 0.1, 0.2],
+                                                      [0.0, 0.0, 0.0],
+                                                      [0.5, 0.0, 0.0]])
+        # Link objects and the table stay in sync both ways
+        G.links[(1,2,1)].flow = 5.0
+        self.assertEqual(list(G.get_linkflows()), [5.0, 0.0, 0.0])
+        G.update_linkflows_linkdelays(matrix([1.0, 2.0, 3.0]))
+        for id, link in G.links.items():
+            self.assertEqual(link.flow, G.indlinks[id] + 1.0)
+            self.assertAlmostEqual(link.delay,
+                                   link.delayfunc.compute_delay(link.flow))
+
+if __name__ == '__main__':
+    unittest.main()
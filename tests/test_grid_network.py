@@ -4,6 +4,7 @@ import numpy as np
 
 from networks.GridNetwork import GridNetwork
 from sensors.SensorConfiguration import SensorConfiguration
+from tests import small_grid
 
 __author__ = 'cathywu'
 
@@ -49,5 +50,87 @@ class TestGridNetwork(unittest.TestCase):
         data = S.export_matrices(TN)
         self.assertTrue(True)
 
+    def test_workers(self):
+        TN = small_grid()
+        TN_parallel = small_grid(workers=2)
+        for key in ('nodes', 'offsets', 'cost', 'o', 'd', 'flow'):
+            self.assertTrue(np.array_equal(getattr(TN.routes, key),
+                                           getattr(TN_parallel.routes, key)))
+
+    def test_static_matrix_OD(self):
+        from networks.grid_networks.static_matrix import \
+            generate_static_matrix_OD, route_order_OD
+        TN = small_grid()
+        A, b, x = generate_static_matrix_OD(TN, only_Ab=True)
+        route_indices, num_routes = route_order_OD(TN)
+        self.assertEqual(A.shape, (len(TN.sensors), len(TN.routes)))
+        self.assertEqual(num_routes.sum(), len(TN.routes))
+        for j, r in enumerate(route_indices):
+            path = TN.routes.path(r)
+            edges = set(zip(path, path[1:]))
+            self.assertEqual(A[:,j].toarray().ravel().tolist(),
+                             [1 if e in edges else 0 for e in TN.sensors])
+        self.assertTrue(np.allclose(b, A.dot(x)))
+
+    def test_flows(self):
+        TN = small_grid(concentration=0.5)
+        link_flows, turn_flows = {}, {}
+        for i, route in enumerate(TN.routes):
+            path, flow = route['path'], route['flow']
+            for e in zip(path, path[1:]):
+                link_flows[e] = link_flows.get(e, 0) + flow
+            for p, n, s in zip(path, path[1:], path[2:]):
+                turn_flows[(n, p, s)] = turn_flows.get((n, p, s), 0) + flow
+        TN.store_flows()
+        for (u, v, data) in TN.G.edges(data=True):
+            self.assertAlmostEqual(data['flow'], link_flows.get((u, v), 0))
+        for n in TN.G.nodes():
+            for (p, s), (flow, routes) in TN.G.node[n]['2nd_flow'].items():
+                self.assertAlmostEqual(flow, turn_flows[(n, p, s)])
+                self.assertTrue(all(TN.routes.flow[i] > 0 for i in routes))
+
+    def test_resample_flows(self):
+        TN = small_grid()
+        for seed, params in [(1, {}), (2, {'concentration': 0.5}),
+                             (3, {'concentration': None, 'nnz_oroutes': 3,
+                                  'o_flow': 0.5})]:
+            TN.resample_flows(seed, **params)
+            expected = small_grid(myseed=seed, **params)
+            self.assertEqual(TN.routes.flow.tolist(),
+                             expected.routes.flow.tolist())
+            self.assertEqual(TN.edge_index.flows.tolist(),
+                             expected.edge_index.flows.tolist())
+            self.assertEqual((TN.turn_flows - expected.turn_flows).nnz, 0)
+            self.assertEqual(TN.od_flows, expected.od_flows)
+            self.assertEqual(TN.nz_routes, expected.nz_routes)
+        self.assertRaises(TypeError, TN.resample_flows, 0, sparsity=0.1)
+
+    def test_sample_flow_matrix(self):
+        from scipy.sparse import csr_matrix
+        TN = small_grid()
+        flow = TN.routes.flow.copy()
+        incidence = TN.routes.edge_incidence(len(TN.edge_index),
+                                             np.arange(len(TN.routes))).toarray()
+        X, L = TN.sample_flow_matrix(2000, myseed=0, o_flow=0.5)
+        self.assertEqual(X.shape, (2000, len(TN.routes)))
+        self.assertTrue(np.allclose(L, X.dot(incidence.T)))
+        # nnz_oroutes routes per origin, o_flow from each origin
+        origins = TN.routes.o
+        for o in range(12):
+            self.assertTrue(((X[:, origins == o] > 0).sum(axis=1) == 2).all())
+            self.assertTrue(np.allclose(X[:, origins == o].sum(axis=1), 0.5))
+            # each route of the origin is equally likely
+            n = (origins == o).sum()
+            self.assertTrue(np.allclose(X[:, origins == o].mean(axis=0),
+                                        0.5 / n, atol=0.25 / n))
+        # concentrated flows, o_flow on int(concentration * pairs) OD pairs
+        X, L = TN.sample_flow_matrix(10, myseed=0, sparse=True,
+                                     concentration=0.5)
+        self.assertTrue(isinstance(X, csr_matrix))
+        self.assertTrue(np.allclose(L, X.dot(incidence.T)))
+        self.assertTrue(np.allclose(X.sum(axis=1), 66))
+        # the network's own flows are left unchanged
+        self.assertEqual(TN.routes.flow.tolist(), flow.tolist())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,56 @@
+import copy
+import unittest
+
+from YenKSP import algorithms
+from networks.GridNetwork import GridNetwork
+
+__author__ = 'cathywu'
+
+class TestKSP(unittest.TestCase):
+
+    def setUp(self):
+        self.TN = GridNetwork(ncol=4, nrow=3, nodroutes=3)
+        self.H = self.TN._invert_graph_weights()
+        self.nodes = range(self.TN.n * self.TN.m)
+
+    def test_all_pairs(self):
+        trees_end = {}
+        for u in self.nodes:
+            dests = [v for v in self.nodes if v != u]
+            paths = algorithms.ksp_yen_all(self.H, u, dests, max_k=4,
+                                           trees_end=trees_end)
+            for v in dests:
+                self.assertEqual(paths[v],
+                                 algorithms.ksp_yen(self.H, u, v, max_k=4))
+
+    def test_heap_backend(self):
+        for u in self.nodes:
+            self.assertEqual(algorithms.dijkstra_heap(self.H, u),
+                             algorithms.dijkstra(self.H, u))
+            for v in self.nodes:
+                self.assertEqual(
+                    algorithms.ksp_yen(self.H, u, v, max_k=4, backend='heap'),
+                    algorithms.ksp_yen(self.H, u, v, max_k=4))
+
+    def test_read_only(self):
+        data = copy.deepcopy(self.H._data)
+        for u in self.nodes:
+            algorithms.ksp_yen_all(self.H, u, max_k=4)
+            for v in self.nodes:
+                algorithms.ksp_yen(self.H, u, v, max_k=4)
+        self.assertEqual(self.H._data, data)
+
+    def test_banned_edges(self):
+        u, v = self.nodes[0], self.nodes[-1]
+        p = algorithms.dijkstra(self.H, u, v)['path']
+        banned = set(zip(p[:-1], p[1:]))
+        for backend in [algorithms.dijkstra, algorithms.dijkstra_heap]:
+            spur = backend(self.H, u, v, edges_banned=banned)
+            self.assertTrue(spur['path'])
+            self.assertFalse(banned & set(zip(spur['path'][:-1],
+                                              spur['path'][1:])))
+            spur = backend(self.H, u, v, nodes_banned=set(p[1:-1]))
+            self.assertFalse(set(p[1:-1]) & set(spur['path']))
+
+if __name__ == '__main__':
+    unittest.main()
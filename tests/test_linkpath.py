@@ -0,0 +1,27 @@
+import unittest
+
+from tests import small_grid
+
+__author__ = 'cathywu'
+
+class TestLinkPath(unittest.TestCase):
+    def setUp(self):
+        from sensors.LinkPath import LinkPath
+        self.TN = small_grid()
+        self.lp = LinkPath(self.TN, N=5)
+
+    def test_grid(self):
+        self.lp.update_trajs(self.TN)
+        sensed = set(self.lp.lp)
+        for path, lps in zip(self.TN.routes.paths(), self.lp.path_lps):
+            self.assertEqual(lps, [e for e in zip(path, path[1:])
+                                   if e in sensed])
+
+    def test_missing_edge(self):
+        # a pair that is not an edge of the grid
+        self.assertFalse((0, 0) in self.TN.edge_index)
+        self.lp.lp = self.lp.lp[:-1] + [(0, 0)]
+        self.assertRaises(KeyError, self.lp.update_trajs, self.TN)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from networks.RouteStore import RouteStore
+
+__author__ = 'cathywu'
+
+class TestRouteStore(unittest.TestCase):
+
+    def setUp(self):
+        self.routes = [{'path': [0, 1, 2], 'cost': 2.0, 'o': 0, 'd': 2},
+                       {'path': [0, 3, 4, 2], 'cost': 3.0, 'o': 0, 'd': 2},
+                       {'path': [4, 2], 'cost': 0.5, 'o': 4, 'd': 2}]
+        self.store = RouteStore.from_routes(self.routes)
+
+    def test_arrays(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.nodes.dtype, np.int32)
+        self.assertEqual(self.store.offsets.tolist(), [0, 3, 7, 9])
+        self.assertEqual(self.store.o.tolist(), [0, 0, 4])
+        self.assertEqual(self.store.lengths().tolist(), [3, 4, 2])
+        self.assertEqual(self.store.paths(), [r['path'] for r in self.routes])
+
+    def test_view(self):
+        for r, view in zip(self.routes, self.store):
+            for key in ('path', 'cost', 'o', 'd'):
+                self.assertEqual(view[key], r[key])
+            self.assertEqual(view['flow'], 0)
+        self.store[1]['flow'] = 0.25
+        self.assertEqual(self.store.flow[1], 0.25)
+        self.assertEqual(self.store[-1]['path'], [4, 2])
+        self.assertRaises(KeyError, self.store[0].__setitem__, 'path', [])
+        self.assertRaises(IndexError, self.store.__getitem__, 3)
+
+if __name__ == '__main__':
+    unittest.main()
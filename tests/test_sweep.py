@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+from scipy import sparse
+
+__author__ = 'cathywu'
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.grid_configs = [{'ncol': 3, 'nrow': 3, 'nodroutes': 2},
+                             {'ncol': 4, 'nrow': 3, 'nodroutes': 2,
+                              'o_flow': 0.5, 'concentration': 0.5},
+                             {'ncol': 3, 'nrow': 3, 'nodroutes': 2,
+                              'nnz_oroutes': 3}]
+        self.sensor_configs = [{'num_link': np.inf, 'num_OD': np.inf,
+                                'num_cellpath_NB': 5, 'num_linkpath': 3},
+                               {'num_link': np.inf, 'num_OD': np.inf,
+                                'num_cellpath_NB': 8, 'num_linkpath': 2,
+                                'myseed': 7}]
+
+    def check(self, scenarios, seeds):
+        from matrix.matrix import generate_synthetic
+        self.assertEqual(sorted((i, s, j) for (i, s, j, _) in scenarios),
+                         sorted((i, s, j) for i in range(3) for s in seeds
+                                for j in range(2)))
+        for i, seed, j, data in scenarios:
+            sensor_config = dict(self.sensor_configs[j])
+            sensor_config.setdefault('myseed', seed)
+            expected = generate_synthetic(None, dict(self.grid_configs[i],
+                                                     myseed=seed),
+                                          sensor_config, save=False)
+            # A stays sparse through the column permutation and removal
+            self.assertTrue(sparse.isspmatrix_csc(data['A']))
+            for k, v in expected.iteritems():
+                if sparse.issparse(v):
+                    self.assertEqual((data[k] != v).nnz, 0)
+                else:
+                    self.assertTrue(np.array_equal(data[k], v))
+
+    def test_sweep(self):
+        from matrix.sweep import sweep
+        seeds = [1, 2]
+        self.check(list(sweep(self.grid_configs, self.sensor_configs, seeds)),
+                   seeds)
+
+    def test_workers(self):
+        from matrix.sweep import sweep
+        seeds = [3, 4]
+        self.check(list(sweep(self.grid_configs, self.sensor_configs, seeds,
+                              workers=2)), seeds)
+
+if __name__ == '__main__':
+    unittest.main()
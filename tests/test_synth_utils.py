@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from synth_utils import group_trajs, traj_flows, traj_paths, simplex_csr, \
+    simplex
+
+__author__ = 'cathywu'
+
+class TestSynthUtils(unittest.TestCase):
+    def test_group_trajs(self):
+        seqs = [[(0,1),(1,2)], [], [(0,1)], [(0,1),(1,2)], [], [(0,1)]]
+        trajs, labels, indptr, indices, flows = group_trajs(seqs,
+                                                  [1,2,3,4,5,6])
+        self.assertEqual(trajs, [((0,1),(1,2)), (), ((0,1),)])
+        self.assertEqual(labels.tolist(), [0,1,2,0,1,2])
+        self.assertEqual(indptr.tolist(), [0,2,4,6])
+        self.assertEqual(indices.tolist(), [0,3,1,4,2,5])
+        self.assertEqual(flows.tolist(), [5,7,9])
+        self.assertEqual(traj_paths(trajs, indptr, indices, ids='abcdef'),
+                         {((0,1),(1,2)): ['a','d'], (): ['b','e'],
+                          ((0,1),): ['c','f']})
+
+        # paths without a trajectory are left out
+        trajs, labels, indptr, indices, _ = group_trajs(seqs, drop_empty=True)
+        self.assertEqual(trajs, [((0,1),(1,2)), ((0,1),)])
+        self.assertEqual(labels.tolist(), [0,-1,1,0,-1,1])
+        self.assertEqual(traj_paths(trajs, indptr, indices).values(),
+                         [[0,3], [2,5]])
+        self.assertEqual(traj_flows(labels, np.ones(6), 2).tolist(), [2,2])
+
+    def test_simplex(self):
+        X, r = simplex_csr(4, [0,2,2,5], [0,3,1,1,2], [1.0,2.0,3.0])
+        self.assertEqual(X.toarray().tolist(), [[1,0,0,1], [0,0,0,0],
+                                                [0,1,1,0]])
+        self.assertEqual(r.tolist(), [1,2,3])
+        Y, s = simplex(4, {(1,): [0,3]}, [5.0])
+        self.assertEqual(Y.toarray().tolist(), [[1,0,0,1]])
+        self.assertEqual(s.tolist(), [5])
+
+if __name__ == '__main__':
+    unittest.main()
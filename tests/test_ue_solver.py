@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+from cvxopt import matrix
+
+import networks.wardrop.ue_solver as ue
+
+__author__ = 'cathywu'
+
+class TestUESolver(unittest.TestCase):
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.n, self.p = 5, 3
+        self.x = matrix(rs.rand(self.n*self.p))
+        self.l = np.array(self.x).reshape(self.p, self.n).sum(axis=0)
+        self.rs = rs
+
+    def check_blocks(self, Df, H, df, h):
+        n, p = self.n, self.p
+        self.assertTrue(np.allclose(np.array(Df).ravel(), np.tile(df, p)))
+        H = np.array(matrix(H))
+        for k in range(p):
+            for j in range(p):
+                self.assertTrue(np.allclose(H[k*n:(k+1)*n, j*n:(j+1)*n],
+                                            np.diag(2.0 * h)))
+
+    def test_objective_poly(self):
+        ks = self.rs.rand(self.n, 4)
+        u = self.l[:,None] ** np.arange(5)
+        f, Df, H = ue.objective_poly(self.x, matrix([2.0]), matrix(ks),
+                                     self.p)
+        self.assertAlmostEqual(f[0], np.sum(ks * u[:,1:]))
+        self.check_blocks(Df, H, np.sum(ks * u[:,:-1] * np.arange(1, 5), 1),
+                          np.sum(ks[:,1:] * u[:,:-2] * [2, 6, 12], 1))
+
+    def test_objective_hyper(self):
+        ks = np.c_[self.rs.rand(self.n, 2), 10 + self.rs.rand(self.n)]
+        a, b, c = ks.T
+        l = self.l
+        f, Df, H = ue.objective_hyper(self.x, matrix([2.0]), matrix(ks),
+                                      self.p)
+        self.assertAlmostEqual(f, np.sum(a*l - b*np.log(c-l)))
+        self.check_blocks(Df, H, a + b/(c-l), b/(c-l)**2)
+        f, Df, H = ue.objective_hyper_SO(self.x, matrix([2.0]), matrix(ks),
+                                         self.p)
+        self.assertAlmostEqual(f, np.sum(a*l + b*l/(c-l)))
+        self.check_blocks(Df, H, a + b*c/(c-l)**2, 2*b*c/(c-l)**3)
+
+    def test_sparse_kkt(self):
+        import networks.wardrop.path_solver as path_solver
+        from networks.wardrop.generate_graph import los_angeles
+        from networks.wardrop.generate_paths import theta, find_UESOpaths
+        path = 'networks/los_angeles_data_2.mat'
+        graph = lambda: los_angeles(theta, 'Polynomial', path=path)[0]
+        for SO in [False, True]:
+            l = ue.solver(graph(), SO=SO)
+            self.assertTrue(np.allclose(ue.solver(graph(), SO=SO,
+                                                  sparse_kkt=True), l))
+        g = graph()
+        for p in find_UESOpaths(False, path=path):
+            g.add_path_from_nodes(p)
+        x = path_solver.solver(g)
+        self.assertTrue(np.allclose(path_solver.solver(g, sparse_kkt=True), x,
+                                    atol=1e-6))
+
+    def test_warm_start(self):
+        import networks.wardrop.path_solver as path_solver
+        from networks.wardrop.generate_graph import los_angeles
+        from networks.wardrop.generate_paths import theta, find_UESOpaths
+        path = 'networks/los_angeles_data_2.mat'
+        graphs = los_angeles(theta, 'Polynomial', path=path)
+        # start from the solution of another demand level
+        _, x = ue.solver(graphs[2], full=True)
+        l = ue.solver(graphs[3])
+        self.assertTrue(np.allclose(ue.solver(graphs[3], x0=x), l, atol=1e-3))
+        paths = find_UESOpaths(False, path=path)
+        for g in graphs[2:]:
+            for p in paths: g.add_path_from_nodes(p)
+        P = path_solver.linkpath_incidence(graphs[3])
+        x = path_solver.solver(graphs[2])
+        self.assertTrue(np.allclose(P * path_solver.solver(graphs[3], x0=x), l,
+                                    atol=1e-3))
+
+if __name__ == '__main__':
+    unittest.main()
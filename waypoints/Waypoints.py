@@ -5,7 +5,7 @@ from matplotlib import pyplot as plt
 import numpy.linalg as la
 
 from scipy.sparse import csr_matrix
-from synth_utils import deprecated
+from synth_utils import deprecated, group_trajs, traj_paths
 
 # Clean matrix  wrapper
 def matrix(x):
@@ -298,10 +298,8 @@ class Waypoints:
             r_ids = xrange(len(routes))
         path_wps = [self.closest_to_path(graph, routes[r]['path'], n,
                                          fast=fast) for r in r_ids]
-        wps = {}
-        for value,key in enumerate(path_wps):
-            wps.setdefault(tuple(key), []).append(value)
-        return path_wps, wps
+        wps, _, indptr, indices, _ = group_trajs(path_wps)
+        return path_wps, traj_paths(wps, indptr, indices)
 
     def _get_cp_trajs(self, graph, n, fast=False, tol=1e-3):
         self.path_cps, self.cp_trajs = self.get_wp_trajs(graph.G,graph.routes,